@@ -0,0 +1,171 @@
+# Push agent for multi-node mode:
+#
+#   ONEBOX_SERVER=http://central:8000 INGEST_TOKEN=... python -m backend.agent
+#
+# Samples this host with the same collectors as the web app and pushes gzip'd
+# JSON batches to /api/ingest on the central instance.
+import os
+import sys
+import json
+import gzip
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import urllib.error
+import urllib.request
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import psutil
+
+from .collect import sample_series
+from .gpu import GpuCollector, SmiStream
+from .netmon import NetMonitor
+from .sampler import Sampler
+from .storage import StorageMonitor
+
+VERSION = "1"
+
+
+def host_info(gpus: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "hostname": socket.gethostname(),
+        "os": platform.platform(),
+        "cpu_logical": psutil.cpu_count(logical=True) or 0,
+        "mem_total_gb": round(psutil.virtual_memory().total / 1024 ** 3, 1),
+        "boot_time": psutil.boot_time(),
+        "gpus": [g.get("name") for g in gpus],
+        "agent": VERSION,
+    }
+
+
+def encode(payload: Dict[str, Any]) -> bytes:
+    return gzip.compress(json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode(), 6)
+
+
+# Samples are buffered (bounded, oldest dropped while the server is away) and
+# pushed every `batch` ticks in columnar form: one names list, then rows of
+# [ts, v0, v1, ...]. A failed push keeps the buffer and backs off up to 60 s.
+class Agent:
+    def __init__(self, server: str, node: str, token: str = "", interval: float = 5.0, batch: int = 6,
+                 buffer: int = 720, timeout: float = 10.0):
+        self.url = server.rstrip("/") + "/api/ingest"
+        self.node = node
+        self.token = token
+        self.batch = max(1, batch)
+        self.timeout = timeout
+        self.pushed = 0
+        self.failures = 0
+        self.dropped = 0
+        self.gpu = GpuCollector()
+        self.smi = SmiStream(self.gpu, interval_ms=int(interval * 1000))
+        self.net = NetMonitor()
+        self.storage = StorageMonitor()
+        self.sampler = Sampler(self.collect, interval=interval)
+        self.sampler.listeners.append(self.on_frame)
+        self._buf: Deque[tuple] = deque(maxlen=buffer)
+        self._names: List[str] = []
+        self._info: Optional[Dict[str, Any]] = None
+        self._info_sent = False
+        self._wake = asyncio.Event()
+
+    def collect(self) -> Dict[str, Any]:
+        now = time.time()
+        series, gpus = sample_series(self.gpu, self.net, self.storage, now)
+        info = host_info(gpus)
+        if info != self._info:
+            self._info, self._info_sent = info, False
+        return {"ts": now, "series": series, "gpus": gpus}
+
+    def on_frame(self, seq: int, frame: Dict[str, Any]):
+        if len(self._buf) == self._buf.maxlen:
+            self.dropped += 1
+        self._buf.append((frame["ts"], frame["series"], frame["gpus"]))
+        if len(self._buf) >= self.batch:
+            self._wake.set()
+
+    def payload(self, items: List[tuple]) -> Dict[str, Any]:
+        # columns follow the union of names in the batch; a missing value is null
+        names = self._names
+        seen = set(names)
+        for _, series, _ in items:
+            for n in series:
+                if n not in seen:
+                    seen.add(n)
+                    names.append(n)
+        samples = [[ts] + [series.get(n) for n in names] for ts, series, _ in items]
+        out = {"node": self.node, "period": self.batch * self.sampler.interval, "names": names,
+               "samples": samples, "gpus": items[-1][2], "nics": self.net.interfaces(),
+               "disks": self.storage.disks()}
+        if not self._info_sent:
+            out["info"] = self._info
+        return out
+
+    def post(self, body: bytes):
+        req = urllib.request.Request(self.url, data=body, method="POST", headers={
+            "Content-Type": "application/json", "Content-Encoding": "gzip",
+            "Authorization": "Bearer " + self.token})
+        with urllib.request.urlopen(req, timeout=self.timeout) as r:
+            r.read()
+
+    async def push_loop(self):
+        loop = asyncio.get_running_loop()
+        backoff = 1.0
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._buf:
+                items = list(self._buf)
+                try:
+                    # payload() reads the disk cache, which may probe mounts: keep it off the loop too
+                    body = await loop.run_in_executor(None, lambda: encode(self.payload(items)))
+                    await loop.run_in_executor(None, self.post, body)
+                except (urllib.error.URLError, OSError, ValueError) as e:
+                    self.failures += 1
+                    print("push failed (%s), retry in %ds" % (e, backoff), file=sys.stderr)
+                    await asyncio.sleep(backoff)
+                    backoff = min(60.0, backoff * 2)
+                    continue
+                backoff = 1.0
+                self.pushed += len(items)
+                self._info_sent = True
+                # by timestamp, not count: while the push was in flight a full buffer
+                # evicted from the left, and those slots now hold samples not sent yet
+                last = items[-1][0]
+                while self._buf and self._buf[0][0] <= last:
+                    self._buf.popleft()
+
+    async def run(self):
+        if not self.gpu.nvml_available():
+            self.smi.start()
+        self.sampler.start()
+        try:
+            await self.push_loop()
+        finally:
+            await self.sampler.stop()
+            await self.smi.stop()
+            self.gpu.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m backend.agent")
+    ap.add_argument("--server", default=os.environ.get("ONEBOX_SERVER", ""), help="central instance URL")
+    ap.add_argument("--node", default=os.environ.get("NODE_NAME") or socket.gethostname().split(".")[0])
+    ap.add_argument("--token", default=os.environ.get("INGEST_TOKEN", ""))
+    ap.add_argument("--interval", type=float, default=float(os.environ.get("AGENT_INTERVAL", "5")))
+    ap.add_argument("--batch", type=int, default=int(os.environ.get("AGENT_BATCH", "6")),
+                    help="samples per push")
+    args = ap.parse_args(argv)
+    if not args.server:
+        ap.error("--server or ONEBOX_SERVER is required")
+    agent = Agent(args.server, args.node, args.token, args.interval, args.batch)
+    try:
+        asyncio.run(agent.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import math
+import time
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import db as dbm
+from .tsdb import match_names
+
+NAN = float('nan')
+# op -> (sign, inclusive); every check is normalised to  v * sign > t
+# (inclusive ops use the next float below t, which is exact for >=)
+OPS = {'>': (1, False), '>=': (1, True), '<': (-1, False), '<=': (-1, True)}
+LEVELS = ("严重", "警告", "提示")
+# transitions kept for retry while the database refuses writes; the oldest go first beyond this
+MAX_QUEUED = 10000
+
+DEFAULT_RULES = (
+    # name, selector, op, threshold, duration, hysteresis, level
+    ("GPU 温度过高", "gpu.*.temp", ">=", 85, 30, 3, "严重"),
+    ("GPU 功耗过高", "gpu.*.power", ">=", 700, 60, 20, "警告"),
+    ("CPU 使用率过高", "cpu", ">=", 95, 60, 5, "警告"),
+    ("内存使用率过高", "mem", ">=", 95, 60, 3, "警告"),
+)
+
+
+# Compiles rules x series into flat parallel lists once (again only when rules
+# or the series set change). Checks on the same series are kept sorted by
+# threshold, so a tick costs one bisect per series plus a short loop over the
+# few checks that are breached, pending or firing.
+class AlertEngine:
+    def __init__(self):
+        self.rules: List[Dict[str, Any]] = []
+        self.fired = 0
+        self.resolved = 0
+        self.last_eval_us = 0.0
+        self.write_errors = 0
+        self.dropped = 0
+        self.last_error = ""
+        # cached COUNT(*) of status='未确认', kept in step with every write
+        self.unacked = 0
+        self._names: frozenset = frozenset()
+        self._dirty = True
+        # compiled checks
+        self._keys: List[Tuple[int, str]] = []
+        self._series: List[str] = []
+        self._sign: List[int] = []
+        self._thr: List[float] = []
+        self._cut: List[float] = []
+        self._rule: List[Dict[str, Any]] = []
+        self._idx: Dict[Tuple[int, str], int] = {}
+        self._groups: List[Tuple[str, int, List[float], List[int]]] = []
+        # (rule_id, series) -> [pending_since, firing]
+        self._state: Dict[Tuple[int, str], list] = {}
+        self._fired: List[tuple] = []
+        self._resolved: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        rules = [dict(r) for r in dbm.alert_rule_list(enabled_only=True)]
+        unacked = dbm.alerts_count_unacked()
+        with self._lock:
+            self.rules = rules
+            self.unacked = unacked
+            self._dirty = True
+            for r in dbm.alerts_open_by_rule():
+                self._state[(r["rule_id"], r["obj"])] = [0.0, True]
+
+    def _compile(self, names):
+        keys, series, sign, thr, cut, rule = [], [], [], [], [], []
+        for r in self.rules:
+            s, inc = OPS[r["op"]]
+            for n in match_names(names, r["selector"].split(',')):
+                keys.append((r["id"], n))
+                series.append(n)
+                sign.append(s)
+                thr.append(r["threshold"] * s)
+                cut.append(math.nextafter(r["threshold"] * s, -math.inf) if inc else r["threshold"] * s)
+                rule.append(r)
+        self._keys, self._series, self._sign, self._thr, self._cut, self._rule = keys, series, sign, thr, cut, rule
+        self._idx = {k: i for i, k in enumerate(keys)}
+        # per (series, sign): cut points sorted ascending, so one bisect finds every breached check
+        groups: Dict[Tuple[str, int], List[Tuple[float, int]]] = {}
+        for i, (n, sg, c) in enumerate(zip(series, sign, cut)):
+            groups.setdefault((n, sg), []).append((c, i))
+        self._groups = [(n, sg, [c for c, _ in sorted(g)], [i for _, i in sorted(g)]) for (n, sg), g in groups.items()]
+        live = set(keys)
+        # drop state of deleted rules / vanished series, resolving what was firing
+        for k in [k for k in self._state if k not in live]:
+            if self._state.pop(k)[1]:
+                self._resolved.append((time.strftime("%Y-%m-%d %H:%M:%S"), k[0], k[1]))
+        self._names = frozenset(names)
+        self._dirty = False
+
+    def evaluate(self, now: float, values: Dict[str, Optional[float]]):
+        t0 = time.perf_counter()
+        with self._lock:
+            if self._dirty or len(values) != len(self._names) or any(n not in self._names for n in values):
+                self._compile(values)
+            get = values.get
+            hot = set()
+            for name, sg, cuts, idxs in self._groups:
+                v = get(name, NAN) * sg
+                # NaN (missing) never breaches
+                if v == v:
+                    k = bisect_left(cuts, v)
+                    if k:
+                        hot.update(idxs[:k])
+            state = self._state
+            if hot or state:
+                idx = self._idx
+                todo = hot | {idx[k] for k in state if k in idx}
+                stamp = None
+                for i in todo:
+                    key, r = self._keys[i], self._rule[i]
+                    st = state.get(key)
+                    if i in hot:
+                        if st is None:
+                            st = state[key] = [now, False]
+                        if not st[1] and now - (st[0] or now) >= r["duration"]:
+                            st[1] = True
+                            stamp = stamp or time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+                            content = "%s: %s %s %g (当前 %g)" % (r["name"], key[1], r["op"], r["threshold"], get(key[1]))
+                            self._fired.append((stamp, key[1], content, r["level"], r["id"]))
+                        continue
+                    if st is None:
+                        continue
+                    if not st[1]:
+                        # breach ended before the duration elapsed
+                        del state[key]
+                        continue
+                    v = get(key[1], NAN)
+                    # hysteresis: stay firing until the value is clearly back on the good side
+                    if v * self._sign[i] <= self._thr[i] - r["hysteresis"]:
+                        del state[key]
+                        stamp = stamp or time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+                        self._resolved.append((stamp, key[0], key[1]))
+        self.last_eval_us = round((time.perf_counter() - t0) * 1e6, 1)
+
+    def flush(self):
+        # persist fired/resolved alerts of the last ticks in one transaction; if the write
+        # fails they go back in front of the queue and are retried on the next flush
+        with self._lock:
+            fired, self._fired = self._fired, []
+            resolved, self._resolved = self._resolved, []
+        if not fired and not resolved:
+            return fired, resolved
+        try:
+            dbm.alerts_apply(fired, resolved)
+        except Exception as e:
+            with self._lock:
+                self._fired = fired + self._fired
+                self._resolved = resolved + self._resolved
+                for q in (self._fired, self._resolved):
+                    if len(q) > MAX_QUEUED:
+                        self.dropped += len(q) - MAX_QUEUED
+                        del q[:len(q) - MAX_QUEUED]
+            self.write_errors += 1
+            self.last_error = "%s: %s" % (type(e).__name__, e)
+            return [], []
+        with self._lock:
+            self.unacked += len(fired)
+        self.fired += len(fired)
+        self.resolved += len(resolved)
+        return fired, resolved
+
+    def acked(self, n: int):
+        with self._lock:
+            self.unacked = max(0, self.unacked - n)
+
+    def reload(self):
+        self.load()
+
+    def firing(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"rule_id": k[0], "obj": k[1], "since": st[0]} for k, st in self._state.items() if st[1]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rules": len(self.rules), "checks": len(self._keys), "firing": len(self.firing()), "unacked": self.unacked,
+                "fired": self.fired, "resolved": self.resolved, "last_eval_us": self.last_eval_us,
+                "queued": len(self._fired) + len(self._resolved), "write_errors": self.write_errors,
+                "dropped": self.dropped, "last_error": self.last_error}
@@ -1,57 +1,192 @@
 import os
+import re
+import sys
 import time
 import json
 import asyncio
+import functools
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import RedirectResponse, StreamingResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Form, HTTPException, Query, Body
+from fastapi.responses import RedirectResponse, StreamingResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 
-from .crypto import hash_password, verify_password, create_token, verify_token
+from .crypto import hash_password, create_token, verify_token
 from . import db as dbm
-import platform, socket, psutil, subprocess
+from .auth import SessionCache, PasswordVerifier, LoginThrottle, Busy
+from .sampler import Sampler
+from .live import LiveChannel
+from .netmon import NetMonitor
+from .storage import StorageMonitor
+from .audit import AuditWriter
+from .logs import LogIngestor, LogTail, LogFilter, DEFAULT_FILES, SEVERITIES, fts_query
+from .alerting import AlertEngine, DEFAULT_RULES, OPS, LEVELS
+from .tsdb import MetricStore, match_names
+from .rollup import Rollup, AGGS
+from .gpu import GpuCollector, SmiStream
+from .exposition import Exposition, CONTENT_TYPE as OPENMETRICS_TYPE
+from .instrument import TIMINGS, Timings, LatencyMiddleware, LoopLag
+from .collect import sample_series
+from .fleet import Fleet, IngestError, decode_body, rollup_name, MAX_BODY
+from .shared import SharedState, Follower, default_path, SIG_ALERTS, SIG_INVENTORY, SIG_SESSIONS, \
+    SIG_PROCS
+from .procs import ProcessTable, SharedProcessTable, SORT_KEYS as PROC_SORT_KEYS
+from .inventory import Inventory, SharedInventory
+from .httpcache import (AssetManifest, HashedStaticFiles, CompressMiddleware, BodyCache, cached_body,
+                        json_etag)
+import psutil, hmac
 
 
 APP_NAME = "一体机监控系统"
 AUTH_COOKIE = "auth"
 SECRET = os.environ.get("APP_SECRET", "dev_secret_change_me")
+ROLES = ("Admin", "Operator", "Viewer")
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 STATIC_DIR = os.path.join(BASE_DIR, 'static')
 
 app = FastAPI(title=APP_NAME, version="1.0")
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+# templates link assets as asset("assets/style.css") -> /static/assets/style.css?v=<content hash>,
+# served immutable; a changed file gets a new URL
+ASSETS = AssetManifest(STATIC_DIR)
+app.mount("/static", HashedStaticFiles(directory=STATIC_DIR, manifest=ASSETS), name="static")
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
+templates.env.globals["asset"] = ASSETS.url
+# gzip (brotli when installed) for JSON/HTML/static bodies over GZIP_MIN_BYTES; added
+# first so the latency histograms include the compression time
+COMPRESSION: Dict[str, int] = {}
+app.add_middleware(CompressMiddleware, minimum_size=int(os.environ.get("GZIP_MIN_BYTES", "1024")),
+                   counters=COMPRESSION)
+# per-route latency histograms; cheap enough to stay on in production
+ROUTE_TIMINGS = Timings()
+app.add_middleware(LatencyMiddleware, timings=ROUTE_TIMINGS)
+LOOP_LAG = LoopLag(interval=0.5)
+
+# ---- production mode (run.sh prod) ----
+# ONEBOX_ROLE=collector: the single process that samples the host and writes the
+# shared segment (python -m backend.collector). ONEBOX_ROLE=worker: uvicorn
+# workers serving from that segment without touching psutil/NVML themselves.
+# Unset: one process does both, as in development.
+ROLE = os.environ.get("ONEBOX_ROLE", "")
+WORKER = ROLE == "worker"
+SHARED = SharedState(os.environ.get("SHARED_STATE") or default_path(),
+                     capacity=int(os.environ.get("HISTORY_POINTS", "43200")),
+                     max_series=int(os.environ.get("SHARED_SERIES", "1024"))) if ROLE else None
+# worker: the collector-side state of the latest tick (gpus, nics, disks, stats)
+SHARED_TICK: Dict[str, Any] = {}
 
 # ---- in-memory state for rates ----
-PREV_NET: Dict[str, Dict[str, Any]] = {}
-# keep previous disk io counters for rate calculation
-PREV_DISK: Dict[str, Any] = {}
+# counters seen by the sampler (single writer)
+NET = NetMonitor(static_ttl=15.0)
+STORAGE = StorageMonitor(probe_timeout=float(os.environ.get("STORAGE_PROBE_TIMEOUT", "1.0")), ttl=10.0)
+# in-memory history, 24h at the 2s sampler tick by default; in the shared segment in production mode
+STORE = SHARED.store if SHARED else MetricStore(capacity=int(os.environ.get("HISTORY_POINTS", "43200")))
+# durable 1m / 1h rollups in data/app.db
+ROLLUP = Rollup(tiers=(
+    (60, int(os.environ.get("ROLLUP_1M_DAYS", "30")) * 86400),
+    (3600, int(os.environ.get("ROLLUP_1H_DAYS", "400")) * 86400),
+))
+# remote nodes pushing through /api/ingest (multi-node mode)
+FLEET = Fleet(capacity=int(os.environ.get("NODE_HISTORY_POINTS", "720")), rollup=ROLLUP)
+INGEST_TOKEN = os.environ.get("INGEST_TOKEN", "")
+# threshold rules, evaluated on every sampler tick
+ALERTS = AlertEngine()
+# audit events are written in batches off the request path
+AUDIT = AuditWriter()
+# tailed system/application logs, full-text indexed in data/app.db
+LOGS = LogIngestor(os.environ.get("LOG_FILES", DEFAULT_FILES).split(','),
+                   retention_days=float(os.environ.get("LOG_RETENTION_DAYS", "7")))
+LOG_TAIL = LogTail()
+LOGS.listeners.append(LOG_TAIL.on_read)
 
 
 # ---- startup: init db and seed ----
-@app.on_event("startup")
-def on_startup():
+def prepare_db():
     dbm.init_db()
     # seed admin
     dbm.seed_admin_if_missing(hash_password("admin123"))
+    dbm.alert_rules_seed_if_empty(DEFAULT_RULES)
+
+
+async def start_collection():
+    # everything that samples the host: this process, or the collector in production mode
+    ROLLUP.load()
+    FLEET.load()
+    ALERTS.load()
+    LOGS.start()
+    # without NVML, GPU data comes from one streaming nvidia-smi process
+    if not GPU.nvml_available():
+        SMI.start()
+    # single background sampler shared by all SSE clients
+    SAMPLER.start()
+
+
+async def stop_collection():
+    await SAMPLER.stop()
+    ROLLUP.flush(final=True)
+    LOGS.stop()
+    await SMI.stop()
+    GPU.close()
+
+
+@app.on_event("startup")
+async def on_startup():
+    loop = asyncio.get_running_loop()
+    if WORKER:
+        # the collector prepares the db before it publishes the segment
+        await loop.run_in_executor(None, SHARED.open)
+        SAMPLER.interval = SHARED.interval
+        ROLLUP.load()
+    else:
+        prepare_db()
+    AUDIT.start()
+    LOG_TAIL.bind(loop)
+    if WORKER:
+        FOLLOWER.start()
+    else:
+        await start_collection()
+    LOOP_LAG.start()
+    # static hardware facts are collected once, off the request path
+    loop.run_in_executor(None, INVENTORY.get)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await LOOP_LAG.stop()
+    if WORKER:
+        await FOLLOWER.stop()
+        SHARED.close()
+    else:
+        await stop_collection()
+    AUDIT.stop()
+    LOG_TAIL.bind(None)
+    PASSWORDS.shutdown()
+    dbm.close()
 
 
 # ---- auth helpers ----
+# verified tokens -> principal; entries are dropped on logout and on user changes
+SESSIONS = SessionCache(maxsize=int(os.environ.get("SESSION_CACHE_SIZE", "4096")),
+                        ttl=float(os.environ.get("SESSION_CACHE_TTL", "60")))
+
+
 def current_user(request: Request) -> Optional[dict]:
     tok = request.cookies.get(AUTH_COOKIE)
     if not tok:
         return None
+    u = SESSIONS.get(tok)
+    if u is not None:
+        return u
     try:
         payload = verify_token(tok, SECRET)
         username = payload.get("sub")
         row = dbm.user_get_by_username(username)
         if not row or not row["enabled"]:
             return None
-        return {"username": row["username"], "role": row["role"], "email": row["email"]}
+        u = {"username": row["username"], "role": row["role"], "email": row["email"]}
+        SESSIONS.put(tok, u, payload.get("exp", 0))
+        return u
     except Exception:
         return None
 
@@ -65,24 +200,59 @@ def require_login(request: Request) -> Optional[RedirectResponse]:
 
 
 def render(name: str, request: Request, active: str):
-    return templates.TemplateResponse(name, {"request": request, "active": active, "user": request.state.user})
+    # TemplateResponse renders eagerly, so this times the Jinja work
+    with TIMINGS.time("render." + name):
+        resp = templates.TemplateResponse(name, {"request": request, "active": active, "user": request.state.user})
+    # pages carry the user's name and hashed asset URLs; never reuse a stored copy
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
 
 
 # ---- routes: auth ----
+# PBKDF2 off the event loop, with per-user / per-IP backoff on failures
+PASSWORDS = PasswordVerifier(workers=int(os.environ.get("LOGIN_WORKERS", "2")),
+                             max_pending=int(os.environ.get("LOGIN_MAX_PENDING", "32")))
+USER_THROTTLE = LoginThrottle(free=5)
+IP_THROTTLE = LoginThrottle(free=20)
+
+
+def _record_login(username: str, channel: str):
+    # runs inside the password pool job, after a successful check
+    dbm.user_update_last_login(username, time.strftime("%Y-%m-%d %H:%M:%S"))
+    AUDIT.append(username, "login", channel)
+
+
+async def _check_login(request: Request, username: str, password: str, channel: str):
+    # returns (row, None, 200) on success, else (None, error message, status)
+    ip = request.client.host if request.client else "-"
+    wait = max(USER_THROTTLE.retry_after(username), IP_THROTTLE.retry_after(ip))
+    if wait > 0:
+        return None, "尝试过于频繁，请 %d 秒后再试" % (int(wait) + 1), 429
+    try:
+        row = await PASSWORDS.login(functools.partial(dbm.user_get_by_username, username), password,
+                                    lambda row: _record_login(username, channel))
+    except Busy:
+        return None, "登录请求过多，请稍后再试", 429
+    if row is None:
+        USER_THROTTLE.failure(username)
+        IP_THROTTLE.failure(ip)
+        return None, "账号或密码错误", 401
+    USER_THROTTLE.success(username)
+    IP_THROTTLE.success(ip)
+    return row, None, 200
+
+
 @app.get("/login")
 def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 
 @app.post("/login")
-def login_submit(request: Request, username: str = Form(""), password: str = Form("")):
+async def login_submit(request: Request, username: str = Form(""), password: str = Form("")):
     username = username.strip()
-    row = dbm.user_get_by_username(username)
-    if not row or not row["enabled"] or not verify_password(password, row["password_hash"]):
-        return templates.TemplateResponse("login.html", {"request": request, "error": "账号或密码错误"})
-    now = time.strftime("%Y-%m-%d %H:%M:%S")
-    dbm.user_update_last_login(username, now)
-    dbm.audit_append(username, "login", "web")
+    row, err, status = await _check_login(request, username, password, "web")
+    if not row:
+        return templates.TemplateResponse("login.html", {"request": request, "error": err})
     token = create_token({"sub": username, "role": row["role"]}, SECRET, expire_seconds=3600 * 12)
     resp = RedirectResponse("/", status_code=302)
     resp.set_cookie(AUTH_COOKIE, token, httponly=True, samesite="lax", max_age=3600 * 12, path="/")
@@ -90,7 +260,8 @@ def login_submit(request: Request, username: str = Form(""), password: str = For
 
 
 @app.get("/logout")
-def logout():
+def logout(request: Request):
+    SESSIONS.discard(request.cookies.get(AUTH_COOKIE, ""))
     resp = RedirectResponse("/login", status_code=302)
     resp.delete_cookie(AUTH_COOKIE, path="/")
     return resp
@@ -133,6 +304,14 @@ def gpu_page(request: Request):
     return render("gpu.html", request, "gpu")
 
 
+@app.get("/processes")
+def processes_page(request: Request):
+    r = guard(request)
+    if r:
+        return r
+    return render("processes.html", request, "processes")
+
+
 @app.get("/network")
 def network_page(request: Request):
     r = guard(request)
@@ -213,28 +392,248 @@ def authed(request: Request):
     return u
 
 
+def admin_only(request: Request):
+    u = authed(request)
+    if u["role"] != "Admin":
+        raise HTTPException(403, "Forbidden")
+    return u
+
+
+def _remote(node: Optional[str]):
+    # no node = this host; anything else must be an agent that has pushed here
+    if not node:
+        return None
+    n = FLEET.get(node)
+    if n is None:
+        raise HTTPException(404, "unknown node")
+    return n
+
+
 @app.get("/api/metrics/system")
-def api_metrics_system(request: Request):
+def api_metrics_system(request: Request, node: Optional[str] = None):
     authed(request)
-    cpu = psutil.cpu_percent(interval=None)
+    n = _remote(node)
+    if n is not None:
+        return {"cpu": n.latest.get("cpu"), "mem": n.latest.get("mem"), "gpu": n.gpu_avg(),
+                "alerts": ALERTS.unacked, "ts": n.last_seen, "online": n.online(time.time(), FLEET.stale)}
+    if WORKER:
+        series = (SAMPLER.latest or {}).get("series", {})
+        return {"cpu": series.get("cpu"), "mem": series.get("mem"), "gpu": _gpu_avg_util(), "alerts": ALERTS.unacked}
+    # the sampler's reading: cpu_percent here would measure since this threadpool thread last asked
+    cpu = (SAMPLER.latest or {}).get("cpu")
     mem = psutil.virtual_memory().percent
-    # GPU avg util if available
-    gpu_list = _gpu_list()
-    if gpu_list:
+    # GPU avg util if available (served from the shared GPU snapshot)
+    gpu = _gpu_avg_util()
+    # unacknowledged alerts, counted in memory as alerts are written / acknowledged
+    return {"cpu": cpu, "mem": mem, "gpu": gpu, "alerts": ALERTS.unacked}
+
+
+@app.get("/api/metrics/history")
+def api_metrics_history(request: Request, series: str = "cpu", start: Optional[float] = Query(None, alias="from"),
+                        end: Optional[float] = Query(None, alias="to"), step: Optional[float] = None,
+                        agg: str = "avg", node: Optional[str] = None):
+    authed(request)
+    n = _remote(node)
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    if end <= start:
+        raise HTTPException(400, "bad time range")
+    if agg not in AGGS:
+        raise HTTPException(400, "bad agg")
+    if step is None:
+        # default to at most ~1000 points per series
+        step = max(SAMPLER.interval, (end - start) / 1000)
+    elif step > 0:
+        step = max(step, (end - start) / 10000)
+    patterns = series.split(',')
+    tier = ROLLUP.tier_for(step) if step > 0 else None
+    if n is not None:
+        oldest = n.store.oldest()
+        if step > 0 and not tier and (oldest is None or start < oldest):
+            # a node's ring is short; older ranges come from its 1-minute rollups
+            tier = ROLLUP.tiers[0][0]
+        if not tier:
+            return n.store.query(n.store.match(patterns), start, end, step)
+        prefix = rollup_name(n.name, "")
+        names = match_names({x[len(prefix):] for x in ROLLUP.known[tier] if x.startswith(prefix)} | set(n.store.names()),
+                            patterns)
+        out = ROLLUP.query(tier, [prefix + x for x in names], start, end, max(step, tier), agg,
+                           store=n.store, prefix=prefix)
+        out["series"] = {k[len(prefix):]: v for k, v in out["series"].items()}
+        return out
+    if tier:
+        # coarse steps are answered from pre-aggregated rollups, which also survive restarts
+        local = {x for x in ROLLUP.known[tier] if ":" not in x}
+        names = match_names(set(STORE.names()) | local, patterns)
+        return ROLLUP.query(tier, names, start, end, step, agg, store=STORE)
+    return STORE.query(STORE.match(patterns), start, end, step)
+
+
+# ---- Multi-node ----
+@app.post("/api/ingest")
+async def api_ingest(request: Request):
+    # agents authenticate with "Authorization: Bearer $INGEST_TOKEN"; no token, no ingest
+    if not INGEST_TOKEN:
+        raise HTTPException(404, "ingest disabled")
+    if WORKER:
+        # node state lives in one process; run the central instance without workers
+        raise HTTPException(503, "ingest needs single-process mode")
+    auth = request.headers.get("authorization", "")
+    if not hmac.compare_digest(auth.encode(), ("Bearer " + INGEST_TOKEN).encode()):
+        raise HTTPException(401, "unauthorized")
+    body = await request.body()
+    if len(body) > MAX_BODY:
+        raise HTTPException(413, "payload too large")
+    addr = request.client.host if request.client else ""
+    loop = asyncio.get_running_loop()
+
+    def work():
+        return FLEET.ingest(decode_body(body, request.headers.get("content-encoding", "")), addr)
+
+    try:
+        # inflate + parse + append off the event loop
+        n = await loop.run_in_executor(None, work)
+    except IngestError as e:
+        raise HTTPException(400, str(e))
+    return {"ok": True, "accepted": n}
+
+
+@app.get("/api/nodes")
+def api_nodes(request: Request):
+    authed(request)
+    return {"nodes": FLEET.nodes(), "stats": FLEET.stats()}
+
+
+# ---- Alerts ----
+def _alerts_changed(reload: bool = True):
+    # rules are evaluated where the sampler runs; in production mode that is the collector
+    if WORKER:
+        SHARED.signal(SIG_ALERTS)
+    elif reload:
+        ALERTS.reload()
+
+
+@app.get("/api/alerts")
+def api_alerts(request: Request, limit: int = 50, before: Optional[int] = None, level: Optional[str] = None,
+               obj: Optional[str] = None, status: Optional[str] = None,
+               start: Optional[str] = Query(None, alias="from"), end: Optional[str] = Query(None, alias="to")):
+    authed(request)
+    limit = max(1, min(limit, 500))
+    rows = dbm.alerts_page(limit, before, level=level, obj=obj, status=status, start=start, end=end)
+    items = [dict(r) for r in rows]
+    return {"items": items, "next": items[-1]["id"] if len(items) == limit else None, "unacked": ALERTS.unacked}
+
+
+# handlers that write sqlite are sync: FastAPI parses the JSON body and runs them
+# on the threadpool, so a write waiting on busy_timeout never holds the event loop
+@app.post("/api/alerts/ack")
+def api_alerts_ack(request: Request, body: Dict[str, Any] = Body(...)):
+    u = authed(request)
+    if body.get("ids") is not None:
         try:
-            gpu = round(sum(g.get('util', 0) for g in gpu_list) / max(1, len(gpu_list)), 1)
-        except Exception:
-            gpu = 0.0
+            ids = [int(i) for i in body["ids"]]
+        except (TypeError, ValueError):
+            raise HTTPException(400, "bad ids")
+        n = dbm.alerts_ack(ids)
     else:
-        gpu = 0.0
-    # alerts count placeholder from DB table if exists
+        n = dbm.alerts_ack(level=body.get("level"), obj=body.get("obj"), start=body.get("from"), end=body.get("to"))
+    ALERTS.acked(n)
+    _alerts_changed(reload=False)
+    AUDIT.append(u["username"], "ack_alerts", str(n))
+    return {"ok": True, "acked": n, "unacked": ALERTS.unacked}
+
+
+# ---- Audit ----
+@app.get("/api/audit")
+def api_audit(request: Request, limit: int = 50, before: Optional[int] = None, username: Optional[str] = None,
+              action: Optional[str] = None, start: Optional[str] = Query(None, alias="from"),
+              end: Optional[str] = Query(None, alias="to")):
+    authed(request)
+    limit = max(1, min(limit, 500))
+    items = [dict(r) for r in dbm.audit_page(limit, before, username, action, start, end)]
+    return {"items": items, "next": items[-1]["id"] if len(items) == limit else None}
+
+
+# ---- Logs ----
+@app.get("/api/logs/search")
+def api_logs_search(request: Request, q: Optional[str] = None, limit: int = 100, before: Optional[int] = None,
+                    source: Optional[str] = None, severity: Optional[str] = None,
+                    start: Optional[str] = Query(None, alias="from"), end: Optional[str] = Query(None, alias="to")):
+    authed(request)
+    limit = max(1, min(limit, 500))
+    if severity and severity not in SEVERITIES:
+        raise HTTPException(status_code=400, detail="未知级别")
+    match = fts_query(q) if q else None
+    items = [dict(r) for r in dbm.log_search(match, limit, before, source, severity, start, end)]
+    return {"items": items, "next": items[-1]["id"] if len(items) == limit else None}
+
+
+@app.get("/api/logs/sources")
+def api_logs_sources(request: Request):
+    authed(request)
+    files = SHARED_TICK.get("log_files", []) if WORKER else LOGS.sources()
+    return json_etag(request, {"files": files, "sources": dbm.log_sources(), "stats": _collector_stats()["logs"]})
+
+
+# ---- Alert rules ----
+@app.get("/api/alerts/rules")
+def api_alert_rules(request: Request):
+    authed(request)
+    return [dict(r) for r in dbm.alert_rule_list()]
+
+
+@app.post("/api/alerts/rules")
+def api_alert_rule_save(request: Request, body: Dict[str, Any] = Body(...)):
+    u = admin_only(request)
     try:
-        with dbm.get_db() as db:
-            cur = db.execute("SELECT COUNT(*) AS c FROM alerts WHERE status='未确认'")
-            alerts = cur.fetchone()[0]
-    except Exception:
-        alerts = 0
-    return {"cpu": cpu, "mem": mem, "gpu": gpu, "alerts": alerts}
+        rule = {
+            "id": int(body["id"]) if body.get("id") else None,
+            "name": str(body["name"]).strip(),
+            "selector": str(body["selector"]).strip(),
+            "op": body["op"],
+            "threshold": float(body["threshold"]),
+            "duration": float(body.get("duration") or 0),
+            "hysteresis": float(body.get("hysteresis") or 0),
+            "level": body.get("level") or "警告",
+            "enabled": int(bool(body.get("enabled", True))),
+        }
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(400, "bad rule")
+    if not rule["name"] or not rule["selector"] or rule["op"] not in OPS or rule["level"] not in LEVELS:
+        raise HTTPException(400, "bad rule")
+    rid = dbm.alert_rule_upsert(rule)
+    _alerts_changed()
+    AUDIT.append(u["username"], "save_alert_rule", rule["name"])
+    return {"ok": True, "id": rid}
+
+
+@app.delete("/api/alerts/rules/{rule_id}")
+def api_alert_rule_delete(rule_id: int, request: Request):
+    u = admin_only(request)
+    dbm.alert_rule_delete(rule_id)
+    _alerts_changed()
+    AUDIT.append(u["username"], "delete_alert_rule", str(rule_id))
+    return {"ok": True}
+
+
+# ---- Reports ----
+CAPACITY_SERIES = "cpu,mem,gpu.*.util,gpu.*.mem,gpu.*.power,net.*.rx,net.*.tx,disk.read,disk.write"
+
+
+@app.get("/api/reports/capacity")
+def api_reports_capacity(request: Request, month: Optional[str] = None, series: str = CAPACITY_SERIES):
+    authed(request)
+    try:
+        t = time.strptime(month or time.strftime("%Y-%m"), "%Y-%m")
+    except ValueError:
+        raise HTTPException(400, "month must be YYYY-MM")
+    start = time.mktime(t)
+    y, m = (t.tm_year + 1, 1) if t.tm_mon == 12 else (t.tm_year, t.tm_mon + 1)
+    end = time.mktime((y, m, 1, 0, 0, 0, 0, 0, -1))
+    names = match_names(ROLLUP.known[3600], series.split(','))
+    summary = ROLLUP.summary(3600, names, start, end)
+    rows = [{"series": n, **summary[n]} for n in names if n in summary]
+    return {"month": time.strftime("%Y-%m", t), "rows": rows}
 
 
 @app.get("/api/users")
@@ -250,35 +649,354 @@ def api_users(request: Request):
             "s": "启用" if r["enabled"] else "禁用",
             "t": r["last_login"] or "-",
         })
-    return data
+    return json_etag(request, data)
+
+
+@app.post("/api/users/{username}")
+def api_user_update(username: str, request: Request, body: Dict[str, Any] = Body(...)):
+    u = admin_only(request)
+    role = body.get("role")
+    enabled = body.get("enabled")
+    if role is not None and role not in ROLES:
+        raise HTTPException(400, "bad role")
+    if not dbm.user_get_by_username(username):
+        raise HTTPException(404, "Not found")
+    dbm.user_update(username, role, None if enabled is None else int(bool(enabled)))
+    # cached sessions must not outlive a disable or a role change, in any worker
+    SESSIONS.invalidate_user(username)
+    if SHARED is not None:
+        SHARED.signal(SIG_SESSIONS)
+    AUDIT.append(u["username"], "update_user", username)
+    return {"ok": True}
+
+
+@app.get("/api/admin/session-cache")
+def api_admin_session_cache(request: Request):
+    admin_only(request)
+    return SESSIONS.stats()
+
+
+@app.get("/api/admin/perf")
+def api_admin_perf(request: Request):
+    admin_only(request)
+    routes = [{"method": k[0], "route": k[1], **h.summary()} for k, h in ROUTE_TIMINGS.items()]
+    out = {"routes": routes, "collectors": TIMINGS.summary(), "loop_lag": LOOP_LAG.summary(),
+           "sampler": {"ticks": _collector_stats()["ticks"], "interval": SAMPLER.interval}}
+    if WORKER:
+        out["shared"] = {"pid": os.getpid(), "frames": FOLLOWER.frames, "age": FOLLOWER.age(), "retries": SHARED.retries}
+    out["inventory"] = INVENTORY.stats()
+    out["http_cache"] = {"bodies": BODIES.stats(), "compression": COMPRESSION}
+    return out
 
 
 # ---- SSE（实时） ----
+def _collect_metrics() -> Dict[str, Any]:
+    # only the sampler task calls this, so the rate trackers have a single writer
+    global _procs_until
+    now = time.time()
+    series, gpus = sample_series(GPU, NET, STORAGE, now)
+    cpu = series["cpu"]
+    read_rate, write_rate = series["disk.read"], series["disk.write"]
+    with TIMINGS.time("collect.store"):
+        STORE.append(now, series)
+        ROLLUP.add(now, series)
+    with TIMINGS.time("collect.alerts"):
+        if SHARED is not None and SHARED.signalled(SIG_ALERTS):
+            # a worker acknowledged alerts or edited rules
+            ALERTS.reload()
+        ALERTS.evaluate(now, series)
+    # remote nodes' rollup buckets are flushed here as well; each flush keeps its own
+    # rows on failure, and one failing does not skip the others
+    for name, flush in (("rollup", ROLLUP.flush), ("alerts", ALERTS.flush), ("fleet", FLEET.flush)):
+        try:
+            with TIMINGS.time("collect.flush." + name):
+                flush()
+        except Exception as e:
+            if not FLUSH_ERRORS.get(name):
+                print("flush %s failed: %s: %s" % (name, type(e).__name__, e), file=sys.stderr)
+            FLUSH_ERRORS[name] = FLUSH_ERRORS.get(name, 0) + 1
+    gpu = round(sum(g.get('util', 0) for g in gpus)/len(gpus), 1) if gpus else 0.0
+    frame = {
+        "ts": now,
+        "cpu": cpu,
+        "gpu": gpu,
+        "disk_read": round(read_rate, 2),
+        "disk_write": round(write_rate, 2),
+        # full per-series sample, only consumed by the /events/live channel
+        "series": series,
+    }
+    if ROLE == "collector":
+        # everything workers serve besides the series, gathered here so they never sample
+        with TIMINGS.time("collect.shared"):
+            frame["shared"] = {"gpus": gpus, "nics": NET.interfaces(), "disks": STORAGE.disks(),
+                               "io": STORAGE.io_rates(), "unacked": ALERTS.unacked, "log_files": LOGS.sources(),
+                               "stats": _collector_stats()}
+        if SHARED.signalled(SIG_INVENTORY):
+            # an admin asked a worker for a new inventory; collected beside the sampler
+            INVENTORY.request_publish(INVENTORY_PATH)
+        frame["shared"]["inventory"] = INVENTORY.published
+        if SHARED.signalled(SIG_PROCS):
+            _procs_until = now + PROCS_DEMAND
+        if now < _procs_until:
+            # the process table only while a worker has asked for it recently
+            with TIMINGS.time("collect.shared_procs"):
+                PROCS.refresh()
+                frame["shared"]["procs"] = PROCS.export()
+    return frame
+
+
+# collector: publish the process table until then (see SIG_PROCS)
+_procs_until = 0.0
+# failed flushes per kind since start; the first one of each kind is printed
+FLUSH_ERRORS: Dict[str, int] = {}
+
+
+def _collector_stats() -> Dict[str, Any]:
+    # counters owned by the sampling process; workers report the collector's
+    if WORKER and "stats" in SHARED_TICK:
+        return SHARED_TICK["stats"]
+    return {"alerts": ALERTS.stats(), "logs": LOGS.stats(), "ticks": SAMPLER.ticks, "rollup_written": ROLLUP.written,
+            "flush_errors": dict(FLUSH_ERRORS),
+            "hung_mounts": len(STORAGE.hung()),
+            # where the last snapshot came from; nvml_available() waits on the GPU lock during a sweep
+            "nvml": not WORKER and GPU.source == "nvml"}
+
+
+SAMPLER = Sampler(_collect_metrics, interval=2.0)
+LIVE = LiveChannel()
+SAMPLER.listeners.append(LIVE.on_frame)
+METRIC_FIELDS = ("cpu", "gpu", "disk_read", "disk_write")
+if ROLE == "collector":
+    SAMPLER.listeners.append(SHARED.publish)
+_known_at = 0.0
+
+
+def _on_shared(seq: int, frame: Dict[str, Any]):
+    # worker: a tick from the collector, fanned out to this process's SSE clients
+    global _known_at
+    tick = frame.pop("shared", None) or {}
+    procs = tick.pop("procs", None)
+    if procs is not None:
+        PROCS.load(procs)
+    SHARED_TICK.clear()
+    SHARED_TICK.update(tick)
+    ALERTS.unacked = tick.get("unacked", ALERTS.unacked)
+    if "inventory" in tick:
+        # a new build from the collector is read on the next request
+        INVENTORY.sync(tick["inventory"])
+    if SHARED.signalled(SIG_SESSIONS):
+        # a user was disabled or changed role through another worker; the slot
+        # does not say who, and a miss costs one token check
+        SESSIONS.clear()
+    SAMPLER.publish(frame, seq)
+    loop = asyncio.get_running_loop()
+    newest = _collector_stats()["logs"]["last_id"]
+    if LOG_TAIL.subscribers:
+        loop.run_in_executor(None, LOG_TAIL.catch_up, newest)
+    else:
+        LOG_TAIL.cursor = newest
+    if time.time() - _known_at >= 60:
+        # series names for rollup queries; the collector adds new ones as buckets close
+        _known_at = time.time()
+        loop.run_in_executor(None, ROLLUP.load)
+
+
+FOLLOWER = Follower(SHARED, _on_shared) if WORKER else None
+
+
+SSE_HEARTBEAT = 15.0
+
+
 @app.get("/events/metrics")
-async def sse_metrics(request: Request):
+async def sse_metrics(request: Request, fields: Optional[str] = None, interval: Optional[float] = None):
+    authed(request)
+    keep = {f.strip() for f in fields.split(',') if f.strip()} if fields else set(METRIC_FIELDS)
+    # small tolerance so tick jitter does not skip a frame the client asked for
+    every = max(SAMPLER.interval, interval or 0) - 0.25 * SAMPLER.interval
+    try:
+        last_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        last_id = None
+
+    async def gen():
+        loop = asyncio.get_running_loop()
+        sub = SAMPLER.subscribe(last_id)
+        sent_ts = 0.0
+        last_write = loop.time()
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                item = await sub.get(timeout=SAMPLER.interval)
+                if item is not None and item[1].get("ts", 0) - sent_ts >= every:
+                    seq, data = item
+                    sent_ts = data.get("ts", 0)
+                    data = {k: v for k, v in data.items() if (k in keep and k != "series") or k == "ts"}
+                    if sub.dropped:
+                        data = {**data, "dropped": sub.dropped}
+                    last_write = loop.time()
+                    yield f"id: {seq}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                elif loop.time() - last_write >= SSE_HEARTBEAT:
+                    # comment line keeps proxies open and surfaces dead sockets
+                    last_write = loop.time()
+                    yield ": ping\n\n"
+        finally:
+            SAMPLER.unsubscribe(sub)
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/events/live")
+async def sse_live(request: Request):
+    authed(request)
+
+    async def gen():
+        loop = asyncio.get_running_loop()
+        sub = LIVE.subscribe()
+        version = 0
+        dropped = 0
+        last_write = loop.time()
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                item = await sub.get(timeout=SAMPLER.interval)
+                if item is not None:
+                    lf = item[1]
+                    last_write = loop.time()
+                    if lf.version != version:
+                        version, dropped = lf.version, sub.dropped
+                        yield lf.schema + lf.key
+                    elif sub.dropped != dropped:
+                        # missed deltas cannot be applied, resync with a key frame
+                        dropped = sub.dropped
+                        yield lf.key
+                    else:
+                        yield lf.delta
+                elif loop.time() - last_write >= SSE_HEARTBEAT:
+                    last_write = loop.time()
+                    yield ": ping\n\n"
+        finally:
+            LIVE.unsubscribe(sub)
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/events/logs")
+async def sse_logs(request: Request, q: Optional[str] = None, level: Optional[str] = None,
+                   source: Optional[str] = None, regex: bool = False):
     authed(request)
+    levels = [x for x in (level or "").split(',') if x]
+    if any(x not in SEVERITIES for x in levels):
+        raise HTTPException(status_code=400, detail="未知级别")
+    if q and len(q) > 200:
+        raise HTTPException(status_code=400, detail="过滤表达式过长")
+    try:
+        flt = LogFilter(q, levels, [x for x in (source or "").split(',') if x], regex=regex)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail="无效或不安全的正则表达式: %s" % e)
+    try:
+        last_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        last_id = None
 
     async def gen():
-        global PREV_DISK
-        while True:
-            io = psutil.disk_io_counters()
-            now = time.time()
-            read_rate = write_rate = 0.0
-            if PREV_DISK:
-                dt = max(0.001, now - PREV_DISK['ts'])
-                read_rate = (io.read_bytes - PREV_DISK['read']) / dt / 1024 / 1024
-                write_rate = (io.write_bytes - PREV_DISK['write']) / dt / 1024 / 1024
-            PREV_DISK = {'ts': now, 'read': io.read_bytes, 'write': io.write_bytes}
-            data = {
-                "cpu": psutil.cpu_percent(interval=None),
-                "gpu": (_gpu_avg_util() or 0.0),
-                "disk_read": round(read_rate, 2),
-                "disk_write": round(write_rate, 2)
-            }
-            yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-            await asyncio.sleep(2)
-
-    return StreamingResponse(gen(), media_type="text/event-stream")
+        loop = asyncio.get_running_loop()
+        sub = LOG_TAIL.subscribe(flt)
+        dropped = 0
+        last_write = loop.time()
+        try:
+            yield "retry: 3000\n\n"
+            if last_id is not None:
+                # resume: what was ingested while the client was away, one frame per file run
+                rows = [r for r in await loop.run_in_executor(None, dbm.log_after, last_id) if flt.match(tuple(r)[1:])]
+                i = 0
+                while i < len(rows):
+                    j = i
+                    while j < len(rows) and rows[j]["file"] == rows[i]["file"]:
+                        j += 1
+                    seq, data = LOG_TAIL.encode(rows[i]["file"], [[r["id"], *tuple(r)[1:6]] for r in rows[i:j]])
+                    yield f"id: {seq}\ndata: {data}\n\n"
+                    i = j
+            while not await request.is_disconnected():
+                item = await sub.get(timeout=SAMPLER.interval)
+                if item is not None:
+                    seq, data = item
+                    last_write = loop.time()
+                    if sub.dropped != dropped:
+                        # frames were lost while the client lagged; say how many before the next one
+                        yield f"event: dropped\ndata: {sub.dropped - dropped}\n\n"
+                        dropped = sub.dropped
+                    yield f"id: {seq}\ndata: {data}\n\n"
+                elif loop.time() - last_write >= SSE_HEARTBEAT:
+                    last_write = loop.time()
+                    yield ": ping\n\n"
+        finally:
+            LOG_TAIL.unsubscribe(sub)
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ---- Prometheus / OpenMetrics ----
+# scrapers authenticate with "Authorization: Bearer $METRICS_TOKEN"; without a
+# token configured only loopback clients may scrape
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+
+def _internal_metrics() -> List[tuple]:
+    sess, pw, audit, coll = SESSIONS.stats(), PASSWORDS.stats(), AUDIT.stats(), _collector_stats()
+    logs, alerts = coll["logs"], coll["alerts"]
+    return [
+        ("alerts_unacknowledged", "gauge", "Unacknowledged alerts", [(None, alerts["unacked"])]),
+        ("alerts_firing", "gauge", "Alert checks currently firing", [(None, alerts["firing"])]),
+        ("alerts_fired", "counter", "Alerts raised", [(None, alerts["fired"])]),
+        ("alert_eval_microseconds", "gauge", "Duration of the last rule evaluation", [(None, alerts["last_eval_us"])]),
+        ("alert_write_errors", "counter", "Failed writes of alert transitions (retried)", [(None, alerts["write_errors"])]),
+        ("sampler_ticks", "counter", "Sampler collections", [(None, coll["ticks"])]),
+        ("stream_subscribers", "gauge", "Open SSE streams",
+         [({"stream": "metrics"}, SAMPLER.subscribers), ({"stream": "live"}, LIVE.subscribers),
+          ({"stream": "logs"}, LOG_TAIL.subscribers)]),
+        ("session_cache_lookups", "counter", "Session cache lookups",
+         [({"result": "hit"}, sess["hits"]), ({"result": "miss"}, sess["misses"])]),
+        ("session_cache_entries", "gauge", "Cached sessions", [(None, sess["size"])]),
+        ("login_rejected", "counter", "Logins turned away while the verifier was saturated", [(None, pw["rejected"])]),
+        ("login_throttled", "counter", "Login attempts refused by backoff",
+         [({"key": "user"}, USER_THROTTLE.blocked), ({"key": "ip"}, IP_THROTTLE.blocked)]),
+        ("audit_written", "counter", "Audit events written", [(None, audit["written"])]),
+        ("audit_queued", "gauge", "Audit events waiting to be written", [(None, audit["queued"] + audit["spilled"])]),
+        ("audit_dropped", "counter", "Audit events lost after failed writes", [(None, audit["dropped"])]),
+        ("log_lines_ingested", "counter", "Log lines ingested", [(None, logs["lines"])]),
+        ("rollup_rows_written", "counter", "Rollup rows written", [(None, coll["rollup_written"])]),
+        ("collector_flush_errors", "counter", "Failed rollup / alert / fleet flushes",
+         [({"kind": k}, coll.get("flush_errors", {}).get(k, 0)) for k in ("rollup", "alerts", "fleet")]),
+        ("storage_hung_mounts", "gauge", "Mounts whose statvfs has not returned", [(None, coll["hung_mounts"])]),
+        ("fleet_nodes", "gauge", "Agents known / online",
+         [({"state": "known"}, FLEET.stats()["nodes"]), ({"state": "online"}, FLEET.stats()["online"])]),
+        ("fleet_samples", "counter", "Samples ingested from agents", [(None, FLEET.samples)]),
+        ("gpu_nvml", "gauge", "1 when GPU data comes from NVML, 0 for nvidia-smi", [(None, coll["nvml"])]),
+        ("http_request_duration_seconds", "histogram", "Time to response headers per route",
+         [({"method": k[0], "route": k[1]}, h) for k, h in ROUTE_TIMINGS.items()]),
+        ("collector_duration_seconds", "histogram", "Collector, render and DB helper durations",
+         [({"name": k}, h) for k, h in TIMINGS.items()]),
+        ("event_loop_lag_seconds", "histogram", "Event loop wake-up delay", [(None, LOOP_LAG.hist)]),
+    ]
+
+
+EXPOSITION = Exposition(_internal_metrics)
+SAMPLER.listeners.append(EXPOSITION.on_frame)
+
+
+# sync: building the body reads collector state that may sit behind locks
+@app.get("/metrics")
+def openmetrics(request: Request):
+    if METRICS_TOKEN:
+        auth = request.headers.get("authorization", "")
+        if not hmac.compare_digest(auth.encode(), ("Bearer " + METRICS_TOKEN).encode()):
+            raise HTTPException(status_code=401, detail="unauthorized", headers={"WWW-Authenticate": "Bearer"})
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="METRICS_TOKEN not configured")
+    return Response(EXPOSITION.body(), media_type=OPENMETRICS_TYPE)
 
 
 # ---- Auth JSON APIs (for XHR login/logout) ----
@@ -300,13 +1018,10 @@ async def api_auth_login(request: Request):
     if not username or not password:
         return JSONResponse({"ok": False, "error": "缺少用户名或密码"}, status_code=400)
 
-    row = dbm.user_get_by_username(username)
-    if not row or not row["enabled"] or not verify_password(password, row["password_hash"]):
-        return JSONResponse({"ok": False, "error": "账号或密码错误"}, status_code=401)
+    row, err, status = await _check_login(request, username, password, "api")
+    if not row:
+        return JSONResponse({"ok": False, "error": err}, status_code=status)
 
-    now = time.strftime("%Y-%m-%d %H:%M:%S")
-    dbm.user_update_last_login(username, now)
-    dbm.audit_append(username, "login", "api")
     token = create_token({"sub": username, "role": row["role"]}, SECRET, expire_seconds=3600 * 12)
     resp = JSONResponse({"ok": True})
     resp.set_cookie(AUTH_COOKIE, token, httponly=True, samesite="lax", max_age=3600 * 12, path="/")
@@ -314,7 +1029,8 @@ async def api_auth_login(request: Request):
 
 
 @app.post("/api/auth/logout")
-def api_auth_logout():
+def api_auth_logout(request: Request):
+    SESSIONS.discard(request.cookies.get(AUTH_COOKIE, ""))
     resp = JSONResponse({"ok": True})
     resp.delete_cookie(AUTH_COOKIE, path="/")
     return resp
@@ -329,185 +1045,153 @@ def api_auth_me(request: Request):
 
 
 # ---- Hardware/System APIs ----
-def _uptime_seconds() -> int:
-    try:
-        boot = psutil.boot_time()
-        return int(time.time() - boot)
-    except Exception:
-        return 0
-
-
+# static facts come from INVENTORY (collected once); only memory use and uptime are read per request
 @app.get("/api/hardware/summary")
 def api_hw_summary(request: Request):
     authed(request)
+    inv = INVENTORY.get()[1]
+    host, cpu, mem = inv["host"] or {}, inv["cpu"] or {}, inv["memory"] or {}
     vm = psutil.virtual_memory()
-    try:
-        host = socket.gethostname()
-    except Exception:
-        host = "-"
     data = {
-        "hostname": host,
-        "os": platform.system(),
-        "os_version": platform.version(),
-        "kernel": platform.release(),
-        "arch": platform.machine(),
-        "cpu_physical": psutil.cpu_count(logical=False) or 0,
-        "cpu_logical": psutil.cpu_count(logical=True) or 0,
-        "mem_total_gb": round(vm.total/1024/1024/1024, 1),
+        "hostname": host.get("hostname", "-"),
+        "os": host.get("os", ""),
+        "os_version": host.get("os_version", ""),
+        "kernel": host.get("kernel", ""),
+        "arch": host.get("arch", ""),
+        "cpu_physical": cpu.get("physical", 0),
+        "cpu_logical": cpu.get("logical", 0),
+        "mem_total_gb": mem.get("total_gb", 0),
         "mem_used_gb": round((vm.total - vm.available)/1024/1024/1024, 1),
-        "uptime_seconds": _uptime_seconds(),
+        "uptime_seconds": int(time.time() - host.get("boot_time", time.time())),
     }
     return data
 
 
+@app.get("/api/hardware/inventory")
+def api_hw_inventory(request: Request):
+    authed(request)
+    etag, _, body = INVENTORY.get()
+    # revalidated on every load, a 304 while nothing was refreshed
+    return cached_body(request, etag, body)
+
+
+@app.post("/api/hardware/inventory/refresh")
+def api_hw_inventory_refresh(request: Request):
+    u = admin_only(request)
+    if WORKER:
+        # the collector rebuilds; its next tick announces the result
+        before = INVENTORY.published[0]
+        SHARED.signal(SIG_INVENTORY)
+        if not INVENTORY.wait(before, INVENTORY_TIMEOUT):
+            raise HTTPException(504, "硬件清单采集超时")
+        etag = INVENTORY.get()[0]
+    else:
+        etag, _, _ = INVENTORY.refresh()
+    AUDIT.append(u["username"], "refresh_inventory", etag)
+    return {"ok": True, "etag": etag}
+
+
 # ---- GPU APIs ----
+GPU = GpuCollector(max_age=float(os.environ.get("GPU_MAX_AGE", "1.0")))
+SMI = SmiStream(GPU, interval_ms=1000)
+# production mode: the collector collects and writes the body next to the
+# segment, workers serve that file and never touch NVML or nvidia-smi for it
+INVENTORY_PATH = SHARED.path + ".inventory" if SHARED is not None else None
+INVENTORY = SharedInventory(INVENTORY_PATH) if WORKER else Inventory(GPU, SMI.cmd)
+INVENTORY_TIMEOUT = 30.0
+
+
+@TIMINGS.timed("collect._gpu_list")
 def _gpu_list() -> List[Dict[str, Any]]:
-    # Try pynvml first
-    try:
-        import pynvml
-        try:
-            pynvml.nvmlInit()
-            count = pynvml.nvmlDeviceGetCount()
-            out = []
-            for i in range(count):
-                h = pynvml.nvmlDeviceGetHandleByIndex(i)
-                name = pynvml.nvmlDeviceGetName(h).decode() if isinstance(pynvml.nvmlDeviceGetName(h), bytes) else pynvml.nvmlDeviceGetName(h)
-                util = 0
-                mem_used = mem_total = 0
-                temp = power = 0
-                try:
-                    ur = pynvml.nvmlDeviceGetUtilizationRates(h)
-                    util = getattr(ur, 'gpu', 0)
-                except Exception:
-                    pass
-                try:
-                    mi = pynvml.nvmlDeviceGetMemoryInfo(h)
-                    mem_used = int(mi.used/1024/1024)
-                    mem_total = int(mi.total/1024/1024)
-                except Exception:
-                    pass
-                try:
-                    temp = pynvml.nvmlDeviceGetTemperature(h, pynvml.NVML_TEMPERATURE_GPU)
-                except Exception:
-                    pass
-                try:
-                    power = int(pynvml.nvmlDeviceGetPowerUsage(h)/1000)
-                except Exception:
-                    pass
-                out.append({"id": i, "name": name, "util": util, "mem_used_mb": mem_used, "mem_total_mb": mem_total, "temp_c": temp, "power_w": power})
-            try:
-                pynvml.nvmlShutdown()
-            except Exception:
-                pass
-            return out
-        except Exception:
-            pass
-    except Exception:
-        pass
-    # Fallback to nvidia-smi
-    try:
-        cmd = ["nvidia-smi", "--query-gpu=name,utilization.gpu,temperature.gpu,power.draw,memory.used,memory.total", "--format=csv,noheader,nounits"]
-        out = subprocess.check_output(cmd, stderr=subprocess.STDOUT, universal_newlines=True, timeout=2)
-        rows = []
-        for line in out.strip().splitlines():
-            parts = [p.strip() for p in line.split(',')]
-            if len(parts) >= 6:
-                rows.append({
-                    "id": len(rows),
-                    "name": parts[0],
-                    "util": float(parts[1]) if parts[1] else 0.0,
-                    "temp_c": float(parts[2]) if parts[2] else 0.0,
-                    "power_w": float(parts[3]) if parts[3] else 0.0,
-                    "mem_used_mb": float(parts[4]) if parts[4] else 0.0,
-                    "mem_total_mb": float(parts[5]) if parts[5] else 0.0,
-                })
-        return rows
-    except Exception:
-        return []
+    if WORKER:
+        return SHARED_TICK.get("gpus", [])
+    return GPU.snapshot()[1]
 
 
 def _gpu_avg_util() -> float:
+    if WORKER:
+        return (SAMPLER.latest or {}).get("gpu", 0.0)
     try:
-        gl = _gpu_list()
-        if not gl:
-            return 0.0
-        return round(sum(g.get('util', 0) for g in gl)/max(1, len(gl)), 1)
+        return GPU.avg_util()
     except Exception:
         return 0.0
 
 
 @app.get("/api/gpu")
-def api_gpu(request: Request):
+def api_gpu(request: Request, node: Optional[str] = None):
+    authed(request)
+    n = _remote(node)
+    return json_etag(request, n.gpus if n is not None else _gpu_list())
+
+
+# ---- Processes ----
+# scanned on demand, at most once per PROC_SCAN_TTL however many tabs poll. In
+# production mode the collector scans while workers keep asking (SIG_PROCS)
+# and workers serve its rows: only one process walks /proc and talks to NVML.
+PROC_SCAN_TTL = float(os.environ.get("PROC_SCAN_TTL", "2.0"))
+PROCS = SharedProcessTable(max_age=PROC_SCAN_TTL) if WORKER else \
+    ProcessTable(gpu_procs=GPU.processes, max_age=PROC_SCAN_TTL)
+# seconds the collector keeps publishing processes after the last request
+PROCS_DEMAND = 15.0
+
+
+@app.get("/api/processes")
+def api_processes(request: Request, sort: str = "cpu", order: Optional[str] = None, limit: int = 50,
+                  q: Optional[str] = None):
     authed(request)
-    return _gpu_list()
+    if sort not in PROC_SORT_KEYS or order not in (None, "asc", "desc"):
+        raise HTTPException(400, "bad sort")
+    limit = max(1, min(limit, 500))
+    if WORKER:
+        SHARED.signal(SIG_PROCS)
+    with TIMINGS.time("collect.processes"):
+        return PROCS.top(sort, limit, None if order is None else order == "desc", q)
 
 
 # ---- Network APIs ----
+# encoded response bodies that are reused until their snapshot changes
+BODIES = BodyCache()
+
+
+@TIMINGS.timed("collect._net_interfaces")
 def _net_interfaces() -> List[Dict[str, Any]]:
-    global PREV_NET
-    stats = psutil.net_if_stats()
-    addrs = psutil.net_if_addrs()
-    io_now = psutil.net_io_counters(pernic=True)
-    now = time.time()
-    out = []
-    for name, st in stats.items():
-        ipv4 = next((a.address for a in addrs.get(name, []) if getattr(a, 'family', None).__class__.__name__=='' or str(a.family).endswith('AF_INET')), None)
-        ipv6 = next((a.address for a in addrs.get(name, []) if str(a.family).endswith('AF_INET6')), None)
-        mac = next((a.address for a in addrs.get(name, []) if str(a.family).endswith('AF_LINK') or str(a.family).endswith('AF_PACKET')), None)
-        io = io_now.get(name)
-        rx_rate = tx_rate = 0.0
-        if io is not None:
-            prev = PREV_NET.get(name)
-            if prev:
-                dt = max(0.001, now - prev['ts'])
-                rx_rate = ((io.bytes_recv - prev['rx']) * 8 / 1_000_000) / dt
-                tx_rate = ((io.bytes_sent - prev['tx']) * 8 / 1_000_000) / dt
-            PREV_NET[name] = { 'rx': io.bytes_recv, 'tx': io.bytes_sent, 'ts': now }
-        out.append({
-            'name': name,
-            'isup': st.isup,
-            'speed_mbps': st.speed or 0,
-            'mtu': st.mtu,
-            'ipv4': ipv4,
-            'ipv6': ipv6,
-            'mac': mac,
-            'rx_bytes': getattr(io, 'bytes_recv', 0) if io else 0,
-            'tx_bytes': getattr(io, 'bytes_sent', 0) if io else 0,
-            'rx_rate_mbps': round(rx_rate, 1),
-            'tx_rate_mbps': round(tx_rate, 1),
-        })
-    return out
+    # rates are computed by the sampler on its fixed tick; this is just the latest snapshot
+    if WORKER:
+        return SHARED_TICK.get("nics", [])
+    return NET.interfaces()
 
 
 @app.get("/api/network/interfaces")
-def api_network_interfaces(request: Request):
+def api_network_interfaces(request: Request, node: Optional[str] = None):
     authed(request)
-    return _net_interfaces()
+    n = _remote(node)
+    # the list only changes when a sample lands, so polls within a tick reuse the encoded body
+    if n is not None:
+        return BODIES.respond(request, ("nics", n.name), n.last_ts, lambda: n.nics)
+    return BODIES.respond(request, ("nics", None), SAMPLER.seq, _net_interfaces)
 
 
 # ---- Storage APIs ----
 @app.get("/api/storage/disks")
-def api_storage_disks(request: Request):
+def api_storage_disks(request: Request, node: Optional[str] = None):
     authed(request)
-    parts = []
-    for p in psutil.disk_partitions(all=False):
-        try:
-            u = psutil.disk_usage(p.mountpoint)
-            parts.append({
-                'device': p.device,
-                'mountpoint': p.mountpoint,
-                'fstype': p.fstype,
-                'total_gb': round(u.total/1024/1024/1024, 2),
-                'used_gb': round(u.used/1024/1024/1024, 2),
-                'percent': u.percent,
-            })
-        except Exception:
-            parts.append({
-                'device': p.device,
-                'mountpoint': p.mountpoint,
-                'fstype': p.fstype,
-                'total_gb': None,
-                'used_gb': None,
-                'percent': None,
-            })
-    return parts
+    n = _remote(node)
+    if n is not None:
+        return json_etag(request, n.disks)
+    if WORKER:
+        return json_etag(request, SHARED_TICK.get("disks", []))
+    # bounded by STORAGE_PROBE_TIMEOUT even with hung network mounts
+    with TIMINGS.time("collect.storage.disks"):
+        return json_etag(request, STORAGE.disks())
+
+
+@app.get("/api/storage/io")
+def api_storage_io(request: Request, node: Optional[str] = None):
+    authed(request)
+    n = _remote(node)
+    if n is not None:
+        return {d["device"].rsplit("/", 1)[-1]: {"read": d.get("read_mbps"), "write": d.get("write_mbps")}
+                for d in n.disks if d.get("read_mbps") is not None}
+    if WORKER:
+        return SHARED_TICK.get("io", {})
+    return STORAGE.io_rates()
@@ -0,0 +1,151 @@
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from . import db as dbm
+
+# events held for the writer beyond the queue (overflow, failed batches); the oldest are dropped past this
+MAX_SPILL = 100000
+
+
+# Audit events are queued by request handlers and written by one background
+# thread in batched transactions. append() never blocks: when the bounded
+# queue is full the event goes to a spill list the writer drains on its next
+# pass. A batch that fails to write (locked database, full disk) is put back
+# in the spill list and retried with backoff; only past MAX_SPILL, or if the
+# final write at stop() fails, are events dropped, counted and reported on
+# stderr. stop() drains everything.
+class AuditWriter:
+    def __init__(self, maxsize: int = 10000, batch: int = 500, interval: float = 0.5, max_backoff: float = 30.0):
+        self.batch = batch
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.written = 0
+        self.batches = 0
+        self.overflow = 0
+        self.failed_writes = 0
+        self.dropped = 0
+        self.last_error = ""
+        self._q: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=maxsize)
+        self._spill: Deque[tuple] = deque()
+        self._spill_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def append(self, username: str, action: str, obj: str = None):
+        item = (time.strftime("%Y-%m-%d %H:%M:%S"), username, action, obj)
+        if self._thread is None:
+            # before start() / after stop(): no writer to hand off to
+            if not self._write([item]):
+                self._drop([item])
+            return
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            self.overflow += 1
+            self._requeue([item], front=False)
+
+    # ---- writer side ----
+    def _write(self, rows: List[tuple]) -> bool:
+        try:
+            dbm.audit_insert_many(rows)
+        except Exception as e:
+            self.failed_writes += 1
+            self.last_error = "%s: %s" % (type(e).__name__, e)
+            return False
+        self.written += len(rows)
+        self.batches += 1
+        return True
+
+    def _drop(self, rows: List[tuple]):
+        self.dropped += len(rows)
+        print("audit: dropped %d event(s) (%s), %d in total" % (len(rows), self.last_error or "spill full",
+                                                                 self.dropped), file=sys.stderr)
+
+    def _requeue(self, rows: List[tuple], front: bool):
+        with self._spill_lock:
+            if front:
+                self._spill.extendleft(reversed(rows))
+            else:
+                self._spill.extend(rows)
+            over = len(self._spill) - MAX_SPILL
+            lost = [self._spill.popleft() for _ in range(over)] if over > 0 else []
+        if lost:
+            self._drop(lost)
+
+    def _take_spill(self) -> List[tuple]:
+        with self._spill_lock:
+            rows = list(self._spill)
+            self._spill.clear()
+        return rows
+
+    def _gather(self, wait: Optional[float]) -> Tuple[List[tuple], bool]:
+        # waits up to `wait` (None: forever) for an event, then collects what else arrives within the batching window
+        rows: List[tuple] = []
+        try:
+            item = self._q.get(timeout=wait)
+        except queue.Empty:
+            return rows, False
+        deadline = time.monotonic() + self.interval
+        while True:
+            if item is None:
+                return rows, True
+            rows.append(item)
+            if len(rows) >= self.batch:
+                return rows, False
+            try:
+                item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return rows, False
+
+    def _run(self):
+        failures = 0
+        while True:
+            if not self._spill:
+                wait = None
+            elif failures:
+                wait = min(self.max_backoff, self.interval * 2 ** failures)
+            else:
+                wait = 0
+            rows, stop = self._gather(wait)
+            # retried batches first; every row carries the timestamp it was appended with
+            rows = self._take_spill() + rows
+            if rows:
+                if self._write(rows):
+                    failures = 0
+                else:
+                    failures += 1
+                    self._requeue(rows, front=True)
+            if stop:
+                break
+        dbm.close()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        # sentinel goes behind every queued event, so the writer drains them first
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._q.put(None)
+            thread.join(timeout)
+        # failed batches and anything enqueued after the sentinel: one last attempt
+        rest = self._take_spill()
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                rest.append(item)
+        if rest and not self._write(rest):
+            self._drop(rest)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": self._q.qsize(), "spilled": len(self._spill), "written": self.written,
+                "batches": self.batches, "overflow": self.overflow, "failed_writes": self.failed_writes,
+                "dropped": self.dropped, "last_error": self.last_error}
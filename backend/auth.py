@@ -0,0 +1,158 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .crypto import verify_password
+
+
+# Bounded LRU of verified tokens -> principal, so repeat callers skip the HMAC,
+# JSON decode and users lookup. Entries never outlive the token's exp or ttl.
+class SessionCache:
+    def __init__(self, maxsize: int = 4096, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            ent = self._data.get(token)
+            if ent is None or ent[0] <= now:
+                if ent is not None:
+                    del self._data[token]
+                self.misses += 1
+                return None
+            self._data.move_to_end(token)
+            self.hits += 1
+            return ent[1]
+
+    def put(self, token: str, principal: Dict[str, Any], exp: float):
+        expires = min(float(exp), time.time() + self.ttl)
+        with self._lock:
+            self._data[token] = (expires, principal)
+            self._data.move_to_end(token)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, token: str):
+        with self._lock:
+            self._data.pop(token, None)
+
+    def invalidate_user(self, username: str):
+        with self._lock:
+            for tok in [t for t, ent in self._data.items() if ent[1].get("username") == username]:
+                del self._data[tok]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._data)
+        total = self.hits + self.misses
+        return {"size": size, "maxsize": self.maxsize, "ttl": self.ttl, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0}
+
+
+class Busy(Exception):
+    pass
+
+
+# PBKDF2 runs in a small dedicated pool (hashlib releases the GIL), so a login
+# never stalls the event loop; beyond max_pending callers are turned away.
+class PasswordVerifier:
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    async def verify(self, password: str, stored: str) -> bool:
+        return await self._run(verify_password, password, stored)
+
+    async def login(self, lookup: Callable[[], Any], password: str,
+                    on_success: Optional[Callable[[Any], None]] = None) -> Optional[Any]:
+        # the user lookup and on_success (last-login update, audit) run in the same pool job as the
+        # hash, so the loop does no sqlite work either;
+        # returns the row for an enabled user with a matching password, else None
+        return await self._run(_login, lookup, password, on_success)
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        # only touched from the event loop thread, no lock needed
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Busy()
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pbkdf2")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "max_pending": self.max_pending,
+                "pending": self.pending, "rejected": self.rejected}
+
+
+def _login(lookup: Callable[[], Any], password: str, on_success: Optional[Callable[[Any], None]]) -> Optional[Any]:
+    row = lookup()
+    if row and row["enabled"] and verify_password(password, row["password_hash"]):
+        if on_success is not None:
+            on_success(row)
+        return row
+    return None
+
+
+# Exponential backoff per key (username or client IP): after `free` consecutive
+# failures each further failure doubles the lockout, up to `cap` seconds.
+class LoginThrottle:
+    def __init__(self, free: int = 5, base: float = 1.0, cap: float = 300.0, maxkeys: int = 10000):
+        self.free = free
+        self.base = base
+        self.cap = cap
+        self.maxkeys = maxkeys
+        self.blocked = 0
+        # key -> [failures, locked_until]
+        self._fails: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def retry_after(self, key: str) -> float:
+        with self._lock:
+            ent = self._fails.get(key)
+            wait = ent[1] - time.time() if ent else 0.0
+            if wait > 0:
+                self.blocked += 1
+                return wait
+            return 0.0
+
+    def failure(self, key: str):
+        now = time.time()
+        with self._lock:
+            ent = self._fails.pop(key, None) or [0, 0.0]
+            ent[0] += 1
+            if ent[0] > self.free:
+                ent[1] = now + min(self.cap, self.base * 2 ** (ent[0] - self.free - 1))
+            self._fails[key] = ent
+            while len(self._fails) > self.maxkeys:
+                self._fails.popitem(last=False)
+
+    def success(self, key: str):
+        with self._lock:
+            self._fails.pop(key, None)
@@ -0,0 +1,31 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+
+from .gpu import GpuCollector
+from .netmon import NetMonitor
+from .storage import StorageMonitor
+from .instrument import TIMINGS
+
+
+# One sample of every local series. Shared by the sampler of the web app and by
+# the push agent, so both report exactly the same names and units.
+def sample_series(gpu: GpuCollector, net: NetMonitor, storage: StorageMonitor,
+                  now: Optional[float] = None) -> Tuple[Dict[str, float], List[Dict[str, Any]]]:
+    now = now or time.time()
+    with TIMINGS.time("collect.psutil"):
+        series: Dict[str, float] = {"cpu": psutil.cpu_percent(interval=None), "mem": psutil.virtual_memory().percent}
+    with TIMINGS.time("collect.gpu"):
+        _, gpus = gpu.snapshot()
+    for g in gpus:
+        k = "gpu.%s." % g["id"]
+        series[k + "util"] = g.get("util", 0)
+        series[k + "temp"] = g.get("temp_c", 0)
+        series[k + "power"] = g.get("power_w", 0)
+        series[k + "mem"] = g.get("mem_used_mb", 0)
+    with TIMINGS.time("collect.net"):
+        series.update(net.sample(now))
+    with TIMINGS.time("collect.disk_io"):
+        series.update(storage.sample_io(now))
+    return series, gpus
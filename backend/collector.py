@@ -0,0 +1,45 @@
+# Collector process for production mode (run.sh prod):
+#
+#   python -m backend.collector
+#
+# Samples the host once for every uvicorn worker: runs the sampler, rollups,
+# alert evaluation and log ingest, and publishes each tick plus the recent
+# history into the shared segment that workers (ONEBOX_ROLE=worker) read.
+import os
+import signal
+import asyncio
+
+os.environ["ONEBOX_ROLE"] = "collector"
+
+from . import app as appm  # noqa: E402
+from . import db as dbm  # noqa: E402
+
+
+async def run():
+    appm.prepare_db()
+    loop = asyncio.get_running_loop()
+    # workers serve the inventory from the start: it exists before the segment does
+    await loop.run_in_executor(None, appm.INVENTORY.publish, appm.INVENTORY_PATH)
+    appm.SHARED.create(appm.SAMPLER.interval)
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await appm.start_collection()
+    appm.LOOP_LAG.start()
+    print("collector: pid %d, segment %s" % (os.getpid(), appm.SHARED.path), flush=True)
+    try:
+        await stop.wait()
+    finally:
+        await appm.LOOP_LAG.stop()
+        await appm.stop_collection()
+        appm.SHARED.close()
+        appm.SHARED.unlink()
+        dbm.close()
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
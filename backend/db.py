@@ -1,7 +1,10 @@
 import os
 import sqlite3
+import threading
 from contextlib import contextmanager
 
+from .instrument import TIMINGS
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 DB_PATH = os.path.join(DATA_DIR, 'app.db')
@@ -11,21 +14,56 @@ def ensure_dirs():
     os.makedirs(DATA_DIR, exist_ok=True)
 
 
+# connection tuning; WAL lets readers run alongside the writer
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+_local = threading.local()
+
+
 def connect():
     ensure_dirs()
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    for p in PRAGMAS:
+        conn.execute(p)
     return conn
 
 
+def _thread_conn():
+    # one long-lived connection per thread: no file open / schema parse per call,
+    # and sqlite3's statement cache keeps the prepared helpers hot
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = connect()
+        _local.conn, _local.path = conn, DB_PATH
+    return conn
+
+
+def close():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+
 @contextmanager
 def get_db():
-    conn = connect()
+    conn = _thread_conn()
     try:
         yield conn
         conn.commit()
-    finally:
-        conn.close()
+    except BaseException:
+        conn.rollback()
+        raise
 
 
 def init_db():
@@ -63,22 +101,105 @@ def init_db():
                 k TEXT PRIMARY KEY,
                 v TEXT
             );
+
+            -- threshold rules evaluated by the alert engine on every sample
+            CREATE TABLE IF NOT EXISTS alert_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                selector TEXT NOT NULL,
+                op TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                duration REAL NOT NULL DEFAULT 0,
+                hysteresis REAL NOT NULL DEFAULT 0,
+                level TEXT NOT NULL DEFAULT '警告',
+                enabled INTEGER NOT NULL DEFAULT 1
+            );
+
+            -- pre-aggregated metrics: tier is the bucket size in seconds (60, 3600)
+            CREATE TABLE IF NOT EXISTS metric_rollups (
+                tier INTEGER NOT NULL,
+                series TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                min REAL,
+                avg REAL,
+                max REAL,
+                last REAL,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (tier, series, ts)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_metric_rollups_tier_ts ON metric_rollups(tier, ts);
+
+            -- tailed log lines; id is ingestion order, log_fts indexes message by id
+            CREATE TABLE IF NOT EXISTS log_lines (
+                id INTEGER PRIMARY KEY,
+                ts TEXT NOT NULL,
+                host TEXT,
+                source TEXT,
+                severity TEXT NOT NULL,
+                message TEXT NOT NULL,
+                file TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_log_lines_ts ON log_lines(ts);
+            CREATE INDEX IF NOT EXISTS idx_log_lines_source ON log_lines(source, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(
+                message, content='log_lines', content_rowid='id'
+            );
+
+            -- agents pushing to this instance (multi-node mode)
+            CREATE TABLE IF NOT EXISTS nodes (
+                name TEXT PRIMARY KEY,
+                addr TEXT,
+                info TEXT,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL
+            );
+
+            -- read position of every tailed file
+            CREATE TABLE IF NOT EXISTS log_checkpoints (
+                path TEXT PRIMARY KEY,
+                inode INTEGER NOT NULL,
+                offset INTEGER NOT NULL
+            );
             """
         )
+        # columns added after the first release
+        _add_column(db, "alerts", "rule_id", "INTEGER")
+        _add_column(db, "alerts", "resolved_ts", "TEXT")
+        db.executescript(
+            """
+            CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status, id);
+            CREATE INDEX IF NOT EXISTS idx_alerts_obj ON alerts(obj, id);
+            CREATE INDEX IF NOT EXISTS idx_alerts_level ON alerts(level, id);
+            CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts(ts);
+            CREATE INDEX IF NOT EXISTS idx_alerts_open ON alerts(rule_id, obj) WHERE resolved_ts IS NULL;
+            CREATE INDEX IF NOT EXISTS idx_audit_logs_ts ON audit_logs(ts);
+            CREATE INDEX IF NOT EXISTS idx_audit_logs_user ON audit_logs(username, id);
+            CREATE INDEX IF NOT EXISTS idx_audit_logs_action ON audit_logs(action, id);
+            """
+        )
+
+
+def _add_column(db, table: str, col: str, decl: str):
+    cols = [r["name"] for r in db.execute(f"PRAGMA table_info({table})")]
+    if col not in cols:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
 
 
+@TIMINGS.timed("db.user_get_by_username")
 def user_get_by_username(username: str):
     with get_db() as db:
         cur = db.execute("SELECT * FROM users WHERE username=?", (username,))
         return cur.fetchone()
 
 
+@TIMINGS.timed("db.user_list")
 def user_list():
     with get_db() as db:
         cur = db.execute("SELECT username, email, role, enabled, last_login FROM users ORDER BY username")
         return cur.fetchall()
 
 
+@TIMINGS.timed("db.user_insert")
 def user_insert(username: str, email: str, role: str, enabled: int, password_hash: str):
     with get_db() as db:
         db.execute(
@@ -87,11 +208,22 @@ def user_insert(username: str, email: str, role: str, enabled: int, password_has
         )
 
 
+@TIMINGS.timed("db.user_update_last_login")
 def user_update_last_login(username: str, ts: str):
     with get_db() as db:
         db.execute("UPDATE users SET last_login=? WHERE username=?", (ts, username))
 
 
+@TIMINGS.timed("db.user_update")
+def user_update(username: str, role: str = None, enabled: int = None):
+    with get_db() as db:
+        if role is not None:
+            db.execute("UPDATE users SET role=? WHERE username=?", (role, username))
+        if enabled is not None:
+            db.execute("UPDATE users SET enabled=? WHERE username=?", (enabled, username))
+
+
+@TIMINGS.timed("db.audit_append")
 def audit_append(username: str, action: str, obj: str = None, ts: str = None):
     with get_db() as db:
         db.execute(
@@ -100,6 +232,282 @@ def audit_append(username: str, action: str, obj: str = None, ts: str = None):
         )
 
 
+@TIMINGS.timed("db.rollup_insert_many")
+def rollup_insert_many(rows):
+    # rows: (tier, series, ts, min, avg, max, last, n); one transaction per batch
+    with get_db() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO metric_rollups(tier, series, ts, min, avg, max, last, n) VALUES(?,?,?,?,?,?,?,?)",
+            rows,
+        )
+
+
+@TIMINGS.timed("db.rollup_prune")
+def rollup_prune(tier: int, before_ts: int):
+    with get_db() as db:
+        db.execute("DELETE FROM metric_rollups WHERE tier=? AND ts<?", (tier, before_ts))
+
+
+@TIMINGS.timed("db.rollup_series")
+def rollup_series(tier: int):
+    with get_db() as db:
+        cur = db.execute("SELECT DISTINCT series FROM metric_rollups WHERE tier=?", (tier,))
+        return [r[0] for r in cur.fetchall()]
+
+
+@TIMINGS.timed("db.rollup_query")
+def rollup_query(tier: int, series: list, start: int, end: int):
+    if not series:
+        return []
+    marks = ",".join("?" * len(series))
+    with get_db() as db:
+        cur = db.execute(
+            f"SELECT series, ts, min, avg, max, last, n FROM metric_rollups "
+            f"WHERE tier=? AND series IN ({marks}) AND ts>=? AND ts<? ORDER BY series, ts",
+            (tier, *series, start, end),
+        )
+        return cur.fetchall()
+
+
+@TIMINGS.timed("db.audit_insert_many")
+def audit_insert_many(rows):
+    # rows: (ts, username, action, obj); one transaction per batch
+    with get_db() as db:
+        db.executemany("INSERT INTO audit_logs(ts, username, action, obj) VALUES(?,?,?,?)", rows)
+
+
+@TIMINGS.timed("db.audit_page")
+def audit_page(limit: int = 50, before_id: int = None, username: str = None, action: str = None,
+               start: str = None, end: str = None):
+    conds, args = [], []
+    for col, op, val in (("username", "=", username), ("action", "=", action), ("ts", ">=", start),
+                         ("ts", "<", end), ("id", "<", before_id)):
+        if val:
+            conds.append(f"{col}{op}?")
+            args.append(val)
+    where = (" WHERE " + " AND ".join(conds)) if conds else ""
+    with get_db() as db:
+        cur = db.execute(
+            f"SELECT id, ts, username, action, obj FROM audit_logs{where} ORDER BY id DESC LIMIT ?",
+            (*args, limit),
+        )
+        return cur.fetchall()
+
+
+@TIMINGS.timed("db.log_checkpoints")
+def log_checkpoints():
+    with get_db() as db:
+        return db.execute("SELECT path, inode, offset FROM log_checkpoints").fetchall()
+
+
+@TIMINGS.timed("db.log_ingest")
+def log_ingest(rows, checkpoints):
+    # rows: (ts, host, source, severity, message, file); lines, their FTS entries and
+    # the file checkpoints commit together, so a crash never re-reads or loses lines
+    with get_db() as db:
+        last = db.execute("SELECT COALESCE(MAX(id), 0) FROM log_lines").fetchone()[0]
+        db.executemany(
+            "INSERT INTO log_lines(ts, host, source, severity, message, file) VALUES(?,?,?,?,?,?)", rows
+        )
+        db.execute("INSERT INTO log_fts(rowid, message) SELECT id, message FROM log_lines WHERE id>?", (last,))
+        db.executemany(
+            "INSERT OR REPLACE INTO log_checkpoints(path, inode, offset) VALUES(?,?,?)", checkpoints
+        )
+        return last + 1
+
+
+@TIMINGS.timed("db.log_prune")
+def log_prune(before_ts: str, batch: int = 5000) -> int:
+    # external-content FTS: index entries are removed with the 'delete' command first
+    total = 0
+    while True:
+        with get_db() as db:
+            ids = [r[0] for r in db.execute(
+                "SELECT id FROM log_lines WHERE ts<? ORDER BY ts LIMIT ?", (before_ts, batch)
+            )]
+            if not ids:
+                return total
+            marks = ",".join("?" * len(ids))
+            db.execute(
+                f"INSERT INTO log_fts(log_fts, rowid, message) "
+                f"SELECT 'delete', id, message FROM log_lines WHERE id IN ({marks})", ids
+            )
+            db.execute(f"DELETE FROM log_lines WHERE id IN ({marks})", ids)
+        total += len(ids)
+
+
+@TIMINGS.timed("db.log_search")
+def log_search(match: str = None, limit: int = 100, before_id: int = None, source: str = None,
+               severity: str = None, start: str = None, end: str = None):
+    conds, args = [], []
+    for col, op, val in (("l.source", "=", source), ("l.severity", "=", severity), ("l.ts", ">=", start),
+                         ("l.ts", "<", end), ("l.id", "<", before_id)):
+        if val:
+            conds.append(f"{col}{op}?")
+            args.append(val)
+    cols = "l.id, l.ts, l.host, l.source, l.severity, l.message, l.file"
+    with get_db() as db:
+        if match:
+            # FTS5 walks its doclists by rowid, newest first, and stops after LIMIT
+            where = "".join(" AND " + c for c in conds).replace("l.id", "f.rowid")
+            sql = (f"SELECT {cols} FROM log_fts f JOIN log_lines l ON l.id=f.rowid "
+                   f"WHERE log_fts MATCH ?{where} ORDER BY f.rowid DESC LIMIT ?")
+            return db.execute(sql, (match, *args, limit)).fetchall()
+        where = (" WHERE " + " AND ".join(conds)) if conds else ""
+        return db.execute(f"SELECT {cols} FROM log_lines l{where} ORDER BY l.id DESC LIMIT ?",
+                          (*args, limit)).fetchall()
+
+
+@TIMINGS.timed("db.log_after")
+def log_after(after_id: int, limit: int = 500, upto: int = None):
+    # the newest `limit` lines in (after_id, upto], oldest first; replays what a reconnecting tail missed
+    with get_db() as db:
+        if upto is None:
+            rows = db.execute(
+                "SELECT id, ts, host, source, severity, message, file FROM log_lines WHERE id>? "
+                "ORDER BY id DESC LIMIT ?", (after_id, limit)).fetchall()
+        else:
+            rows = db.execute(
+                "SELECT id, ts, host, source, severity, message, file FROM log_lines WHERE id>? AND id<=? "
+                "ORDER BY id DESC LIMIT ?", (after_id, upto, limit)).fetchall()
+    rows.reverse()
+    return rows
+
+
+@TIMINGS.timed("db.log_sources")
+def log_sources():
+    with get_db() as db:
+        return [r[0] for r in db.execute("SELECT DISTINCT source FROM log_lines ORDER BY source")]
+
+
+@TIMINGS.timed("db.node_list")
+def node_list():
+    with get_db() as db:
+        return db.execute("SELECT name, addr, info, first_seen, last_seen FROM nodes ORDER BY name").fetchall()
+
+
+@TIMINGS.timed("db.node_upsert_many")
+def node_upsert_many(rows):
+    # rows: (name, addr, info_json, ts); info is only replaced when a new one is sent
+    with get_db() as db:
+        db.executemany(
+            "INSERT INTO nodes(name, addr, info, first_seen, last_seen) VALUES(?1, ?2, ?3, ?4, ?4) "
+            "ON CONFLICT(name) DO UPDATE SET addr=excluded.addr, last_seen=excluded.last_seen, "
+            "info=COALESCE(excluded.info, nodes.info)",
+            rows,
+        )
+
+
+@TIMINGS.timed("db.alert_rule_list")
+def alert_rule_list(enabled_only: bool = False):
+    with get_db() as db:
+        sql = "SELECT * FROM alert_rules" + (" WHERE enabled=1" if enabled_only else "") + " ORDER BY id"
+        return db.execute(sql).fetchall()
+
+
+@TIMINGS.timed("db.alert_rule_upsert")
+def alert_rule_upsert(rule: dict):
+    cols = ("name", "selector", "op", "threshold", "duration", "hysteresis", "level", "enabled")
+    with get_db() as db:
+        if rule.get("id"):
+            db.execute(
+                "UPDATE alert_rules SET " + ", ".join(f"{c}=?" for c in cols) + " WHERE id=?",
+                (*[rule[c] for c in cols], rule["id"]),
+            )
+            return rule["id"]
+        cur = db.execute(
+            "INSERT INTO alert_rules(" + ", ".join(cols) + ") VALUES(" + ",".join("?" * len(cols)) + ")",
+            tuple(rule[c] for c in cols),
+        )
+        return cur.lastrowid
+
+
+@TIMINGS.timed("db.alert_rule_delete")
+def alert_rule_delete(rule_id: int):
+    with get_db() as db:
+        db.execute("DELETE FROM alert_rules WHERE id=?", (rule_id,))
+
+
+@TIMINGS.timed("db.alert_rules_seed_if_empty")
+def alert_rules_seed_if_empty(rules):
+    with get_db() as db:
+        if db.execute("SELECT COUNT(*) FROM alert_rules").fetchone()[0]:
+            return
+        db.executemany(
+            "INSERT INTO alert_rules(name, selector, op, threshold, duration, hysteresis, level) VALUES(?,?,?,?,?,?,?)",
+            rules,
+        )
+
+
+@TIMINGS.timed("db.alerts_open_by_rule")
+def alerts_open_by_rule():
+    # alerts raised by the rule engine that have not resolved yet
+    with get_db() as db:
+        cur = db.execute("SELECT id, rule_id, obj FROM alerts WHERE rule_id IS NOT NULL AND resolved_ts IS NULL")
+        return cur.fetchall()
+
+
+@TIMINGS.timed("db.alerts_apply")
+def alerts_apply(fired, resolved):
+    # fired: (ts, obj, content, level, rule_id); resolved: (resolved_ts, rule_id, obj)
+    with get_db() as db:
+        if fired:
+            db.executemany(
+                "INSERT INTO alerts(ts, obj, content, level, status, rule_id) VALUES(?,?,?,?,'未确认',?)",
+                fired,
+            )
+        if resolved:
+            db.executemany(
+                "UPDATE alerts SET resolved_ts=? WHERE rule_id=? AND obj=? AND resolved_ts IS NULL",
+                resolved,
+            )
+
+
+def _alert_where(level: str = None, obj: str = None, status: str = None, start: str = None, end: str = None):
+    conds, args = [], []
+    for col, op, val in (("level", "=", level), ("obj", "=", obj), ("status", "=", status),
+                         ("ts", ">=", start), ("ts", "<", end)):
+        if val:
+            conds.append(f"{col}{op}?")
+            args.append(val)
+    return conds, args
+
+
+@TIMINGS.timed("db.alerts_count_unacked")
+def alerts_count_unacked() -> int:
+    with get_db() as db:
+        return db.execute("SELECT COUNT(*) FROM alerts WHERE status='未确认'").fetchone()[0]
+
+
+@TIMINGS.timed("db.alerts_page")
+def alerts_page(limit: int = 50, before_id: int = None, **filters):
+    # keyset pagination, newest first: pass the last id of a page as before_id
+    conds, args = _alert_where(**filters)
+    if before_id:
+        conds.append("id<?")
+        args.append(before_id)
+    where = (" WHERE " + " AND ".join(conds)) if conds else ""
+    with get_db() as db:
+        cur = db.execute(
+            f"SELECT id, ts, obj, content, level, status, rule_id, resolved_ts FROM alerts{where} ORDER BY id DESC LIMIT ?",
+            (*args, limit),
+        )
+        return cur.fetchall()
+
+
+@TIMINGS.timed("db.alerts_ack")
+def alerts_ack(ids=None, **filters) -> int:
+    # acknowledge the given ids, or everything unacknowledged matching filters; one transaction
+    with get_db() as db:
+        if ids is not None:
+            cur = db.executemany("UPDATE alerts SET status='已确认' WHERE id=? AND status='未确认'", ((i,) for i in ids))
+            return cur.rowcount
+        conds, args = _alert_where(**{**filters, "status": "未确认"})
+        cur = db.execute("UPDATE alerts SET status='已确认' WHERE " + " AND ".join(conds), args)
+        return cur.rowcount
+
+
+@TIMINGS.timed("db.seed_admin_if_missing")
 def seed_admin_if_missing(password_hash: str):
     # default admin
     user_insert("admin", "admin@local", "Admin", 1, password_hash)
@@ -0,0 +1,100 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "onebox_"
+
+# sampled series -> (family, type, help, label name, scale); "*" is the label value
+SERIES = (
+    (re.compile(r"^cpu$"), "cpu_usage_percent", "gauge", "CPU utilisation", None, 1),
+    (re.compile(r"^mem$"), "memory_usage_percent", "gauge", "Memory utilisation", None, 1),
+    (re.compile(r"^gpu\.([^.]+)\.util$"), "gpu_utilization_percent", "gauge", "GPU utilisation", "gpu", 1),
+    (re.compile(r"^gpu\.([^.]+)\.temp$"), "gpu_temperature_celsius", "gauge", "GPU temperature", "gpu", 1),
+    (re.compile(r"^gpu\.([^.]+)\.power$"), "gpu_power_watts", "gauge", "GPU power draw", "gpu", 1),
+    (re.compile(r"^gpu\.([^.]+)\.mem$"), "gpu_memory_used_bytes", "gauge", "GPU memory used", "gpu", 1024 * 1024),
+    (re.compile(r"^net\.(.+)\.rx$"), "network_receive_bits_per_second", "gauge", "NIC receive rate", "device", 1e6),
+    (re.compile(r"^net\.(.+)\.tx$"), "network_transmit_bits_per_second", "gauge", "NIC transmit rate", "device", 1e6),
+    (re.compile(r"^disk\.(.+)\.read$"), "disk_read_bytes_per_second", "gauge", "Disk read rate", "device", 1024 * 1024),
+    (re.compile(r"^disk\.(.+)\.write$"), "disk_write_bytes_per_second", "gauge", "Disk write rate", "device", 1024 * 1024),
+)
+
+
+def escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def fmt(v: Any) -> str:
+    if v is None or v != v:
+        return "NaN"
+    if v is True or v is False:
+        return "1" if v else "0"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _labels(labels: Optional[Dict[str, Any]], **more) -> str:
+    items = list((labels or {}).items()) + list(more.items())
+    if not items:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, escape(str(x))) for k, x in items)
+
+
+def render(ts: float, series: Dict[str, float], extra: List[Tuple[str, str, str, list]]) -> bytes:
+    # extra: (family, type, help, [(labels dict or None, value), ...]); histogram
+    # values are objects with cumulative(), sum and count
+    families: Dict[str, list] = {}
+    meta: Dict[str, Tuple[str, str]] = {}
+    for name in sorted(series):
+        for rx, fam, typ, hlp, label, scale in SERIES:
+            m = rx.match(name)
+            if m:
+                labels = {label: m.group(1)} if label else None
+                v = series[name]
+                families.setdefault(fam, []).append((labels, v * scale if v is not None else None))
+                meta[fam] = (typ, hlp)
+                break
+    for fam, typ, hlp, samples in extra:
+        families.setdefault(fam, []).extend(samples)
+        meta[fam] = (typ, hlp)
+    out = []
+    for fam, samples in families.items():
+        typ, hlp = meta[fam]
+        name = PREFIX + fam
+        out.append("# TYPE %s %s\n# HELP %s %s\n" % (name, typ, name, hlp))
+        if typ == "histogram":
+            for labels, h in samples:
+                for le, n in h.cumulative():
+                    out.append("%s_bucket%s %d\n" % (name, _labels(labels, le=le), n))
+                out.append("%s_count%s %d\n%s_sum%s %s\n" % (name, _labels(labels), h.count,
+                                                            name, _labels(labels), fmt(h.sum)))
+            continue
+        sample = name + "_total" if typ == "counter" else name
+        for labels, v in samples:
+            out.append("%s%s %s\n" % (sample, _labels(labels), fmt(v)))
+    out.append("# TYPE %ssample_timestamp_seconds gauge\n%ssample_timestamp_seconds %s\n# EOF\n"
+               % (PREFIX, PREFIX, fmt(round(ts, 3))))
+    return "".join(out).encode()
+
+
+# Sampler listener holding the latest frame; the exposition body is built at most
+# once per tick, on the first scrape after it, and shared by every scraper.
+class Exposition:
+    def __init__(self, internal: Optional[Callable[[], List[tuple]]] = None):
+        self.internal = internal or (lambda: [])
+        self.renders = 0
+        self.scrapes = 0
+        self._seq = 0
+        self._frame: Optional[Dict[str, Any]] = None
+        self._cache: Tuple[int, bytes] = (-1, b"")
+
+    def on_frame(self, seq: int, frame: Dict[str, Any]):
+        self._seq, self._frame = seq, frame
+
+    def body(self) -> bytes:
+        self.scrapes += 1
+        seq, body = self._cache
+        if seq != self._seq or not body:
+            frame = self._frame or {}
+            body = render(frame.get("ts", 0.0), frame.get("series") or {}, self.internal())
+            self._cache = (self._seq, body)
+            self.renders += 1
+        return body
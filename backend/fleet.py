@@ -0,0 +1,186 @@
+import re
+import json
+import zlib
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+from . import db as dbm
+from .tsdb import MetricStore
+
+NODE_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+MAX_BODY = 64 * 1024 * 1024
+
+
+class IngestError(ValueError):
+    pass
+
+
+def decode_body(body: bytes, encoding: str) -> Dict[str, Any]:
+    # agents send gzip'd JSON; cap the inflated size so a small bomb cannot eat memory
+    if encoding == "gzip":
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = d.decompress(body, MAX_BODY)
+        except zlib.error:
+            raise IngestError("bad gzip")
+        if d.unconsumed_tail:
+            raise IngestError("payload too large")
+    elif encoding not in ("", "identity"):
+        raise IngestError("unsupported encoding")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise IngestError("bad json")
+    if not isinstance(payload, dict):
+        raise IngestError("bad payload")
+    return payload
+
+
+def rollup_name(node: str, series: str) -> str:
+    # remote series share metric_rollups with local ones under a "<node>:" prefix
+    return node + ":" + series
+
+
+# A remote host: its own history ring plus the latest inventory rows it sent.
+# _lock serialises ingests for the node, so the last_ts check and the append
+# happen together when an agent's retry overlaps its original batch.
+class Node:
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.store = MetricStore(capacity=capacity)
+        self.latest: Dict[str, Optional[float]] = {}
+        self.gpus: List[Dict[str, Any]] = []
+        self.nics: List[Dict[str, Any]] = []
+        self.disks: List[Dict[str, Any]] = []
+        self.info: Dict[str, Any] = {}
+        self.addr = ""
+        self.last_seen = 0.0
+        self.last_ts = 0.0
+        # seconds between the agent's pushes, as it reports them
+        self.period = 0.0
+        self.samples = 0
+        self._saved = 0.0
+        self._info_dirty = False
+        self._lock = threading.Lock()
+
+    def online(self, now: float, stale: float) -> bool:
+        return bool(self.last_seen) and now - self.last_seen < max(stale, 3 * self.period)
+
+    def gpu_avg(self) -> float:
+        return round(sum(g.get("util", 0) for g in self.gpus) / len(self.gpus), 1) if self.gpus else 0.0
+
+
+# Central side of multi-node mode. Agents push batches of samples; each node
+# gets a MetricStore for recent history and its samples are folded into the
+# shared Rollup under a "<node>:" prefix for long ranges. Node registry rows
+# are written in batches from flush(), at most once a minute per node.
+class Fleet:
+    def __init__(self, capacity: int = 720, rollup=None, stale: float = 30.0, save_every: float = 60.0):
+        self.capacity = capacity
+        self.rollup = rollup
+        self.stale = stale
+        self.save_every = save_every
+        self.batches = 0
+        self.samples = 0
+        self._nodes: Dict[str, Node] = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        for r in dbm.node_list():
+            node = self._node(r["name"])
+            node.addr = r["addr"] or ""
+            node.info = json.loads(r["info"]) if r["info"] else {}
+
+    def _node(self, name: str) -> Node:
+        node = self._nodes.get(name)
+        if node is None:
+            with self._lock:
+                node = self._nodes.setdefault(name, Node(name, self.capacity))
+        return node
+
+    def get(self, name: str) -> Optional[Node]:
+        return self._nodes.get(name)
+
+    def ingest(self, payload: Dict[str, Any], addr: str = "") -> int:
+        name = payload.get("node")
+        if not isinstance(name, str) or not NODE_NAME.match(name):
+            raise IngestError("bad node name")
+        names = payload.get("names") or []
+        samples = payload.get("samples") or []
+        if not isinstance(names, list) or not isinstance(samples, list):
+            raise IngestError("bad samples")
+        node = self._node(name)
+        prefixed = [rollup_name(name, n) for n in names]
+        width = len(names) + 1
+        with node._lock:
+            n = 0
+            for s in samples:
+                if not isinstance(s, list) or len(s) != width:
+                    continue
+                ts, vals = s[0], s[1:]
+                # a retried batch may repeat samples the store already has
+                if not isinstance(ts, (int, float)) or ts <= node.last_ts:
+                    continue
+                values = dict(zip(names, vals))
+                try:
+                    node.store.append(ts, values)
+                except TypeError:
+                    # non-numeric value; the slot is simply reused by the next append
+                    continue
+                node.last_ts = ts
+                if self.rollup is not None:
+                    self.rollup.add(ts, dict(zip(prefixed, vals)))
+                node.latest = values
+                n += 1
+            for key in ("gpus", "nics", "disks"):
+                rows = payload.get(key)
+                if isinstance(rows, list):
+                    setattr(node, key, rows)
+            if isinstance(payload.get("info"), dict):
+                node.info = payload["info"]
+                node._info_dirty = True
+            if isinstance(payload.get("period"), (int, float)):
+                node.period = float(payload["period"])
+            node.addr = addr or node.addr
+            node.last_seen = time.time()
+            node.samples += n
+        with self._lock:
+            self.batches += 1
+            self.samples += n
+        return n
+
+    def flush(self):
+        # persist new nodes, changed inventories and a coarse last_seen
+        now = time.time()
+        rows = []
+        for node in list(self._nodes.values()):
+            if node.last_seen and (node._info_dirty or now - node._saved >= self.save_every) and node.last_seen > node._saved:
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(node.last_seen))
+                rows.append((node.name, node.addr, json.dumps(node.info, ensure_ascii=False) if node._info_dirty else None, stamp))
+                node._saved, node._info_dirty = now, False
+        if rows:
+            dbm.node_upsert_many(rows)
+
+    def nodes(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        out = []
+        for node in sorted(self._nodes.values(), key=lambda x: x.name):
+            out.append({
+                "name": node.name,
+                "addr": node.addr,
+                "online": node.online(now, self.stale),
+                "last_seen": node.last_seen or None,
+                "cpu": node.latest.get("cpu"),
+                "mem": node.latest.get("mem"),
+                "gpu": node.gpu_avg(),
+                "gpus": len(node.gpus),
+                "samples": node.samples,
+                "info": node.info,
+            })
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        online = sum(1 for n in self._nodes.values() if n.online(now, self.stale))
+        return {"nodes": len(self._nodes), "online": online, "batches": self.batches, "samples": self.samples}
@@ -0,0 +1,357 @@
+import os
+import time
+import asyncio
+import threading
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+
+SMI_QUERY = "index,name,utilization.gpu,temperature.gpu,power.draw,memory.used,memory.total"
+SMI_INVENTORY = "index,name,uuid,pci.bus_id,memory.total,vbios_version,driver_version"
+# nvmlDeviceGetTopologyCommonAncestor levels, named as `nvidia-smi topo -m` prints them
+TOPO_LEVELS = {0: "X", 10: "PIX", 20: "PXB", 30: "PHB", 40: "NODE", 50: "SYS"}
+NVLINK_MAX = 18
+# nvidia-smi readings are dropped after this many missed stream intervals
+STALE_INTERVALS = 5
+
+
+def _num(s: str) -> float:
+    try:
+        return float(s)
+    except (TypeError, ValueError):
+        # "[N/A]", "[Not Supported]" ...
+        return 0.0
+
+
+def _str(v) -> str:
+    return v.decode() if isinstance(v, bytes) else str(v)
+
+
+def parse_smi_line(line: str) -> Optional[Dict[str, Any]]:
+    parts = [p.strip() for p in line.split(',')]
+    if len(parts) < 7 or not parts[0].isdigit():
+        return None
+    return {
+        "id": int(parts[0]),
+        "name": parts[1],
+        "util": _num(parts[2]),
+        "temp_c": _num(parts[3]),
+        "power_w": _num(parts[4]),
+        "mem_used_mb": _num(parts[5]),
+        "mem_total_mb": _num(parts[6]),
+    }
+
+
+# Keeps one NVML session open for the life of the process and serves a
+# timestamped snapshot of all devices; a refresh happens at most once per max_age.
+# Without NVML the snapshot is whatever SmiStream pushed last; once that is older
+# than stale_after (the stream died or hangs) no GPUs are reported rather than
+# frozen readings.
+class GpuCollector:
+    def __init__(self, nvml=None, max_age: float = 1.0, retry_interval: float = 30.0, stale_after: float = 5.0):
+        self._nvml = nvml
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self.stale_after = stale_after
+        self.ts = 0.0
+        self.gpus: List[Dict[str, Any]] = []
+        self.source = "none"
+        self._lock = threading.Lock()
+        self._devices: Optional[List[Tuple[int, Any, str]]] = None
+        self._init_failed_at = 0.0
+
+    # ---- NVML session ----
+    def _load_nvml(self):
+        if self._nvml is None:
+            import pynvml
+            self._nvml = pynvml
+        return self._nvml
+
+    def _open(self) -> bool:
+        if self._devices is not None:
+            return True
+        if self._init_failed_at and time.time() - self._init_failed_at < self.retry_interval:
+            return False
+        try:
+            nv = self._load_nvml()
+            nv.nvmlInit()
+            devices = []
+            for i in range(nv.nvmlDeviceGetCount()):
+                h = nv.nvmlDeviceGetHandleByIndex(i)
+                name = nv.nvmlDeviceGetName(h)
+                if isinstance(name, bytes):
+                    name = name.decode()
+                devices.append((i, h, name))
+            self._devices = devices
+            self._init_failed_at = 0.0
+            return True
+        except Exception:
+            self._init_failed_at = time.time()
+            return False
+
+    def close(self):
+        with self._lock:
+            if self._devices is not None:
+                self._devices = None
+                try:
+                    self._nvml.nvmlShutdown()
+                except Exception:
+                    pass
+
+    def _sample_nvml(self) -> List[Dict[str, Any]]:
+        nv = self._nvml
+        out = []
+        for i, h, name in self._devices:
+            util = 0
+            mem_used = mem_total = 0
+            temp = power = 0
+            try:
+                util = getattr(nv.nvmlDeviceGetUtilizationRates(h), 'gpu', 0)
+            except Exception:
+                pass
+            try:
+                mi = nv.nvmlDeviceGetMemoryInfo(h)
+                mem_used = int(mi.used/1024/1024)
+                mem_total = int(mi.total/1024/1024)
+            except Exception:
+                pass
+            try:
+                temp = nv.nvmlDeviceGetTemperature(h, nv.NVML_TEMPERATURE_GPU)
+            except Exception:
+                pass
+            try:
+                power = int(nv.nvmlDeviceGetPowerUsage(h)/1000)
+            except Exception:
+                pass
+            out.append({"id": i, "name": name, "util": util, "mem_used_mb": mem_used, "mem_total_mb": mem_total, "temp_c": temp, "power_w": power})
+        return out
+
+    def processes(self) -> Dict[int, Tuple[int, List[int]]]:
+        # pid -> (used MB over all GPUs, [gpu ids]); NVML only, nvidia-smi has no cheap equivalent
+        with self._lock:
+            if not self._open():
+                return {}
+            nv = self._nvml
+            out: Dict[int, Tuple[int, List[int]]] = {}
+            for i, h, _ in self._devices:
+                used: Dict[int, int] = {}
+                for fn in ("nvmlDeviceGetComputeRunningProcesses", "nvmlDeviceGetGraphicsRunningProcesses"):
+                    try:
+                        procs = getattr(nv, fn)(h)
+                    except Exception:
+                        continue
+                    for p in procs:
+                        # a process can be listed as both compute and graphics on one device
+                        mb = int((getattr(p, "usedGpuMemory", None) or 0) / 1024 / 1024)
+                        used[p.pid] = max(used.get(p.pid, 0), mb)
+                for pid, mb in used.items():
+                    total, ids = out.get(pid, (0, []))
+                    out[pid] = (total + mb, ids + [i])
+            return out
+
+    def inventory(self) -> Dict[str, Any]:
+        # static per-device facts and the peer topology matrix, read once for the hardware inventory
+        with self._lock:
+            if not self._open():
+                return {}
+            nv = self._nvml
+            devices = []
+            for i, h, name in self._devices:
+                d: Dict[str, Any] = {"id": i, "name": name}
+                for key, fn in (("uuid", "nvmlDeviceGetUUID"), ("serial", "nvmlDeviceGetSerial"),
+                                ("vbios", "nvmlDeviceGetVbiosVersion")):
+                    try:
+                        d[key] = _str(getattr(nv, fn)(h))
+                    except Exception:
+                        pass
+                try:
+                    d["pci_bus_id"] = _str(nv.nvmlDeviceGetPciInfo(h).busId)
+                except Exception:
+                    pass
+                try:
+                    d["mem_total_mb"] = int(nv.nvmlDeviceGetMemoryInfo(h).total/1024/1024)
+                except Exception:
+                    pass
+                devices.append(d)
+            # active NVLinks per (device, remote bus id)
+            links: Dict[Tuple[int, str], int] = {}
+            for i, h, _ in self._devices:
+                for link in range(NVLINK_MAX):
+                    try:
+                        if not nv.nvmlDeviceGetNvLinkState(h, link):
+                            continue
+                        remote = _str(nv.nvmlDeviceGetNvLinkRemotePciInfo(h, link).busId)
+                    except Exception:
+                        # link not present, or no NVLink on this device
+                        continue
+                    links[(i, remote)] = links.get((i, remote), 0) + 1
+            topology = []
+            for i, h, _ in self._devices:
+                row = []
+                for j, h2, _ in self._devices:
+                    n = links.get((i, devices[j].get("pci_bus_id", "")), 0)
+                    if i == j:
+                        row.append("X")
+                    elif n:
+                        row.append("NV%d" % n)
+                    else:
+                        try:
+                            level = nv.nvmlDeviceGetTopologyCommonAncestor(h, h2)
+                            row.append(TOPO_LEVELS.get(level, str(level)))
+                        except Exception:
+                            row.append("-")
+                topology.append(row)
+            try:
+                driver = _str(nv.nvmlSystemGetDriverVersion())
+            except Exception:
+                driver = ""
+            return {"source": "nvml", "driver": driver, "devices": devices, "topology": topology}
+
+    # ---- snapshot ----
+    def refresh(self) -> List[Dict[str, Any]]:
+        # without NVML the snapshot is fed by SmiStream.push(), never by a blocking call
+        if not self._open():
+            return self.gpus
+        try:
+            gpus = self._sample_nvml()
+        except Exception:
+            gpus = []
+        self.gpus, self.source, self.ts = gpus, "nvml", time.time()
+        return gpus
+
+    def push(self, gpus: List[Dict[str, Any]], source: str = "nvidia-smi"):
+        if self._devices is not None:
+            return
+        self.gpus, self.source, self.ts = gpus, source, time.time()
+
+    def nvml_available(self) -> bool:
+        with self._lock:
+            return self._open()
+
+    def snapshot(self, max_age: Optional[float] = None) -> Tuple[float, List[Dict[str, Any]]]:
+        max_age = self.max_age if max_age is None else max_age
+        if time.time() - self.ts > max_age:
+            with self._lock:
+                # another thread may have refreshed while we waited
+                if time.time() - self.ts > max_age:
+                    self.refresh()
+        if self._devices is None and self.gpus and time.time() - self.ts > self.stale_after:
+            return self.ts, []
+        return self.ts, self.gpus
+
+    def avg_util(self, max_age: Optional[float] = None) -> float:
+        _, gl = self.snapshot(max_age)
+        if not gl:
+            return 0.0
+        return round(sum(g.get('util', 0) for g in gl)/len(gl), 1)
+
+
+def smi_inventory(cmd: str, timeout: float = 10.0) -> Dict[str, Any]:
+    # one-off nvidia-smi queries for the hardware inventory when NVML is unavailable;
+    # the topology is kept as the text `nvidia-smi topo -m` prints
+    def run(*args) -> str:
+        return subprocess.run([cmd, *args], capture_output=True, text=True, timeout=timeout, check=True).stdout
+    try:
+        out = run("--query-gpu=" + SMI_INVENTORY, "--format=csv,noheader,nounits")
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    devices, driver = [], ""
+    for line in out.splitlines():
+        parts = [p.strip() for p in line.split(',')]
+        if len(parts) < 7 or not parts[0].isdigit():
+            continue
+        devices.append({"id": int(parts[0]), "name": parts[1], "uuid": parts[2], "pci_bus_id": parts[3],
+                        "mem_total_mb": int(_num(parts[4])), "vbios": parts[5]})
+        driver = parts[6]
+    try:
+        topo = run("topo", "-m")
+    except (OSError, subprocess.SubprocessError):
+        topo = ""
+    return {"source": "nvidia-smi", "driver": driver, "devices": devices, "topology": None, "topology_text": topo}
+
+
+# Fallback when NVML is unavailable: one long-lived `nvidia-smi --loop-ms` process
+# whose CSV output is parsed incrementally and pushed into the collector.
+class SmiStream:
+    def __init__(self, collector: GpuCollector, interval_ms: int = 1000, cmd: Optional[str] = None,
+                 restart_delay: float = 5.0, missing_delay: float = 300.0):
+        self.collector = collector
+        self.interval_ms = interval_ms
+        collector.stale_after = STALE_INTERVALS * interval_ms / 1000
+        self.cmd = cmd or os.environ.get("NVIDIA_SMI", "nvidia-smi")
+        self.restart_delay = restart_delay
+        self.missing_delay = missing_delay
+        self.frames = 0
+        self.spawns = 0
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def argv(self) -> List[str]:
+        return [self.cmd, "--query-gpu=" + SMI_QUERY, "--format=csv,noheader,nounits",
+                "--loop-ms=%d" % self.interval_ms]
+
+    async def _read(self, stdout: asyncio.StreamReader):
+        batch: List[Dict[str, Any]] = []
+        count = 0  # devices per loop, learned from the first complete cycle
+        while True:
+            line = await stdout.readline()
+            if not line:
+                break
+            g = parse_smi_line(line.decode(errors="replace"))
+            if g is None:
+                continue
+            if batch and g["id"] <= batch[-1]["id"]:
+                # index wrapped: previous cycle is complete
+                count = len(batch)
+                self._emit(batch)
+                batch = []
+            batch.append(g)
+            if count and len(batch) == count:
+                self._emit(batch)
+                batch = []
+
+    def _emit(self, batch: List[Dict[str, Any]]):
+        self.frames += 1
+        self.collector.push(batch)
+
+    async def _run(self):
+        while True:
+            delay = self.restart_delay
+            try:
+                self.spawns += 1
+                self._proc = await asyncio.create_subprocess_exec(
+                    *self.argv(), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+                await self._read(self._proc.stdout)
+                await self._proc.wait()
+            except asyncio.CancelledError:
+                raise
+            except FileNotFoundError:
+                delay = self.missing_delay
+            except Exception:
+                pass
+            finally:
+                await self._kill()
+            await asyncio.sleep(delay)
+
+    async def _kill(self):
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.returncode is None:
+            try:
+                proc.kill()
+                await proc.wait()
+            except ProcessLookupError:
+                pass
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        await self._kill()
@@ -0,0 +1,241 @@
+import os
+import gzip
+import json
+import asyncio
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# types worth compressing; event streams go out chunk by chunk and are never buffered
+COMPRESSIBLE = ("application/json", "text/html", "text/css", "text/plain", "text/javascript",
+                "application/javascript", "application/openmetrics-text")
+# bodies above this are compressed on a thread instead of the event loop
+OFFLOAD_BYTES = 256 * 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "private, no-cache"
+
+
+# ---- ETag / If-None-Match ----
+def etag_of(body: bytes) -> str:
+    return '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    # weak comparison: a compressed copy carries W/"..." back
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    return etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
+
+def cached_body(request: Request, etag: str, body: bytes) -> Response:
+    # private: every response is per-user; no-cache: the browser revalidates and reuses its copy on a 304
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def encode(data: Any) -> bytes:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def json_etag(request: Request, data: Any) -> Response:
+    # one serialisation; an unchanged body is answered with an empty 304
+    body = encode(data)
+    return cached_body(request, etag_of(body), body)
+
+
+# Encoded bodies keyed by a version the caller already has (e.g. the sampler
+# tick a snapshot belongs to): while the version is unchanged, repeat requests
+# skip serialisation and hashing as well as the transfer. Sync endpoints call
+# get() from the threadpool, so the dict is only touched under a lock; the
+# body is produced outside it.
+class BodyCache:
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: Dict[Hashable, Tuple[Hashable, str, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Hashable, produce: Callable[[], Any]) -> Tuple[str, bytes]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] == version:
+                self.hits += 1
+                return item[1], item[2]
+            self.misses += 1
+        body = encode(produce())
+        etag = etag_of(body)
+        with self._lock:
+            if key not in self._items:
+                while self._items and len(self._items) >= self.maxsize:
+                    self._items.pop(next(iter(self._items)))
+            self._items[key] = (version, etag, body)
+        return etag, body
+
+    def respond(self, request: Request, key: Hashable, version: Hashable, produce: Callable[[], Any]) -> Response:
+        etag, body = self.get(key, version, produce)
+        return cached_body(request, etag, body)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+# ---- static assets ----
+# Content-hashed static URLs: asset("assets/style.css") returns
+# /static/assets/style.css?v=<hash>. The hash follows the file's mtime and size,
+# so an edited asset gets a new URL without a restart.
+class AssetManifest:
+    def __init__(self, directory: str, prefix: str = "/static"):
+        self.directory = directory
+        self.prefix = prefix
+        self._hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+    def version(self, path: str) -> Optional[str]:
+        full = os.path.join(self.directory, path)
+        try:
+            st = os.stat(full)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        item = self._hashes.get(path)
+        if item is None or item[0] != key:
+            with open(full, "rb") as f:
+                item = self._hashes[path] = (key, hashlib.sha1(f.read()).hexdigest()[:12])
+        return item[1]
+
+    def url(self, path: str) -> str:
+        v = self.version(path)
+        return "%s/%s?v=%s" % (self.prefix, path, v) if v else "%s/%s" % (self.prefix, path)
+
+
+# StaticFiles that marks a response immutable when it is requested under its
+# current content hash; any other URL (old hash, no hash) is revalidated with
+# the ETag Starlette already sends.
+class HashedStaticFiles(StaticFiles):
+    def __init__(self, *args, manifest: AssetManifest, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        v = Request(scope).query_params.get("v")
+        path = os.path.relpath(full_path, self.manifest.directory)
+        if v and v == self.manifest.version(path):
+            response.headers["Cache-Control"] = IMMUTABLE
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+# ---- compression ----
+def _accepts(scope) -> Optional[str]:
+    header = ""
+    for k, v in scope["headers"]:
+        if k == b"accept-encoding":
+            header = v.decode("latin-1").lower()
+            break
+    offered = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        offered.add(name.strip())
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+# ASGI middleware: compresses single-message responses (JSON, HTML, static
+# files) of at least `minimum_size` bytes with brotli when installed and
+# accepted, gzip otherwise. Streamed responses (SSE, large files) pass through
+# untouched, as do bodies that already carry a Content-Encoding. A strong ETag
+# is weakened, since the compressed bytes differ from what it was computed on.
+class CompressMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, counters: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.counters = counters if counters is not None else {}
+        for k in ("responses", "bytes_in", "bytes_out"):
+            self.counters.setdefault(k, 0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        coding = _accepts(scope)
+        if coding is None:
+            return await self.app(scope, receive, send)
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                return await send(message)
+            head, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body") or len(body) < self.minimum_size or not self._eligible(head):
+                await send(head)
+                return await send(message)
+            if len(body) > OFFLOAD_BYTES:
+                packed = await asyncio.get_running_loop().run_in_executor(None, _compress, body, coding)
+            else:
+                packed = _compress(body, coding)
+            c = self.counters
+            c["responses"] += 1
+            c["bytes_in"] += len(body)
+            c["bytes_out"] += len(packed)
+            headers, vary = [], []
+            for k, v in head["headers"]:
+                if k == b"etag":
+                    headers.append((k, v if v.startswith(b"W/") else b"W/" + v))
+                elif k == b"vary":
+                    vary.append(v)
+                elif k != b"content-length":
+                    headers.append((k, v))
+            if not any(b"accept-encoding" in v.lower() for v in vary):
+                vary.append(b"Accept-Encoding")
+            headers += [(b"vary", b", ".join(vary)), (b"content-encoding", coding.encode()),
+                        (b"content-length", str(len(packed)).encode())]
+            await send({**head, "headers": headers})
+            await send({"type": "http.response.body", "body": packed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _eligible(head) -> bool:
+        if head["status"] < 200 or head["status"] in (204, 304):
+            return False
+        ctype = b""
+        for k, v in head["headers"]:
+            if k == b"content-encoding":
+                return False
+            if k == b"content-type":
+                ctype = v
+        ctype = ctype.split(b";")[0].strip().decode("latin-1")
+        return ctype in COMPRESSIBLE
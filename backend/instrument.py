@@ -0,0 +1,175 @@
+import time
+import asyncio
+import functools
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# upper bounds in seconds, shared by every histogram so the exposition stays uniform
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# Fixed-bucket histogram. Observations only increment list slots; no lock is
+# taken, so a rare concurrent increment from two threads may be lost, which is
+# fine for monitoring and keeps the hot path to a bisect and three adds.
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(BUCKETS, v)] += 1
+        self.sum += v
+        self.count += 1
+        if v > self.max:
+            self.max = v
+
+    def quantile(self, q: float) -> Optional[float]:
+        # upper bound of the bucket holding the q-th observation (max for the last one)
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, acc = [], 0
+        for le, n in zip(BUCKETS, self.counts):
+            acc += n
+            out.append((repr(le), acc))
+        out.append(("+Inf", acc + self.counts[-1]))
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        ms = lambda v: round(v * 1000, 3) if v is not None else None
+        return {"count": self.count, "mean_ms": ms(self.sum / self.count) if self.count else None,
+                "p50_ms": ms(self.quantile(0.5)), "p90_ms": ms(self.quantile(0.9)),
+                "p99_ms": ms(self.quantile(0.99)), "max_ms": ms(self.max)}
+
+
+# Named histograms, created on first use.
+class Timings:
+    def __init__(self):
+        self.hists: Dict[Any, Histogram] = {}
+
+    def observe(self, key: Any, seconds: float):
+        h = self.hists.get(key)
+        if h is None:
+            h = self.hists.setdefault(key, Histogram())
+        h.observe(seconds)
+
+    @contextmanager
+    def time(self, key: Any):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(key, time.perf_counter() - t0)
+
+    def timed(self, key: Any) -> Callable:
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(key, time.perf_counter() - t0)
+            return wrapper
+        return deco
+
+    def items(self) -> List[Tuple[Any, Histogram]]:
+        return sorted(self.hists.items(), key=lambda kv: str(kv[0]))
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [{"name": k, **h.summary()} for k, h in self.items()]
+
+
+# collectors and DB helpers; request latency lives in LatencyMiddleware.timings
+TIMINGS = Timings()
+
+
+# Pure ASGI middleware (BaseHTTPMiddleware would buffer streaming responses).
+# Latency is measured up to http.response.start, i.e. until headers are sent,
+# which for SSE is the time to open the stream rather than its lifetime.
+# Requests are keyed by the matched route template, so paths with ids or
+# unknown URLs do not create new series.
+class LatencyMiddleware:
+    def __init__(self, app, timings: Optional[Timings] = None):
+        self.app = app
+        self.timings = timings if timings is not None else Timings()
+        self._paths: Dict[Any, str] = {}
+
+    def _route(self, scope) -> str:
+        ep = scope.get("endpoint")
+        if ep is None:
+            return "unmatched"
+        path = self._paths.get(ep)
+        if path is None:
+            path = "other"
+            for r in scope["app"].routes:
+                if getattr(r, "endpoint", None) is ep or getattr(r, "app", None) is ep:
+                    path = r.path
+                    break
+            self._paths[ep] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        done = False
+
+        async def send_wrapper(message):
+            nonlocal done
+            if not done and message["type"] == "http.response.start":
+                done = True
+                self.timings.observe((scope["method"], self._route(scope)), time.perf_counter() - t0)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not done:
+                self.timings.observe((scope["method"], self._route(scope)), time.perf_counter() - t0)
+
+
+# Event-loop lag: how late a sleep of `interval` wakes up. Anything blocking the
+# loop (sync work in an async handler, a GIL-heavy thread) shows up here.
+class LoopLag:
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.hist = Histogram()
+        self.last = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - t0 - self.interval)
+            self.hist.observe(self.last)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def summary(self) -> Dict[str, Any]:
+        return {"last_ms": round(self.last * 1000, 3), **self.hist.summary()}
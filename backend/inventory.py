@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import socket
+import platform
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psutil
+
+from .gpu import GpuCollector, smi_inventory
+from .httpcache import encode, etag_of
+
+DMI_DIR = "/sys/class/dmi/id"
+DMI_FIELDS = ("sys_vendor", "product_name", "product_version", "product_serial", "board_vendor", "board_name",
+              "bios_vendor", "bios_version", "bios_date", "chassis_type")
+PCI_DIR = "/sys/bus/pci/devices"
+PCI_IDS = ("/usr/share/hwdata/pci.ids", "/usr/share/misc/pci.ids", "/usr/share/pci.ids")
+# PCI base classes worth listing; bridges, USB and the like are left out
+PCI_CLASSES = {0x01: "storage", 0x02: "network", 0x03: "display", 0x12: "accelerator"}
+# used when pci.ids is not installed
+PCI_VENDORS = {"10de": "NVIDIA", "8086": "Intel", "1022": "AMD", "1002": "AMD", "15b3": "Mellanox",
+               "14e4": "Broadcom", "1000": "Broadcom / LSI", "144d": "Samsung", "1af4": "Red Hat (virtio)",
+               "1d0f": "Amazon", "19e5": "Huawei", "1ed5": "Moore Threads", "1e3e": "Iluvatar", "1d94": "Hygon"}
+# cpuinfo flags that matter when placing workloads
+CPU_FLAGS = ("avx", "avx2", "avx512f", "avx512_bf16", "avx512_fp16", "avx512_vnni", "amx_tile", "amx_bf16",
+             "amx_int8", "sha_ni", "aes", "fma", "hypervisor")
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+# ---- sections ----
+def host_facts() -> Dict[str, Any]:
+    try:
+        host = socket.gethostname()
+    except Exception:
+        host = "-"
+    return {
+        "hostname": host,
+        "os": platform.system(),
+        "os_version": platform.version(),
+        "kernel": platform.release(),
+        "arch": platform.machine(),
+        "boot_time": psutil.boot_time(),
+    }
+
+
+def cpu_facts() -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "model": platform.processor() or "",
+        "vendor": "",
+        "sockets": 0,
+        "physical": psutil.cpu_count(logical=False) or 0,
+        "logical": psutil.cpu_count(logical=True) or 0,
+        "mhz": 0.0,
+        "cache": "",
+        "flags": [],
+    }
+    text = _read("/proc/cpuinfo")
+    if text:
+        sockets, cores, flags = set(), set(), set()
+        for block in text.split("\n\n"):
+            kv = {}
+            for line in block.splitlines():
+                k, _, v = line.partition(":")
+                kv[k.strip()] = v.strip()
+            if "processor" not in kv:
+                continue
+            sockets.add(kv.get("physical id", "0"))
+            cores.add((kv.get("physical id", "0"), kv.get("core id", kv["processor"])))
+            if not out["vendor"]:
+                out["model"] = kv.get("model name") or out["model"]
+                out["vendor"] = kv.get("vendor_id", "")
+                out["cache"] = kv.get("cache size", "")
+                out["mhz"] = float(kv.get("cpu MHz") or 0)
+                flags = set(kv.get("flags", "").split())
+        out["sockets"] = len(sockets)
+        out["physical"] = out["physical"] or len(cores)
+        out["flags"] = [f for f in CPU_FLAGS if f in flags]
+    # nominal maximum; cpuinfo's MHz is whatever the first core ran at when read
+    khz = _read("/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq")
+    if khz and khz.isdigit():
+        out["mhz"] = int(khz) / 1000
+    out["mhz"] = round(out["mhz"])
+    try:
+        out["numa_nodes"] = len([n for n in os.listdir("/sys/devices/system/node")
+                                 if n.startswith("node") and n[4:].isdigit()])
+    except OSError:
+        out["numa_nodes"] = 1
+    return out
+
+
+def memory_facts() -> Dict[str, Any]:
+    out = {"total_gb": round(psutil.virtual_memory().total/1024/1024/1024, 1), "hugepages": 0,
+           "hugepage_kb": 0}
+    text = _read("/proc/meminfo") or ""
+    for line in text.splitlines():
+        k, _, v = line.partition(":")
+        if k == "HugePages_Total":
+            out["hugepages"] = int(v.split()[0])
+        elif k == "Hugepagesize":
+            out["hugepage_kb"] = int(v.split()[0])
+    return out
+
+
+def dmi_facts() -> Dict[str, str]:
+    # empty in VMs without SMBIOS; product_serial is root-only and is skipped otherwise
+    out = {}
+    for field in DMI_FIELDS:
+        v = _read(os.path.join(DMI_DIR, field))
+        if v:
+            out[field] = v
+    return out
+
+
+def _pci_names(pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[str, str]]:
+    # (vendor, device) -> (vendor name, device name), reading pci.ids once for just these pairs
+    want = set(pairs)
+    vendors = {v for v, _ in want}
+    out: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    path = next((p for p in PCI_IDS if os.path.exists(p)), None)
+    if path is not None:
+        vendor = vname = None
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    if not line.strip() or line.startswith("#"):
+                        continue
+                    if line.startswith("C "):
+                        # device classes follow the vendor list
+                        break
+                    if not line.startswith("\t"):
+                        vendor, _, vname = line.strip().partition("  ")
+                        if vendor not in vendors:
+                            vendor = None
+                    elif vendor is not None and not line.startswith("\t\t"):
+                        dev, _, dname = line.strip().partition("  ")
+                        if (vendor, dev) in want:
+                            out[(vendor, dev)] = (vname, dname)
+        except OSError:
+            pass
+    for v, d in want:
+        if (v, d) not in out:
+            out[(v, d)] = (PCI_VENDORS.get(v, v), d)
+    return out
+
+
+def pci_devices() -> List[Dict[str, Any]]:
+    try:
+        addrs = sorted(os.listdir(PCI_DIR))
+    except OSError:
+        return []
+    out = []
+    for addr in addrs:
+        base = os.path.join(PCI_DIR, addr)
+        cls = _read(os.path.join(base, "class"))
+        try:
+            code = int(cls, 16)
+        except (TypeError, ValueError):
+            continue
+        kind = PCI_CLASSES.get(code >> 16)
+        if kind is None:
+            continue
+        vendor = (_read(os.path.join(base, "vendor")) or "").replace("0x", "")
+        device = (_read(os.path.join(base, "device")) or "").replace("0x", "")
+        try:
+            driver = os.path.basename(os.readlink(os.path.join(base, "driver")))
+        except OSError:
+            driver = ""
+        numa = _read(os.path.join(base, "numa_node"))
+        out.append({
+            "address": addr, "class": kind, "class_code": "%06x" % code, "vendor_id": vendor, "device_id": device,
+            "driver": driver, "numa_node": int(numa) if numa and numa.lstrip("-").isdigit() else -1,
+            "link_speed": _read(os.path.join(base, "current_link_speed")) or "",
+            "link_width": _read(os.path.join(base, "current_link_width")) or "",
+            "max_link_speed": _read(os.path.join(base, "max_link_speed")) or "",
+            "max_link_width": _read(os.path.join(base, "max_link_width")) or "",
+        })
+    names = _pci_names([(d["vendor_id"], d["device_id"]) for d in out])
+    for d in out:
+        d["vendor"], d["device"] = names[(d["vendor_id"], d["device_id"])]
+    return out
+
+
+# Static hardware facts (host, CPU, memory, DMI, PCI devices, GPU topology),
+# collected once and then served from memory: get() is a lookup that returns
+# the ETag, the dict and its encoded JSON together. Nothing here is re-read
+# until invalidate() -- the admin refresh endpoint -- drops the cache; the
+# next get() collects again. Each section fails on its own, so a missing
+# /sys file costs that section and not the inventory.
+class Inventory:
+    def __init__(self, gpu: GpuCollector, smi_cmd: str = "nvidia-smi"):
+        self.gpu = gpu
+        self.smi_cmd = smi_cmd
+        self.collections = 0
+        self.collect_ms = 0.0
+        self.errors: Dict[str, str] = {}
+        self.published: Tuple[int, str] = (0, "")
+        self.publish_errors = 0
+        self._cached: Optional[Tuple[str, Dict[str, Any], bytes]] = None
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        # request_publish(): a thread is running / another build was asked for meanwhile
+        self._pending = threading.Lock()
+        self._publishing = False
+        self._again = False
+
+    def _gpus(self) -> Dict[str, Any]:
+        if self.gpu.nvml_available():
+            return self.gpu.inventory()
+        return smi_inventory(self.smi_cmd)
+
+    def _collect(self) -> Dict[str, Any]:
+        sections: Dict[str, Callable[[], Any]] = {
+            "host": host_facts, "cpu": cpu_facts, "memory": memory_facts, "dmi": dmi_facts,
+            "pci": pci_devices, "gpu": self._gpus,
+        }
+        data: Dict[str, Any] = {}
+        errors = {}
+        for name, fn in sections.items():
+            try:
+                data[name] = fn()
+            except Exception as e:
+                data[name] = None
+                errors[name] = "%s: %s" % (type(e).__name__, e)
+        data["collected_at"] = time.time()
+        self.errors = errors
+        return data
+
+    def get(self) -> Tuple[str, Dict[str, Any], bytes]:
+        cached = self._cached
+        if cached is not None:
+            return cached
+        with self._lock:
+            # another request may have collected while we waited
+            if self._cached is None:
+                t0 = time.perf_counter()
+                data = self._collect()
+                body = encode(data)
+                self._cached = (etag_of(body), data, body)
+                self.collections += 1
+                self.collect_ms = round((time.perf_counter() - t0) * 1000, 1)
+            return self._cached
+
+    def invalidate(self):
+        self._cached = None
+
+    def refresh(self) -> Tuple[str, Dict[str, Any], bytes]:
+        self.invalidate()
+        return self.get()
+
+    def publish(self, path: str) -> Tuple[int, str]:
+        # production mode, collector: collect again and write the encoded body for
+        # the workers, renamed into place so they never read half a file
+        with self._publish_lock:
+            etag, _, body = self.refresh()
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", dir=os.path.dirname(path) or ".")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(body)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self.published = (self.collections, etag)
+            return self.published
+
+    def request_publish(self, path: str):
+        # called from the sampler for SIG_INVENTORY: publishes on a side thread, and
+        # requests that arrive meanwhile coalesce into one more build after it
+        with self._pending:
+            if self._publishing:
+                self._again = True
+                return
+            self._publishing = True
+        threading.Thread(target=self._publish_loop, args=(path,), name="inventory", daemon=True).start()
+
+    def _publish_loop(self, path: str):
+        while True:
+            try:
+                self.publish(path)
+            except Exception as e:
+                self.publish_errors += 1
+                self.errors["publish"] = "%s: %s" % (type(e).__name__, e)
+            with self._pending:
+                if not self._again:
+                    self._publishing = False
+                    return
+                self._again = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cached": self._cached is not None, "collections": self.collections,
+                "collect_ms": self.collect_ms, "errors": self.errors}
+
+
+# Worker side of production mode: serves the body the collector published
+# (Inventory.publish) and never collects. Each shared tick carries the
+# collector's (collections, etag); when it moves on, the copy here is dropped
+# and the next get() reads the file again. refresh() raises SIG_INVENTORY in
+# the caller and waits here for the tick that announces the new build.
+class SharedInventory:
+    def __init__(self, path: str):
+        self.path = path
+        self.published: Tuple[int, str] = (0, "")
+        self.loads = 0
+        self._cached: Optional[Tuple[str, Dict[str, Any], bytes]] = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+
+    def get(self) -> Tuple[str, Dict[str, Any], bytes]:
+        cached = self._cached
+        if cached is not None:
+            return cached
+        with self._lock:
+            if self._cached is None:
+                with open(self.path, "rb") as f:
+                    body = f.read()
+                self._cached = (etag_of(body), json.loads(body), body)
+                self.loads += 1
+            return self._cached
+
+    def sync(self, published):
+        # called with every tick
+        published = tuple(published)
+        if published == self.published:
+            return
+        with self._changed:
+            self.published = published
+            self._cached = None
+            self._changed.notify_all()
+
+    def wait(self, after: int, timeout: float) -> bool:
+        # until the collector has published a build newer than `after`
+        with self._changed:
+            return self._changed.wait_for(lambda: self.published[0] > after, timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cached": self._cached is not None, "collections": self.published[0], "loads": self.loads}
@@ -0,0 +1,75 @@
+import json
+from typing import Any, Dict, List, Optional, Set
+
+from .sampler import Subscription
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+# One tick of the live channel, serialised once and shared by every subscriber.
+class LiveFrame:
+    __slots__ = ("seq", "version", "schema", "key", "delta")
+
+    def __init__(self, seq: int, version: int, schema: str, key: str, delta: str):
+        self.seq = seq
+        self.version = version
+        self.schema = schema
+        self.key = key
+        self.delta = delta
+
+
+# Delta-encoded stream of every sampled series. Clients get a schema event
+# (series names) and a key event (all values, positional), then per tick only
+# the changed values as a flat [seq, ts, idx, val, idx, val, ...] array.
+class LiveChannel:
+    def __init__(self, queue_size: int = 4):
+        self.queue_size = queue_size
+        self.version = 0
+        self.names: List[str] = []
+        self.latest: Optional[LiveFrame] = None
+        self._index: Dict[str, int] = {}
+        self._values: List[Any] = []
+        self._schema = ""
+        self._subs: Set[Subscription] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def subscribe(self) -> Subscription:
+        sub = Subscription(self.queue_size)
+        if self.latest is not None:
+            sub.offer((self.latest.seq, self.latest))
+        self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        self._subs.discard(sub)
+
+    def on_frame(self, seq: int, frame: Dict[str, Any]):
+        # Sampler listener; skip all encoding while nobody is watching
+        series = frame.get("series")
+        if series is None or not self._subs:
+            self.latest = None
+            return
+        if len(series) != len(self._index) or any(n not in self._index for n in series):
+            self.version += 1
+            self.names = sorted(series)
+            self._index = {n: i for i, n in enumerate(self.names)}
+            self._values = [None] * len(self.names)
+            self._schema = "event: schema\ndata: %s\n\n" % _dumps({"v": self.version, "names": self.names})
+        ts = round(frame.get("ts", 0), 3)
+        values, delta = self._values, [seq, ts]
+        for name, v in series.items():
+            i = self._index[name]
+            if values[i] != v:
+                values[i] = v
+                delta.append(i)
+                delta.append(v)
+        key = "event: key\ndata: %s\n\n" % _dumps([seq, ts, values])
+        lf = LiveFrame(seq, self.version, self._schema, key, "data: %s\n\n" % _dumps(delta))
+        self.latest = lf
+        for sub in self._subs:
+            sub.offer((seq, lf))
@@ -0,0 +1,424 @@
+import os
+import re
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from re import _parser as _sre_parse, _constants as _sre
+except ImportError:
+    # Python < 3.11
+    import sre_parse as _sre_parse, sre_constants as _sre
+
+from . import db as dbm
+from .sampler import Subscription
+
+DEFAULT_FILES = "/var/log/syslog,/var/log/kern.log,/var/log/messages"
+SEVERITIES = ("crit", "error", "warning", "info")
+MAX_LINE = 4096
+
+_MONTHS = {m: i for i, m in enumerate(("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                                       "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+# "Oct 17 10:25:03 host prog[123]: msg"
+_RFC3164 = re.compile(r"^([A-Z][a-z]{2}) +(\d{1,2}) (\d\d:\d\d:\d\d) (\S+) ([^:\[\s]+)(?:\[\d+\])?: ?(.*)")
+# "2026-10-17T10:25:03.123456+08:00 host prog[123]: msg" (rsyslog high precision / journalctl -o short-iso)
+_ISO_SYSLOG = re.compile(r"^(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)(?:\.\d+)?(?:Z|[+-]\d\d:?\d\d)? (\S+) ([^:\[\s]+)(?:\[\d+\])?: ?(.*)")
+# application logs: "2026-10-17 10:25:03,123 ERROR ..."
+_ISO_APP = re.compile(r"^(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)\S*\s+(.*)")
+_SEVERITY = re.compile(r"\b(?:(panic|fatal|crit(?:ical)?|emerg(?:ency)?|oops)|(err(?:or)?|fail(?:ed|ure)?|xid)|(warn(?:ing)?))\b", re.I)
+
+
+def severity_of(msg: str) -> str:
+    m = _SEVERITY.search(msg)
+    if m is None:
+        return "info"
+    return SEVERITIES[m.lastindex - 1]
+
+
+def parse_line(line: str, default_source: str, now: Optional[float] = None) -> Tuple[str, str, str, str, str]:
+    # -> (ts, host, source, severity, message); lines without a timestamp get the ingest time
+    m = _RFC3164.match(line)
+    if m:
+        mon, day, hms, host, source, msg = m.groups()
+        now = now or time.time()
+        year = time.localtime(now).tm_year
+        ts = "%d-%02d-%02d %s" % (year, _MONTHS.get(mon, 1), int(day), hms)
+        # syslog has no year: a date in the future belongs to last year (Dec lines read in Jan)
+        if ts > time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now + 86400)):
+            ts = "%d%s" % (year - 1, ts[4:])
+        return ts, host, source, severity_of(msg), msg
+    m = _ISO_SYSLOG.match(line)
+    if m:
+        d, hms, host, source, msg = m.groups()
+        return d + " " + hms, host, source, severity_of(msg), msg
+    m = _ISO_APP.match(line)
+    if m:
+        d, hms, msg = m.groups()
+        return d + " " + hms, "", default_source, severity_of(msg), msg
+    ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now or time.time()))
+    return ts, "", default_source, severity_of(line), line
+
+
+def fts_query(q: str) -> str:
+    # every term (or "quoted phrase") becomes an FTS5 string, so user input never
+    # hits the query syntax; terms are ANDed
+    terms = re.findall(r'"([^"]*)"|(\S+)', q)
+    return " ".join('"%s"' % (a or b).replace('"', '""') for a, b in terms if (a or b).strip())
+
+
+# Tails the configured files from saved (inode, offset) checkpoints. Files are
+# kept open between polls, so after a rotation the old inode is read to its end
+# before switching to the new file. New lines of one poll are written, together
+# with the checkpoints, in a single transaction; the in-memory offsets follow
+# only after it commits, so a failed write is retried from the same place.
+class LogIngestor:
+    def __init__(self, paths: List[str], interval: float = 1.0, retention_days: float = 7,
+                 backfill: int = 8 * 1024 * 1024, chunk: int = 4 * 1024 * 1024):
+        self.paths = [p for p in paths if p]
+        self.interval = interval
+        self.retention = retention_days * 86400
+        self.backfill = backfill
+        self.chunk = chunk
+        self.lines = 0
+        self.batches = 0
+        self.pruned = 0
+        self.last_poll_ms = 0.0
+        self.write_errors = 0
+        self.last_error = ""
+        # id of the newest row written
+        self.last_id = 0
+        self.errors: Dict[str, str] = {}
+        # called on the ingest thread with (file, first_id, rows) for every file read
+        self.listeners: List[Callable[[str, int, List[tuple]], None]] = []
+        # path -> {"f", "ino", "offset"}
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._saved: Dict[str, Tuple[int, int]] = {}
+        self._last_prune = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _open(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            f = open(path, "rb")
+        except OSError as e:
+            self.errors[path] = str(e)
+            return None
+        self.errors.pop(path, None)
+        st = os.fstat(f.fileno())
+        ino, offset = self._saved.pop(path, (None, None))
+        if ino != st.st_ino or offset > st.st_size:
+            if ino is None and st.st_size > self.backfill:
+                # first sight of a big file: only its tail, starting at a line boundary
+                f.seek(st.st_size - self.backfill)
+                f.readline()
+                offset = f.tell()
+            else:
+                offset = 0
+        ent = {"f": f, "ino": st.st_ino, "offset": offset}
+        self._files[path] = ent
+        return ent
+
+    def _read(self, path: str, ent: Dict[str, Any], rows: List[tuple], final: bool = False) -> int:
+        # returns the offset after what was read; ent["offset"] moves only once the rows are committed
+        f = ent["f"]
+        f.seek(ent["offset"])
+        data = f.read(self.chunk)
+        if not data:
+            return ent["offset"]
+        end = data.rfind(b"\n") + 1
+        if not end:
+            if not final and len(data) < self.chunk:
+                return ent["offset"]
+            end = len(data)
+        elif final and end < len(data):
+            end = len(data)
+        src = os.path.basename(path)
+        now = time.time()
+        for raw in data[:end].splitlines():
+            if raw:
+                line = raw.decode("utf-8", "replace")[:MAX_LINE]
+                rows.append((*parse_line(line, src, now), src))
+        return ent["offset"] + end
+
+    def poll(self) -> int:
+        t0 = time.perf_counter()
+        rows: List[tuple] = []
+        # (file, start, end) slices of rows, one per file read
+        reads: List[Tuple[str, int, int]] = []
+        # offsets reached by this poll, applied once log_ingest has committed the rows
+        offsets: Dict[str, int] = {}
+        # rotated files: drained now, replaced by the new file after the commit
+        rotated: Dict[str, int] = {}
+        for path in self.paths:
+            ent = self._files.get(path) or self._open(path)
+            if ent is None:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            n = len(rows)
+            if st is not None and st.st_ino != ent["ino"]:
+                # rotated: drain the old inode; the new file is read from the next poll on
+                offsets[path] = self._read(path, ent, rows, final=True)
+                rotated[path] = st.st_ino
+            else:
+                if st is not None and st.st_size < ent["offset"]:
+                    # truncated in place (copytruncate)
+                    ent["offset"] = 0
+                offsets[path] = self._read(path, ent, rows)
+            reads.append((os.path.basename(path), n, len(rows)))
+        cps = [(p, rotated[p], 0) if p in rotated else (p, e["ino"], offsets.get(p, e["offset"]))
+               for p, e in self._files.items()]
+        first = 0
+        if rows:
+            try:
+                first = dbm.log_ingest(rows, cps)
+            except Exception as e:
+                # nothing moved: the same lines are read again on the next poll
+                self.write_errors += 1
+                self.last_error = "%s: %s" % (type(e).__name__, e)
+                self.last_poll_ms = round((time.perf_counter() - t0) * 1000, 2)
+                return 0
+        for path, offset in offsets.items():
+            self._files[path]["offset"] = offset
+        for path, ino in rotated.items():
+            self._files.pop(path)["f"].close()
+            self._saved[path] = (ino, 0)
+        if rows:
+            self.last_id = first + len(rows) - 1
+            self.lines += len(rows)
+            self.batches += 1
+            for fn in self.listeners:
+                for src, a, b in reads:
+                    if b > a:
+                        try:
+                            fn(src, first + a, rows[a:b])
+                        except Exception:
+                            pass
+        self.last_poll_ms = round((time.perf_counter() - t0) * 1000, 2)
+        # after a rotation the new file is due at once
+        return len(rows) or len(rotated)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime((now or time.time()) - self.retention))
+        n = dbm.log_prune(cutoff)
+        self.pruned += n
+        return n
+
+    def _run(self):
+        self._saved = {r["path"]: (r["inode"], r["offset"]) for r in dbm.log_checkpoints()}
+        while not self._stop.is_set():
+            try:
+                # keep reading without sleeping while a backlog is being caught up
+                while self.poll() and not self._stop.is_set():
+                    pass
+                if time.time() - self._last_prune >= 3600:
+                    self._last_prune = time.time()
+                    self.prune()
+            except Exception:
+                pass
+            self._stop.wait(self.interval)
+        for ent in self._files.values():
+            ent["f"].close()
+        self._files.clear()
+        dbm.close()
+
+    def start(self):
+        if self._thread is None and self.paths:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="log-ingest", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+
+    def sources(self) -> List[Dict[str, Any]]:
+        out = []
+        for path in self.paths:
+            ent = self._files.get(path)
+            out.append({"path": path, "offset": ent["offset"] if ent else None,
+                        "error": self.errors.get(path)})
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {"files": len(self._files), "lines": self.lines, "batches": self.batches,
+                "pruned": self.pruned, "last_poll_ms": self.last_poll_ms, "last_id": self.last_id,
+                "write_errors": self.write_errors, "last_error": self.last_error}
+
+
+# ---- live-tail filter patterns ----
+_REPEATS = {_sre.MAX_REPEAT, _sre.MIN_REPEAT, getattr(_sre, "POSSESSIVE_REPEAT", _sre.MAX_REPEAT)}
+# nested bounded repeats are allowed while their counts multiply to at most this, e.g. (\d{1,3}\.){3}
+MAX_NESTED_REPEAT = 1000
+# alternation may repeat this often at most, e.g. (up|down){2}
+MAX_BRANCH_REPEAT = 16
+# repeats above this count are "wide"; two of them in sequence (a.*b.*c) already cost
+# O(n^3) on a line that does not match, so a pattern gets one
+MAX_WIDE_REPEATS = 1
+# filters look at the first 1 KB of a message (the RFC 3164 line limit); with one wide
+# repeat a miss is still O(n^2) in what is searched
+MAX_MATCH_CHARS = 1024
+
+
+def _check_regex(items, outer: int = 1):
+    # rejects what can backtrack catastrophically: an unbounded or large repeat inside
+    # another repeat ((a+)+, (a*b?)*, (a{1,2})+), repeated alternation and backreferences.
+    # `outer` is the product of the enclosing repeat counts (MAXREPEAT once any is unbounded)
+    for op, av in items:
+        if op in _REPEATS:
+            lo, hi, sub = av
+            if hi > 1:
+                if outer > 1 and (hi == _sre.MAXREPEAT or outer == _sre.MAXREPEAT
+                                  or outer * hi > MAX_NESTED_REPEAT):
+                    raise re.error("nested quantifiers are not allowed")
+                _check_regex(sub, _sre.MAXREPEAT if hi == _sre.MAXREPEAT else outer * hi)
+            else:
+                _check_regex(sub, outer)
+        elif op in (_sre.GROUPREF, _sre.GROUPREF_EXISTS):
+            raise re.error("backreferences are not allowed")
+        elif op == _sre.SUBPATTERN:
+            _check_regex(av[-1], outer)
+        elif op == _sre.BRANCH:
+            if outer > MAX_BRANCH_REPEAT:
+                # overlapping alternatives under + or * backtrack the same way: (a|aa)+
+                raise re.error("alternation inside a repeat is not allowed")
+            for branch in av[1]:
+                _check_regex(branch, outer)
+        elif op in (_sre.ASSERT, _sre.ASSERT_NOT):
+            _check_regex(av[1], outer)
+        elif op == getattr(_sre, "ATOMIC_GROUP", None):
+            _check_regex(av, outer)
+
+
+def _wide_repeats(items) -> int:
+    n = 0
+    for op, av in items:
+        if op in _REPEATS:
+            n += (av[1] > MAX_BRANCH_REPEAT) + _wide_repeats(av[2])
+        elif op == _sre.SUBPATTERN:
+            n += _wide_repeats(av[-1])
+        elif op == _sre.BRANCH:
+            n += sum(_wide_repeats(b) for b in av[1])
+        elif op in (_sre.ASSERT, _sre.ASSERT_NOT):
+            n += _wide_repeats(av[1])
+        elif op == getattr(_sre, "ATOMIC_GROUP", None):
+            n += _wide_repeats(av)
+    return n
+
+
+def compile_pattern(pattern: str, regex: bool = False) -> "re.Pattern":
+    # literal, case-insensitive by default; regexes are checked first because every
+    # subscriber's filter runs on the shared ingest thread
+    if not regex:
+        return re.compile(re.escape(pattern), re.I)
+    parsed = _sre_parse.parse(pattern)
+    _check_regex(parsed)
+    if _wide_repeats(parsed) > MAX_WIDE_REPEATS:
+        raise re.error("at most %d unbounded quantifier is allowed" % MAX_WIDE_REPEATS)
+    return re.compile(pattern, re.I)
+
+
+# Per-subscriber filter, compiled once when the stream opens.
+class LogFilter:
+    __slots__ = ("pattern", "severities", "sources", "key")
+
+    def __init__(self, pattern: Optional[str] = None, severities=None, sources=None, regex: bool = False):
+        self.pattern = compile_pattern(pattern, regex) if pattern else None
+        self.severities = frozenset(severities or ())
+        self.sources = frozenset(sources or ())
+        # subscribers with equal filters share one encoded frame
+        self.key = (pattern, regex, self.severities, self.sources)
+
+    def match(self, row: tuple) -> bool:
+        # row: (ts, host, source, severity, message, file)
+        if self.severities and row[3] not in self.severities:
+            return False
+        if self.sources and row[2] not in self.sources:
+            return False
+        return self.pattern is None or self.pattern.search(row[4], 0, MAX_MATCH_CHARS) is not None
+
+
+def _line(i: int, row: tuple) -> list:
+    return [i, row[0], row[1], row[2], row[3], row[4]]
+
+
+# Live tail. The ingest thread filters every file read once per distinct filter
+# and hands each subscriber one frame per read via the event loop; a subscriber
+# that falls behind loses its oldest frames and is told how many.
+class LogTail:
+    def __init__(self, queue_size: int = 64, max_lines: int = 500):
+        self.queue_size = queue_size
+        self.max_lines = max_lines
+        self.frames = 0
+        self._subs: Dict[Subscription, LogFilter] = {}
+        # production-mode workers: newest log id already handed to subscribers
+        self.cursor: Optional[int] = None
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def bind(self, loop):
+        self._loop = loop
+
+    def subscribe(self, flt: LogFilter) -> Subscription:
+        sub = Subscription(self.queue_size)
+        with self._lock:
+            self._subs[sub] = flt
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subs.pop(sub, None)
+
+    def encode(self, src: str, lines: List[list], skipped: int = 0) -> Tuple[int, str]:
+        frame = {"file": src, "lines": lines}
+        if skipped:
+            frame["skipped"] = skipped
+        return lines[-1][0], json.dumps(frame, ensure_ascii=False, separators=(',', ':'))
+
+    def on_read(self, src: str, first_id: int, rows: List[tuple]):
+        # LogIngestor listener, runs on the ingest thread
+        loop = self._loop
+        if loop is None or not self._subs:
+            return
+        with self._lock:
+            subs = list(self._subs.items())
+        encoded: Dict[tuple, Optional[Tuple[int, str]]] = {}
+        for sub, flt in subs:
+            if flt.key not in encoded:
+                lines = [_line(first_id + i, r) for i, r in enumerate(rows) if flt.match(r)]
+                skipped = max(0, len(lines) - self.max_lines)
+                encoded[flt.key] = self.encode(src, lines[skipped:], skipped) if lines else None
+            item = encoded[flt.key]
+            if item is not None:
+                self.frames += 1
+                try:
+                    loop.call_soon_threadsafe(sub.offer, item)
+                except RuntimeError:
+                    # loop already closed during shutdown
+                    return
+
+    def catch_up(self, newest: int):
+        # production-mode workers have no ingest thread: lines the collector wrote
+        # up to `newest` are read back from the db and fed through on_read
+        after, self.cursor = self.cursor, newest
+        if after is None or newest <= after or not self._subs:
+            return
+        # bounded above: lines written since `newest` must not push these out of the limit
+        rows = dbm.log_after(after, self.max_lines, newest)
+        i = 0
+        while i < len(rows):
+            # one frame per run of consecutive ids from the same file, as the ingest thread sends them
+            j = i + 1
+            while j < len(rows) and rows[j]["file"] == rows[i]["file"] and rows[j]["id"] == rows[j - 1]["id"] + 1:
+                j += 1
+            self.on_read(rows[i]["file"], rows[i]["id"], [tuple(r)[1:] for r in rows[i:j]])
+            i = j
@@ -0,0 +1,101 @@
+import time
+import socket
+import threading
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+LINK_FAMILIES = {f for f in (getattr(psutil, 'AF_LINK', None), getattr(socket, 'AF_PACKET', None)) if f is not None}
+
+
+def counter_delta(cur: int, prev: int, limit: Optional[float] = None) -> int:
+    # counters only grow; a smaller value is either a 32/64-bit wrap or a reset
+    if cur >= prev:
+        return cur - prev
+    width = 2 ** 32 if prev < 2 ** 32 else 2 ** 64
+    d = cur + width - prev
+    if limit is not None and d > limit:
+        # implausible for the link speed: interface was re-created, count from zero
+        return cur
+    return d
+
+
+# NIC counters are sampled on the sampler's fixed schedule, so every reader sees
+# the same interval. Addresses, MTU, speed and link state are cached and rescanned
+# only when the interface set changes or every `static_ttl` seconds.
+class NetMonitor:
+    def __init__(self, static_ttl: float = 15.0):
+        self.static_ttl = static_ttl
+        self.ts = 0.0
+        self._prev: Dict[str, tuple] = {}
+        self._static: Dict[str, Dict[str, Any]] = {}
+        self._static_ts = 0.0
+        self._names: frozenset = frozenset()
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _scan_static(self, names) -> Dict[str, Dict[str, Any]]:
+        stats = psutil.net_if_stats()
+        addrs = psutil.net_if_addrs()
+        out = {}
+        for name in set(stats) | set(names):
+            st = stats.get(name)
+            ipv4 = ipv6 = mac = None
+            for a in addrs.get(name, []):
+                if a.family == socket.AF_INET and ipv4 is None:
+                    ipv4 = a.address
+                elif a.family == socket.AF_INET6 and ipv6 is None:
+                    ipv6 = a.address
+                elif a.family in LINK_FAMILIES and mac is None:
+                    mac = a.address
+            out[name] = {
+                'isup': st.isup if st else False,
+                'speed_mbps': (st.speed or 0) if st else 0,
+                'mtu': st.mtu if st else 0,
+                'ipv4': ipv4,
+                'ipv6': ipv6,
+                'mac': mac,
+            }
+        return out
+
+    def sample(self, now: Optional[float] = None) -> Dict[str, float]:
+        # returns {"net.<nic>.rx": Mb/s, "net.<nic>.tx": Mb/s} for the history store
+        now = now or time.time()
+        io_now = psutil.net_io_counters(pernic=True) or {}
+        names = frozenset(io_now)
+        if names != self._names or now - self._static_ts >= self.static_ttl:
+            self._static = self._scan_static(names)
+            self._static_ts, self._names = now, names
+        series: Dict[str, float] = {}
+        rows = []
+        for name, info in self._static.items():
+            io = io_now.get(name)
+            rx_rate = tx_rate = 0.0
+            if io is not None:
+                prev = self._prev.get(name)
+                if prev:
+                    dt = max(0.001, now - prev[2])
+                    # bytes a link could plausibly move in dt (x2 headroom, 400 Gb/s when speed unknown)
+                    limit = (info['speed_mbps'] or 400_000) * 1_000_000 / 8 * dt * 2
+                    rx_rate = counter_delta(io.bytes_recv, prev[0], limit) * 8 / 1_000_000 / dt
+                    tx_rate = counter_delta(io.bytes_sent, prev[1], limit) * 8 / 1_000_000 / dt
+                self._prev[name] = (io.bytes_recv, io.bytes_sent, now)
+                series["net.%s.rx" % name] = round(rx_rate, 3)
+                series["net.%s.tx" % name] = round(tx_rate, 3)
+            rows.append({
+                'name': name,
+                **info,
+                'rx_bytes': io.bytes_recv if io else 0,
+                'tx_bytes': io.bytes_sent if io else 0,
+                'rx_rate_mbps': round(rx_rate, 1),
+                'tx_rate_mbps': round(tx_rate, 1),
+            })
+        for gone in set(self._prev) - set(io_now):
+            del self._prev[gone]
+        with self._lock:
+            self._rows, self.ts = rows, now
+        return series
+
+    def interfaces(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._rows
@@ -0,0 +1,211 @@
+import os
+import pwd
+import sys
+import time
+import heapq
+import threading
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psutil
+
+# row layout; one list per live process, updated in place on every scan. CPU holds
+# the tick delta of the last scan and RSS bytes: percentages are derived only for
+# the rows a request returns, and sort the same way as the raw values.
+PID, NAME, USER, CPU, RSS, GPU_MEM, THREADS, STATUS, CMD, STARTED, GPUS, _TICKS, _START = range(13)
+SORT_KEYS = {"pid": PID, "name": NAME, "user": USER, "cpu": CPU, "rss": RSS, "mem": RSS, "gpu_mem": GPU_MEM,
+             "threads": THREADS, "started": STARTED}
+# text columns read naturally ascending, numbers descending
+ASCENDING = {"name", "user"}
+MAX_CMD = 512
+# /proc/<pid>/stat state letters; psutil already reports names
+STATES = {b"R": "running", b"S": "sleeping", b"D": "disk-sleep", b"Z": "zombie", b"T": "stopped",
+          b"t": "tracing-stop", b"I": "idle", b"X": "dead", b"W": "waking", b"P": "parked"}
+FALLBACK_ATTRS = ["pid", "name", "username", "cpu_times", "memory_info", "num_threads", "status", "create_time",
+                  "cmdline"]
+
+
+def _state(s) -> str:
+    if isinstance(s, bytes):
+        return STATES.get(s) or s.decode("ascii", "replace")
+    return s
+
+
+def _read(path: str, n: int = 4096) -> bytes:
+    with open(path, "rb", buffering=0) as f:
+        return f.read(n)
+
+
+# Process table for the top-N view. A scan walks /proc once and reads a single
+# file per process (/proc/<pid>/stat has CPU ticks, state, threads, start time
+# and RSS); name, user and command line are read only when a pid is first seen.
+# CPU percent is the tick delta since the previous scan, so nothing blocks on
+# an interval. Rows persist between scans and requests only pick the top N with
+# a partial sort. Scans are shared: at most one per `max_age` seconds.
+# Off Linux the same rows are filled from psutil.process_iter(attrs=...).
+class ProcessTable:
+    def __init__(self, gpu_procs: Optional[Callable[[], Dict[int, Tuple[int, List[int]]]]] = None,
+                 max_age: float = 2.0):
+        self.gpu_procs = gpu_procs
+        self.max_age = max_age
+        self.ts = 0.0
+        # seconds covered by the last scan's CPU deltas
+        self.dt = 0.0
+        self.scans = 0
+        self.last_scan_ms = 0.0
+        self._rows: Dict[int, list] = {}
+        self._users: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._proc = os.path.isdir("/proc/self") and sys.platform.startswith("linux")
+        # CPU deltas are clock ticks from /proc, seconds from psutil
+        self._hz = os.sysconf("SC_CLK_TCK") if self._proc else 1
+        self._page = os.sysconf("SC_PAGE_SIZE") if self._proc else 4096
+        self._boot = 0.0
+        self._mem_total = 0
+
+    def _user(self, uid: int) -> str:
+        name = self._users.get(uid)
+        if name is None:
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                name = str(uid)
+            self._users[uid] = name
+        return name
+
+    def _new_row(self, pid: int, name: str, start) -> list:
+        return [pid, name, "", 0, 0, 0, 0, "", "", 0.0, None, None, start]
+
+    def _scan_proc(self):
+        rows, hz, page = self._rows, self._hz, self._page
+        seen = set()
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                data = _read("/proc/%s/stat" % entry, 1024)
+            except OSError:
+                continue
+            r = data.rfind(b")")
+            f = data[r + 2:].split()
+            pid, start = int(entry), int(f[19])
+            row = rows.get(pid)
+            if row is None or row[_START] != start:
+                # new process, or the pid was reused
+                row = rows[pid] = self._new_row(pid, data[data.find(b"(") + 1:r].decode("utf-8", "replace"), start)
+                row[STARTED] = round(self._boot + start / hz, 1)
+                try:
+                    row[USER] = self._user(os.stat("/proc/" + entry).st_uid)
+                    cmd = _read("/proc/%s/cmdline" % entry, MAX_CMD)
+                    row[CMD] = cmd.replace(b"\0", b" ").strip().decode("utf-8", "replace")
+                except OSError:
+                    pass
+            ticks = int(f[11]) + int(f[12])
+            prev = row[_TICKS]
+            row[CPU] = ticks - prev if prev is not None else 0
+            row[_TICKS] = ticks
+            row[RSS] = int(f[21]) * page
+            row[THREADS] = int(f[17])
+            row[STATUS] = f[0]
+            seen.add(pid)
+        return seen
+
+    def _scan_psutil(self):
+        rows = self._rows
+        seen = set()
+        for p in psutil.process_iter(attrs=FALLBACK_ATTRS, ad_value=None):
+            info = p.info
+            pid, start = info["pid"], info["create_time"]
+            row = rows.get(pid)
+            if row is None or row[_START] != start:
+                row = rows[pid] = self._new_row(pid, info["name"] or "", start)
+                row[STARTED] = round(start or 0.0, 1)
+                row[USER] = info["username"] or ""
+                row[CMD] = " ".join(info["cmdline"] or [])[:MAX_CMD]
+            ct = info["cpu_times"]
+            if ct is not None:
+                ticks = ct.user + ct.system
+                prev = row[_TICKS]
+                row[CPU] = ticks - prev if prev is not None else 0
+                row[_TICKS] = ticks
+            mi = info["memory_info"]
+            row[RSS] = mi.rss if mi is not None else 0
+            row[THREADS] = info["num_threads"] or 0
+            row[STATUS] = info["status"] or ""
+            seen.add(pid)
+        return seen
+
+    def _scan(self):
+        now = time.time()
+        t0 = time.perf_counter()
+        if not self._boot:
+            self._boot = psutil.boot_time()
+            self._mem_total = psutil.virtual_memory().total
+        seen = self._scan_proc() if self._proc else self._scan_psutil()
+        for pid in [p for p in self._rows if p not in seen]:
+            del self._rows[pid]
+        gpu = self.gpu_procs() if self.gpu_procs is not None else {}
+        for pid, row in self._rows.items():
+            g = gpu.get(pid)
+            row[GPU_MEM], row[GPUS] = (g[0], g[1]) if g else (0, None)
+        self.dt = now - self.ts if self.ts else 0.0
+        self.ts = now
+        self.scans += 1
+        self.last_scan_ms = round((time.perf_counter() - t0) * 1000, 2)
+
+    def refresh(self):
+        if time.time() - self.ts < self.max_age:
+            return
+        with self._lock:
+            # another request may have scanned while we waited
+            if time.time() - self.ts >= self.max_age:
+                self._scan()
+
+    def top(self, sort: str = "cpu", limit: int = 50, desc: Optional[bool] = None,
+            q: Optional[str] = None) -> Dict[str, Any]:
+        self.refresh()
+        col = SORT_KEYS[sort]
+        if desc is None:
+            desc = sort not in ASCENDING
+        with self._lock:
+            rows = list(self._rows.values())
+        total = len(rows)
+        if q:
+            q = q.lower()
+            rows = [r for r in rows if q in r[NAME].lower() or q in r[CMD].lower()]
+        pick = heapq.nlargest if desc else heapq.nsmallest
+        # percent of one core, as top shows it; 0 until a second scan gives a delta
+        cpu_k = 100.0 / self._hz / self.dt if self.dt else 0.0
+        mem_k = 100.0 / self._mem_total if self._mem_total else 0.0
+        items = [{
+            "pid": r[PID], "name": r[NAME], "user": r[USER], "cpu": round(r[CPU] * cpu_k, 1),
+            "rss_mb": round(r[RSS] / 1048576, 1), "mem": round(r[RSS] * mem_k, 2), "gpu_mem_mb": r[GPU_MEM],
+            "gpus": r[GPUS], "threads": r[THREADS], "status": _state(r[STATUS]),
+            "started": r[STARTED], "cmd": r[CMD],
+        } for r in pick(limit, rows, key=itemgetter(col))]
+        return {"ts": self.ts, "total": total, "matched": len(rows), "scan_ms": self.last_scan_ms, "items": items}
+
+    def export(self) -> Dict[str, Any]:
+        # the public columns of every row plus what top() needs to turn them into percentages
+        with self._lock:
+            rows = [r[:_TICKS] for r in self._rows.values()]
+        for r in rows:
+            r[STATUS] = _state(r[STATUS])
+        return {"ts": self.ts, "dt": self.dt, "hz": self._hz, "mem_total": self._mem_total,
+                "scan_ms": self.last_scan_ms, "rows": rows}
+
+
+# Worker side of production mode: the collector scans and publishes export()
+# with its ticks while someone is looking at processes; workers answer top()
+# from the latest copy and never walk /proc or open NVML themselves.
+class SharedProcessTable(ProcessTable):
+    def refresh(self):
+        pass
+
+    def load(self, data: Dict[str, Any]):
+        rows = {r[PID]: r for r in data["rows"]}
+        with self._lock:
+            self._rows = rows
+            self.ts, self.dt, self._hz = data["ts"], data["dt"], data["hz"]
+            self._mem_total, self.last_scan_ms = data["mem_total"], data["scan_ms"]
+        self.scans += 1
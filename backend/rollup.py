@@ -0,0 +1,168 @@
+import math
+import time
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import db as dbm
+
+# (bucket seconds, retention seconds)
+DEFAULT_TIERS: Tuple[Tuple[int, int], ...] = (
+    (60, 30 * 86400),
+    (3600, 400 * 86400),
+)
+AGGS = ("min", "avg", "max", "last")
+# closed buckets held while the db refuses writes; the oldest are dropped past this
+MAX_PENDING = 200000
+
+
+# Folds every sample into 1-minute / 1-hour min/avg/max/last buckets and writes
+# closed buckets to metric_rollups in batches, one transaction per flush. A
+# failed write keeps the rows for the next flush. The bucket still open is
+# not in the db yet; query() fills it from the raw ring when given one.
+class Rollup:
+    def __init__(self, tiers: Iterable[Tuple[int, int]] = DEFAULT_TIERS, prune_interval: float = 3600):
+        self.tiers = tuple(sorted(tiers))
+        self.prune_interval = prune_interval
+        self.known: Dict[int, set] = {t: set() for t, _ in self.tiers}
+        self.written = 0
+        self.write_errors = 0
+        self.dropped = 0
+        # tier -> series -> [bucket_ts, min, sum, max, last, n]
+        self._open: Dict[int, Dict[str, list]] = {t: {} for t, _ in self.tiers}
+        self._pending: List[tuple] = []
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        for tier, _ in self.tiers:
+            self.known[tier].update(dbm.rollup_series(tier))
+
+    def add(self, ts: float, values: Dict[str, Optional[float]]):
+        with self._lock:
+            for tier, _ in self.tiers:
+                bucket = int(ts) - int(ts) % tier
+                acc = self._open[tier]
+                for name, v in values.items():
+                    if v is None:
+                        continue
+                    a = acc.get(name)
+                    if a is not None and a[0] != bucket:
+                        self._close(tier, name, a)
+                        a = None
+                    if a is None:
+                        acc[name] = [bucket, v, v, v, v, 1]
+                        continue
+                    if v < a[1]:
+                        a[1] = v
+                    if v > a[3]:
+                        a[3] = v
+                    a[2] += v
+                    a[4] = v
+                    a[5] += 1
+
+    def _close(self, tier: int, name: str, a: list):
+        self._pending.append((tier, name, a[0], a[1], round(a[2] / a[5], 4), a[3], a[4], a[5]))
+        self.known[tier].add(name)
+
+    def flush(self, final: bool = False):
+        with self._lock:
+            if final:
+                for tier, acc in self._open.items():
+                    for name, a in acc.items():
+                        self._close(tier, name, a)
+                    acc.clear()
+            rows, self._pending = self._pending, []
+        if rows:
+            try:
+                dbm.rollup_insert_many(rows)
+            except Exception:
+                self.write_errors += 1
+                with self._lock:
+                    # back in front of what closed meanwhile, oldest first
+                    self._pending[:0] = rows
+                    over = len(self._pending) - MAX_PENDING
+                    if over > 0:
+                        del self._pending[:over]
+                        self.dropped += over
+                raise
+            self.written += len(rows)
+        now = time.time()
+        if now - self._pruned_at >= self.prune_interval:
+            self._pruned_at = now
+            for tier, keep in self.tiers:
+                dbm.rollup_prune(tier, int(now - keep))
+
+    def tier_for(self, step: float) -> Optional[int]:
+        # coarsest tier whose bucket still fits inside the requested step
+        best = None
+        for tier, _ in self.tiers:
+            if tier <= step:
+                best = tier
+        return best
+
+    def _open_rows(self, tier: int, names: List[str], start: float, end: float, store, prefix: str):
+        # the open bucket from raw samples, one row per sample: (series, ts, n=1, value for every agg)
+        now = time.time()
+        since = max(start, int(now) - int(now) % tier)
+        if store is None or end <= since:
+            return []
+        have = set(store.names())
+        local = {n: n[len(prefix):] for n in names if n.startswith(prefix) and n[len(prefix):] in have}
+        ts, cols = store._window(list(local.values()), since, end)
+        rows = []
+        for name, short in local.items():
+            col = cols[short]
+            for i, v in enumerate(col):
+                if v == v:
+                    rows.append({"series": name, "ts": ts[i], "n": 1, "min": v, "avg": v, "max": v, "last": v})
+        return rows
+
+    def query(self, tier: int, names: List[str], start: float, end: float, step: float,
+              agg: str = "avg", store=None, prefix: str = "") -> Dict[str, Any]:
+        # store: the ring holding these series (names without `prefix`), for the open bucket
+        nb = max(1, int(math.ceil((end - start) / step)))
+        rows = dbm.rollup_query(tier, names, int(start) - int(start) % tier, int(end))
+        rows += self._open_rows(tier, names, start, end, store, prefix)
+        acc: Dict[str, list] = {n: [None] * nb for n in names}
+        wts: Dict[str, list] = {n: [0] * nb for n in names}
+        for r in rows:
+            b = int((max(r["ts"], start) - start) // step)
+            if b >= nb:
+                continue
+            cur, out = acc[r["series"]][b], acc[r["series"]]
+            v = r[agg]
+            if agg == "avg":
+                # weight by sample count so partial buckets do not skew the mean
+                w = wts[r["series"]]
+                out[b] = v * r["n"] if cur is None else cur + v * r["n"]
+                w[b] += r["n"]
+            elif cur is None or agg == "last":
+                out[b] = v
+            elif agg == "min":
+                out[b] = min(cur, v)
+            elif agg == "max":
+                out[b] = max(cur, v)
+        if agg == "avg":
+            for n in names:
+                out, w = acc[n], wts[n]
+                acc[n] = [round(out[i] / w[i], 3) if w[i] else None for i in range(nb)]
+        return {"from": start, "to": end, "step": step, "tier": tier, "agg": agg,
+                "ts": [start + i * step for i in range(nb)], "series": acc}
+
+    def summary(self, tier: int, names: List[str], start: float, end: float) -> Dict[str, Dict[str, Any]]:
+        # whole-range min/avg/max/last per series, e.g. for monthly capacity reports
+        out: Dict[str, Dict[str, Any]] = {}
+        for r in dbm.rollup_query(tier, names, int(start), int(end)):
+            s = out.get(r["series"])
+            if s is None:
+                out[r["series"]] = {"min": r["min"], "max": r["max"], "last": r["last"],
+                                    "sum": r["avg"] * r["n"], "n": r["n"]}
+                continue
+            s["min"] = min(s["min"], r["min"])
+            s["max"] = max(s["max"], r["max"])
+            s["last"] = r["last"]
+            s["sum"] += r["avg"] * r["n"]
+            s["n"] += r["n"]
+        for s in out.values():
+            s["avg"] = round(s.pop("sum") / s["n"], 3) if s["n"] else None
+        return out
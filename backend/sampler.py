@@ -0,0 +1,140 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+
+# Per-client mailbox; when the client falls behind the oldest frame is dropped
+# and counted, so memory per subscriber stays bounded.
+class Subscription:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    def offer(self, item: Tuple[int, Dict[str, Any]]):
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(item)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Tuple[int, Dict[str, Any]]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+# One collection per tick, fanned out to every subscriber through a bounded queue.
+# The last `replay` frames are kept with their sequence ids for Last-Event-ID resume.
+# Ticks run on the sampler's own thread: psutil keeps the cpu_percent baseline
+# per thread, so on a shared pool a tick would measure since whenever that
+# thread last sampled (or report 0.0 on a fresh one).
+class Sampler:
+    def __init__(self, collect: Callable[[], Dict[str, Any]], interval: float = 2.0, queue_size: int = 4,
+                 replay: int = 30):
+        self.collect = collect
+        self.interval = interval
+        self.queue_size = queue_size
+        self.latest: Optional[Dict[str, Any]] = None
+        self.seq = 0
+        self.ticks = 0
+        self.recent: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=replay)
+        # called on the event loop with (seq, frame) after every tick
+        self.listeners: List[Callable[[int, Dict[str, Any]], None]] = []
+        self._subs: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def subscribe(self, last_id: Optional[int] = None) -> Subscription:
+        sub = Subscription(self.queue_size)
+        if last_id is not None and self.recent and self.recent[0][0] <= last_id + 1:
+            # resume: replay what the client missed (bounded by the queue size)
+            for item in self.recent:
+                if item[0] > last_id:
+                    sub.offer(item)
+        elif self.recent:
+            sub.offer(self.recent[-1])
+        self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        self._subs.discard(sub)
+
+    def publish(self, frame: Dict[str, Any], seq: Optional[int] = None):
+        # seq is given when frames come from another process (production-mode workers)
+        self.seq = self.seq + 1 if seq is None else seq
+        item = (self.seq, frame)
+        self.latest = frame
+        self.recent.append(item)
+        for sub in self._subs:
+            sub.offer(item)
+        for fn in self.listeners:
+            try:
+                fn(self.seq, frame)
+            except Exception:
+                pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            try:
+                # collectors may block (psutil, nvidia-smi), keep them off the event loop
+                frame = await loop.run_in_executor(self._executor, self.collect)
+                frame.setdefault("ts", time.time())
+                self.ticks += 1
+                self.publish(frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            next_tick += self.interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # fell behind, resync instead of bursting
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sampler")
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+# Turns monotonically increasing counters into per-second rates; keyed so one
+# tracker can serve every NIC and disk.
+class RateTracker:
+    def __init__(self):
+        self._prev: Dict[Any, tuple] = {}
+
+    def rate(self, key: Any, value: float, now: float) -> float:
+        prev = self._prev.get(key)
+        self._prev[key] = (value, now)
+        if prev is None:
+            return 0.0
+        dt = max(0.001, now - prev[1])
+        return max(0.0, (value - prev[0]) / dt)
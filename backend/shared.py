@@ -0,0 +1,383 @@
+import os
+import json
+import mmap
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+from . import db as dbm
+from .tsdb import MetricStore, NAN
+
+MAGIC = b"ONEBOX01"
+HEADER = 4096
+NAME_BYTES = 64
+# header slots (uint64 unless noted)
+SEQ, CAPACITY, MAX_SERIES, COUNT, NSERIES, SNAP_LEN, SNAP_GEN, INTERVAL, PID, SIG_ALERTS, SIG_INVENTORY, \
+    SIG_SESSIONS, SIG_PROCS = range(1, 14)
+SIGNALS = (SIG_ALERTS, SIG_INVENTORY, SIG_SESSIONS, SIG_PROCS)
+
+
+def default_path() -> str:
+    # tmpfs when available: the segment is rewritten every tick and never needs to hit a disk
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm/onebox-state"
+    return os.path.join(dbm.DATA_DIR, "shared.state")
+
+
+class NotReady(RuntimeError):
+    pass
+
+
+# MetricStore whose ring lives in the shared segment. The collector appends,
+# workers query; both go through the segment's seqlock, so a reader copying a
+# window while a tick is written simply retries. Column i belongs to the i-th
+# name in the name table; series are only ever added, never moved.
+class SharedStore(MetricStore):
+    def __init__(self, state: "SharedState"):
+        self.state = state
+        self.capacity = 0
+        self.dropped_series = 0
+        self._series: Dict[str, memoryview] = {}
+        self._ts = None
+        self._lock = _NoLock()
+
+    @property
+    def count(self) -> int:
+        return self.state.hdr[COUNT]
+
+    @count.setter
+    def count(self, n: int):
+        self.state.hdr[COUNT] = n
+
+    def _attach(self):
+        self.capacity = self.state.hdr[CAPACITY]
+        self._ts = self.state.ts
+        self._series = {}
+
+    def _sync(self):
+        # pick up series the collector added since the last call
+        st = self.state
+        n = st.hdr[NSERIES]
+        for i in range(len(self._series), n):
+            self._series[st.name(i)] = st.column(i)
+
+    def names(self) -> List[str]:
+        self._sync()
+        return sorted(self._series)
+
+    def append(self, ts: float, values: Dict[str, Optional[float]]):
+        st = self.state
+        with st.writing():
+            slot = self.count % self.capacity
+            self._ts[slot] = ts
+            for name, arr in self._series.items():
+                if name not in values:
+                    arr[slot] = NAN
+            for name, v in values.items():
+                arr = self._series.get(name)
+                if arr is None:
+                    arr = st.add_series(name)
+                    if arr is None:
+                        self.dropped_series += 1
+                        continue
+                    self._series[name] = arr
+                arr[slot] = NAN if v is None else float(v)
+            self.count += 1
+
+    def _window(self, names: List[str], start: float, end: float):
+        self._sync()
+        names = [n for n in names if n in self._series]
+        return self.state.read(lambda: MetricStore._window(self, names, start, end))
+
+    def latest(self, name: str) -> Optional[float]:
+        self._sync()
+        return self.state.read(lambda: MetricStore.latest(self, name))
+
+    def oldest(self) -> Optional[float]:
+        return self.state.read(lambda: MetricStore.oldest(self))
+
+
+class _NoLock:
+    # in-process lock is not needed: the seqlock in the segment orders writers and readers
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# One mmap'd file shared by the collector process (single writer) and every
+# uvicorn worker (readers). Layout: a 4 KB header of uint64 slots, the series
+# name table, the timestamp ring, one float32 column per series, then the
+# latest tick as JSON. Unused columns are never touched, so on tmpfs only the
+# pages of series that exist take memory.
+#
+# Consistency is a seqlock: the writer makes SEQ odd, writes, makes it even;
+# a reader copies and retries if SEQ moved or was odd. Workers write only the
+# signal slots: SIG_ALERTS asks the collector to reload rules and recount
+# alerts, SIG_INVENTORY to collect and publish the hardware inventory again
+# and SIG_PROCS to publish its process table for a while; SIG_SESSIONS tells
+# every worker to drop its cached sessions after a user was changed.
+class SharedState:
+    def __init__(self, path: str, capacity: int = 43200, max_series: int = 1024,
+                 snapshot_bytes: int = 8 * 1024 * 1024):
+        self.path = path
+        self.capacity = capacity
+        self.max_series = max_series
+        self.snapshot_bytes = snapshot_bytes
+        self.oversize = 0
+        self.retries = 0
+        self.store = SharedStore(self)
+        self.hdr = None
+        self.ts = None
+        self._mm: Optional[mmap.mmap] = None
+        self._mv: Optional[memoryview] = None
+        self._ino = 0
+        self._signals: Dict[int, int] = {}
+
+    # ---- layout ----
+    def _offsets(self, capacity: int, max_series: int):
+        names = HEADER
+        ts = names + max_series * NAME_BYTES
+        cols = ts + 8 * capacity
+        snap = cols + 4 * capacity * max_series
+        return names, ts, cols, snap
+
+    def _map(self, fd: int, size: int):
+        self._mm = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self._mv = memoryview(self._mm)
+        self.hdr = self._mv[:HEADER].cast('Q')
+        self._dbl = self._mv[:HEADER].cast('d')
+        capacity, max_series = self.hdr[CAPACITY], self.hdr[MAX_SERIES]
+        self._names_off, ts_off, self._cols_off, self._snap_off = self._offsets(capacity, max_series)
+        self.capacity, self.max_series = capacity, max_series
+        self.snapshot_bytes = size - self._snap_off
+        self.ts = self._mv[ts_off:self._cols_off].cast('d')
+        self.store._attach()
+
+    def create(self, interval: float):
+        # build under a temporary name, then rename: workers never see a half-initialised file
+        names, ts, cols, snap = self._offsets(self.capacity, self.max_series)
+        size = snap + self.snapshot_bytes
+        tmp = "%s.%d" % (self.path, os.getpid())
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            mm = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            hdr = memoryview(mm)[:HEADER].cast('Q')
+            hdr[CAPACITY], hdr[MAX_SERIES] = self.capacity, self.max_series
+            hdr[PID] = os.getpid()
+            hdr.release()
+            dbl = memoryview(mm)[:HEADER].cast('d')
+            dbl[INTERVAL] = interval
+            dbl.release()
+            mm[:len(MAGIC)] = MAGIC
+            mm.close()
+            self._map(fd, size)
+            self._ino = os.fstat(fd).st_ino
+            self._signals = {slot: 0 for slot in SIGNALS}
+        finally:
+            os.close(fd)
+        os.replace(tmp, self.path)
+
+    def open(self, timeout: float = 30.0):
+        # workers: wait for the collector to publish the segment
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_RDWR)
+            except FileNotFoundError:
+                fd = None
+            if fd is not None:
+                try:
+                    st = os.fstat(fd)
+                    if st.st_size > HEADER:
+                        self.close()
+                        self._map(fd, st.st_size)
+                        if self._mm[:len(MAGIC)] == MAGIC:
+                            self._ino = st.st_ino
+                            self._signals = {slot: self.hdr[slot] for slot in SIGNALS}
+                            return
+                finally:
+                    os.close(fd)
+            if time.monotonic() >= deadline:
+                raise NotReady("collector has not created %s" % self.path)
+            time.sleep(0.2)
+
+    def replaced(self) -> bool:
+        # a restarted collector renames a fresh segment into place
+        try:
+            return os.stat(self.path).st_ino != self._ino
+        except OSError:
+            return False
+
+    def close(self):
+        if self._mm is None:
+            return
+        self.store._series = {}
+        self.store._ts = None
+        self.ts = self.hdr = self._dbl = self._mv = None
+        mm, self._mm = self._mm, None
+        try:
+            mm.close()
+        except BufferError:
+            # a request still holds a column view; unmapped when it is collected
+            pass
+
+    def unlink(self):
+        try:
+            if not self.replaced():
+                os.unlink(self.path)
+        except OSError:
+            pass
+
+    @property
+    def interval(self) -> float:
+        return self._dbl[INTERVAL]
+
+    # ---- seqlock ----
+    def writing(self):
+        return _Write(self.hdr)
+
+    def read(self, fn: Callable[[], Any]) -> Any:
+        hdr = self.hdr
+        while True:
+            s = hdr[SEQ]
+            if not s & 1:
+                out = fn()
+                if hdr[SEQ] == s:
+                    return out
+            self.retries += 1
+            time.sleep(0)
+
+    # ---- series table ----
+    def name(self, i: int) -> str:
+        off = self._names_off + i * NAME_BYTES
+        return bytes(self._mm[off:off + NAME_BYTES]).rstrip(b"\0").decode()
+
+    def column(self, i: int) -> memoryview:
+        off = self._cols_off + 4 * self.capacity * i
+        return self._mv[off:off + 4 * self.capacity].cast('f')
+
+    def add_series(self, name: str) -> Optional[memoryview]:
+        # writer only, inside writing()
+        i = self.hdr[NSERIES]
+        raw = name.encode()
+        if i >= self.max_series or len(raw) > NAME_BYTES:
+            return None
+        col = self.column(i)
+        col[:] = _nan_block(self.capacity)
+        off = self._names_off + i * NAME_BYTES
+        self._mm[off:off + NAME_BYTES] = raw.ljust(NAME_BYTES, b"\0")
+        self.hdr[NSERIES] = i + 1
+        return col
+
+    # ---- latest tick ----
+    def publish(self, seq: int, frame: Dict[str, Any]):
+        # Sampler listener in the collector; frame carries everything workers serve
+        body = json.dumps({"seq": seq, "frame": frame}, separators=(',', ':'), ensure_ascii=False).encode()
+        if len(body) > self.snapshot_bytes:
+            self.oversize += 1
+            return
+        with self.writing():
+            self._mm[self._snap_off:self._snap_off + len(body)] = body
+            self.hdr[SNAP_LEN] = len(body)
+            self.hdr[SNAP_GEN] += 1
+
+    def generation(self) -> int:
+        return self.hdr[SNAP_GEN]
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        def copy():
+            n = self.hdr[SNAP_LEN]
+            return bytes(self._mm[self._snap_off:self._snap_off + n])
+        body = self.read(copy)
+        return json.loads(body) if body else None
+
+    # ---- worker -> collector signals ----
+    def signal(self, slot: int):
+        # the sender has already acted on it; only other processes see it as new
+        self.hdr[slot] = self._signals[slot] = time.time_ns()
+
+    def signalled(self, slot: int) -> bool:
+        v = self.hdr[slot]
+        if self._signals.get(slot) != v:
+            self._signals[slot] = v
+            return True
+        return False
+
+
+class _Write:
+    __slots__ = ("hdr",)
+
+    def __init__(self, hdr):
+        self.hdr = hdr
+
+    def __enter__(self):
+        self.hdr[SEQ] += 1
+
+    def __exit__(self, *exc):
+        self.hdr[SEQ] += 1
+        return False
+
+
+_NAN_CACHE: Dict[int, bytes] = {}
+
+
+def _nan_block(n: int) -> memoryview:
+    b = _NAN_CACHE.get(n)
+    if b is None:
+        from array import array
+        b = _NAN_CACHE[n] = array('f', [NAN]) * n
+    return memoryview(b)
+
+
+# Worker side: polls the segment's generation counter and hands every new tick
+# to `on_frame(seq, frame)` on the event loop. If the collector is restarted
+# the new segment is picked up once the old one has gone quiet.
+class Follower:
+    def __init__(self, state: SharedState, on_frame: Callable[[int, Dict[str, Any]], None], poll: float = 0.1):
+        self.state = state
+        self.on_frame = on_frame
+        self.poll = poll
+        self.frames = 0
+        self.last_frame = 0.0
+        self._gen = -1
+        self._task: Optional[asyncio.Task] = None
+
+    def age(self) -> Optional[float]:
+        return time.time() - self.last_frame if self.last_frame else None
+
+    async def _run(self):
+        while True:
+            try:
+                gen = self.state.generation()
+                if gen != self._gen:
+                    self._gen = gen
+                    snap = self.state.snapshot()
+                    if snap is not None:
+                        self.frames += 1
+                        self.last_frame = time.time()
+                        self.on_frame(snap["seq"], snap["frame"])
+                elif time.time() - self.last_frame > 5 * max(1.0, self.state.interval) and self.state.replaced():
+                    # open() polls until the new segment is valid; keep that off the event loop
+                    await asyncio.get_running_loop().run_in_executor(None, self.state.open)
+                    self._gen = -1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            await asyncio.sleep(self.poll)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
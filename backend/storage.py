@@ -0,0 +1,128 @@
+import os
+import time
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+
+from .sampler import RateTracker
+
+SYS_BLOCK = "/sys/class/block"
+# virtual/stacked devices whose IO is also counted on the disks beneath them
+STACKED = ("loop", "dm-", "md", "ram", "zram", "nbd")
+
+
+def whole_disk(name: str, sys_block: str = SYS_BLOCK) -> bool:
+    # partitions have a `partition` attribute in sysfs; their IO is already in the parent disk
+    if name.startswith(STACKED):
+        return False
+    return not os.path.exists(os.path.join(sys_block, name, "partition"))
+
+
+# Mount usage is probed in parallel with a per-request deadline. A mount whose
+# statvfs does not return in time (hung NFS/Lustre) is reported as stale; its
+# probe thread is left to finish on its own and is reused rather than stacked
+# by later requests. Results are cached for `ttl` seconds.
+class StorageMonitor:
+    def __init__(self, probe_timeout: float = 1.0, ttl: float = 10.0):
+        self.probe_timeout = probe_timeout
+        self.ttl = ttl
+        self.stale_total = 0
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+        self._cache: Tuple[float, List[Dict[str, Any]]] = (0.0, [])
+        self._io: Dict[str, Dict[str, float]] = {}
+        self._rates = RateTracker()
+        # device name -> counted in disk.read/disk.write totals
+        self._whole: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    # ---- mount usage ----
+    def _run_probe(self, mountpoint: str, slot: Dict[str, Any]):
+        try:
+            slot["usage"] = psutil.disk_usage(mountpoint)
+        except Exception as e:
+            slot["error"] = e
+        finally:
+            slot["done"].set()
+            with self._lock:
+                if self._inflight.get(mountpoint) is slot:
+                    del self._inflight[mountpoint]
+
+    def _probe(self, mountpoint: str) -> Dict[str, Any]:
+        with self._lock:
+            slot = self._inflight.get(mountpoint)
+            if slot is not None:
+                return slot
+            slot = self._inflight[mountpoint] = {"done": threading.Event(), "started": time.time()}
+        # daemon thread: a hung mount must never block interpreter shutdown
+        threading.Thread(target=self._run_probe, args=(mountpoint, slot), daemon=True,
+                         name="statvfs:" + mountpoint).start()
+        return slot
+
+    def disks(self) -> List[Dict[str, Any]]:
+        ts, rows = self._cache
+        if time.time() - ts < self.ttl:
+            return rows
+        parts = psutil.disk_partitions(all=False)
+        slots = [(p, self._probe(p.mountpoint)) for p in parts]
+        deadline = time.monotonic() + self.probe_timeout
+        for _, slot in slots:
+            slot["done"].wait(max(0.0, deadline - time.monotonic()))
+        rows = []
+        for p, slot in slots:
+            row = {
+                'device': p.device,
+                'mountpoint': p.mountpoint,
+                'fstype': p.fstype,
+                'total_gb': None,
+                'used_gb': None,
+                'percent': None,
+                'stale': False,
+            }
+            u = slot.get("usage")
+            if not slot["done"].is_set():
+                row['stale'] = True
+                self.stale_total += 1
+            elif u is not None:
+                row.update({
+                    'total_gb': round(u.total/1024/1024/1024, 2),
+                    'used_gb': round(u.used/1024/1024/1024, 2),
+                    'percent': u.percent,
+                })
+            io = self._io.get(os.path.basename(p.device))
+            row['read_mbps'] = io['read'] if io else None
+            row['write_mbps'] = io['write'] if io else None
+            rows.append(row)
+        self._cache = (time.time(), rows)
+        return rows
+
+    def hung(self) -> List[str]:
+        with self._lock:
+            return sorted(self._inflight)
+
+    # ---- per-disk IO, driven by the sampler tick ----
+    def sample_io(self, now: Optional[float] = None) -> Dict[str, float]:
+        # every device gets its own series; the disk.read/disk.write totals count whole disks only
+        now = now or time.time()
+        series: Dict[str, float] = {}
+        io_rates: Dict[str, Dict[str, float]] = {}
+        read_total = write_total = 0.0
+        for name, io in (psutil.disk_io_counters(perdisk=True) or {}).items():
+            r = self._rates.rate((name, "read"), io.read_bytes, now) / 1024 / 1024
+            w = self._rates.rate((name, "write"), io.write_bytes, now) / 1024 / 1024
+            io_rates[name] = {'read': round(r, 3), 'write': round(w, 3)}
+            series["disk.%s.read" % name] = round(r, 3)
+            series["disk.%s.write" % name] = round(w, 3)
+            whole = self._whole.get(name)
+            if whole is None:
+                whole = self._whole[name] = whole_disk(name)
+            if whole:
+                read_total += r
+                write_total += w
+        series["disk.read"] = round(read_total, 3)
+        series["disk.write"] = round(write_total, 3)
+        self._io = io_rates
+        return series
+
+    def io_rates(self) -> Dict[str, Dict[str, float]]:
+        return self._io
@@ -0,0 +1,144 @@
+import math
+import threading
+import fnmatch
+from bisect import bisect_left
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+NAN = float('nan')
+
+
+def _copy(dst: array, src, x: int, y: int):
+    # raw memcpy of src[x:y]; src may be an array or a typed memoryview over shared memory
+    dst.frombytes(memoryview(src)[x:y].cast('B'))
+
+
+def match_names(names: Iterable[str], patterns: Iterable[str]) -> List[str]:
+    # exact names or shell-style globs ("gpu.*.util"), first match order, no duplicates
+    names = sorted(set(names))
+    known = set(names)
+    out: List[str] = []
+    for p in patterns:
+        p = p.strip()
+        if not p:
+            continue
+        if any(c in p for c in '*?['):
+            out.extend(n for n in fnmatch.filter(names, p) if n not in out)
+        elif p in known and p not in out:
+            out.append(p)
+    return out
+
+
+# Fixed-size history for every sampled series. All series share one timestamp
+# ring (the sampler writes them in the same tick), values are float32 arrays
+# aligned to it, so memory is capacity * (8 + 4 * series) bytes, never more.
+class MetricStore:
+    def __init__(self, capacity: int = 43200):
+        self.capacity = capacity
+        self.count = 0  # total appends; slot of append n is n % capacity
+        self._ts = array('d', bytes(8 * capacity))
+        self._series: Dict[str, array] = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        return sorted(self._series)
+
+    def _new_series(self) -> array:
+        return array('f', [NAN]) * self.capacity
+
+    def append(self, ts: float, values: Dict[str, float]):
+        with self._lock:
+            slot = self.count % self.capacity
+            self._ts[slot] = ts
+            for name, arr in self._series.items():
+                if name not in values:
+                    arr[slot] = NAN
+            for name, v in values.items():
+                arr = self._series.get(name)
+                if arr is None:
+                    arr = self._series[name] = self._new_series()
+                arr[slot] = NAN if v is None else v
+            self.count += 1
+
+    def match(self, patterns: Iterable[str]) -> List[str]:
+        return match_names(self.names(), patterns)
+
+    # first logical index (0 = oldest retained point) with ts >= t
+    def _lower(self, t: float, n: int, first: int) -> int:
+        lo, hi = 0, n
+        ts, cap = self._ts, self.capacity
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ts[(first + mid) % cap] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _window(self, names: List[str], start: float, end: float):
+        # copy the matching window out under the lock (C-level slice copies only)
+        with self._lock:
+            n = min(self.count, self.capacity)
+            first = (self.count - n) % self.capacity
+            i0, i1 = self._lower(start, n, first), self._lower(end, n, first)
+            cap = self.capacity
+            a, b = (first + i0) % cap, (first + i1) % cap
+            if i1 <= i0:
+                segs = []
+            elif a < b:
+                segs = [(a, b)]
+            else:
+                segs = [(a, cap), (0, b)]
+            ts = array('d')
+            for x, y in segs:
+                _copy(ts, self._ts, x, y)
+            cols = {}
+            for name in names:
+                col = array('f')
+                for x, y in segs:
+                    _copy(col, self._series[name], x, y)
+                cols[name] = col
+        return ts, cols
+
+    def query(self, names: List[str], start: float, end: float, step: float) -> Dict[str, Any]:
+        ts, cols = self._window(names, start, end)
+        data: Dict[str, List[Optional[float]]] = {}
+        if step <= 0:
+            # raw points
+            for name, col in cols.items():
+                data[name] = [None if v != v else round(v, 3) for v in col]
+            return {"from": start, "to": end, "step": 0, "ts": ts.tolist(), "series": data}
+        nb = max(1, int(math.ceil((end - start) / step)))
+        # bucket boundaries are computed once and shared by every series
+        edges = [bisect_left(ts, start + i * step) for i in range(nb)] + [len(ts)]
+        for name, col in cols.items():
+            out: List[Optional[float]] = []
+            for i in range(nb):
+                x, y = edges[i], edges[i + 1]
+                if x == y:
+                    out.append(None)
+                    continue
+                chunk = col[x:y]
+                total = sum(chunk)
+                if total != total:
+                    chunk = [v for v in chunk if v == v]
+                    total = sum(chunk)
+                out.append(round(total / len(chunk), 3) if chunk else None)
+            data[name] = out
+        return {"from": start, "to": end, "step": step,
+                "ts": [start + i * step for i in range(nb)], "series": data}
+
+    def latest(self, name: str) -> Optional[float]:
+        with self._lock:
+            arr = self._series.get(name)
+            if arr is None or not self.count:
+                return None
+            v = arr[(self.count - 1) % self.capacity]
+            return None if v != v else v
+
+    def oldest(self) -> Optional[float]:
+        # timestamp of the oldest retained point
+        with self._lock:
+            if not self.count:
+                return None
+            return self._ts[(self.count - min(self.count, self.capacity)) % self.capacity]
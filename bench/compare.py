@@ -0,0 +1,47 @@
+# Compare two benchmark reports: python -m bench.compare base.json new.json [--threshold 10]
+# Exits 1 when any p99 latency, loop lag or CPU/request regresses by more than the threshold.
+import sys
+import json
+import argparse
+
+
+def _pct(a, b):
+    if not a:
+        return None
+    return (b - a) / a * 100
+
+
+def rows(base: dict, new: dict):
+    for kind in sorted(set(base["client"]["latency"]) | set(new["client"]["latency"])):
+        a = base["client"]["latency"].get(kind, {}).get("p99_ms")
+        b = new["client"]["latency"].get(kind, {}).get("p99_ms")
+        yield "p99 " + kind, a, b
+    yield "loop lag p99", base["server"]["loop_lag"].get("p99_ms"), new["server"]["loop_lag"].get("p99_ms")
+    yield "cpu ms/request", base["server"]["cpu_ms_per_request"], new["server"]["cpu_ms_per_request"]
+    yield "rss growth MB", base["server"]["rss_growth_mb"], new["server"]["rss_growth_mb"]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench.compare")
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = ap.parse_args(argv)
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print("%s (%s)  ->  %s (%s)" % (base["commit"], base["scenario"], new["commit"], new["scenario"]))
+    worse = 0
+    for name, a, b in rows(base, new):
+        d = _pct(a, b) if a is not None and b is not None else None
+        flag = ""
+        if d is not None and d > args.threshold and name != "rss growth MB":
+            flag = "  REGRESSION"
+            worse += 1
+        print("%-44s %10s %10s %8s%s" % (name, a, b, "%+.1f%%" % d if d is not None else "-", flag))
+    return 1 if worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# Minimal nvidia-smi stand-in for the benchmark: understands --loop-ms and prints
+# the --query-gpu columns the app asks for, FAKE_GPUS devices per loop; without
+# --loop-ms it prints once, like the real tool. `topo -m` prints a fixed matrix.
+import os
+import sys
+import math
+import time
+
+n = int(os.environ.get("FAKE_GPUS", "8"))
+ms = 0
+query = "index,name,utilization.gpu,temperature.gpu,power.draw,memory.used,memory.total"
+for a in sys.argv[1:]:
+    if a.startswith("--loop-ms="):
+        ms = int(a.split("=", 1)[1])
+    elif a.startswith("--query-gpu="):
+        query = a.split("=", 1)[1]
+
+if sys.argv[1:2] == ["topo"]:
+    names = ["GPU%d" % i for i in range(n)]
+    print("\t" + "\t".join(names))
+    for i in range(n):
+        print(names[i] + "\t" + "\t".join("X" if i == j else "NV4" if i // 2 == j // 2 else "SYS" for j in range(n)))
+    sys.exit(0)
+
+
+def column(c: str, i: int, x: float) -> str:
+    return {
+        "index": str(i), "name": "NVIDIA H100 80GB HBM3", "utilization.gpu": "%d" % (x * 100),
+        "temperature.gpu": "%d" % (40 + 40 * x), "power.draw": "%.2f" % (100 + 600 * x),
+        "memory.used": "%d" % (x * 81559), "memory.total": "81559",
+        "uuid": "GPU-00000000-0000-0000-0000-%012d" % i, "pci.bus_id": "00000000:%02X:00.0" % (0x18 + i * 0x10),
+        "vbios_version": "96.00.99.00.01", "driver_version": "550.54.15",
+    }.get(c, "[N/A]")
+
+
+cols = query.split(",")
+t0 = time.time()
+while True:
+    out = []
+    for i in range(n):
+        x = 0.5 + 0.5 * math.sin((time.time() - t0) / 20 + i)
+        out.append(", ".join(column(c, i, x) for c in cols))
+    sys.stdout.write("\n".join(out) + "\n")
+    sys.stdout.flush()
+    if ms <= 0:
+        break
+    time.sleep(ms / 1000)
@@ -0,0 +1,192 @@
+import math
+import os
+import sys
+import time
+import random
+import socket
+from collections import namedtuple
+from types import SimpleNamespace
+from typing import Dict
+
+import psutil
+
+svmem = namedtuple("svmem", "total available percent used free")
+snetio = namedtuple("snetio", "bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout")
+snicstats = namedtuple("snicstats", "isup duplex speed mtu flags")
+snicaddr = namedtuple("snicaddr", "family address netmask broadcast ptp")
+sdiskio = namedtuple("sdiskio", "read_count write_count read_bytes write_bytes read_time write_time")
+sdiskpart = namedtuple("sdiskpart", "device mountpoint fstype opts maxfile maxpath")
+sdiskusage = namedtuple("sdiskusage", "total used free percent")
+
+FAKE_SMI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_smi.py")
+
+
+# Deterministic synthetic host: counters grow with wall time at fixed rates plus
+# a slow sine, so rate code paths see realistic, monotonically increasing values.
+class FakeHost:
+    def __init__(self, nics: int = 4, disks: int = 8, cpus: int = 64, seed: int = 1):
+        self.t0 = time.time()
+        self.cpus = cpus
+        rnd = random.Random(seed)
+        self.nics = ["eth%d" % i for i in range(nics // 2)] + ["ib%d" % i for i in range(nics - nics // 2)]
+        self.disks = ["nvme%dn1" % i for i in range(disks)]
+        self._rate = {n: rnd.uniform(1e6, 5e8) for n in self.nics + self.disks}
+
+    def _wave(self, period: float, lo: float, hi: float) -> float:
+        t = time.time() - self.t0
+        return lo + (hi - lo) * (0.5 + 0.5 * math.sin(2 * math.pi * t / period))
+
+    def _counter(self, name: str, k: float = 1.0) -> int:
+        return int((time.time() - self.t0) * self._rate[name] * k)
+
+    def cpu_percent(self, interval=None, percpu=False):
+        v = round(self._wave(60, 10, 90), 1)
+        return [v] * self.cpus if percpu else v
+
+    def cpu_count(self, logical=True):
+        return self.cpus if logical else self.cpus // 2
+
+    def virtual_memory(self):
+        total = 1024 ** 4
+        pct = round(self._wave(300, 30, 70), 1)
+        used = int(total * pct / 100)
+        return svmem(total, total - used, pct, used, total - used)
+
+    def net_io_counters(self, pernic=False):
+        out = {n: snetio(self._counter(n), self._counter(n, 1.3), 0, 0, 0, 0, 0, 0) for n in self.nics}
+        if pernic:
+            return out
+        return snetio(*[sum(x) for x in zip(*out.values())])
+
+    def net_if_stats(self):
+        return {n: snicstats(True, 2, 200000 if n.startswith("ib") else 25000, 4092 if n.startswith("ib") else 1500, "up")
+                for n in self.nics}
+
+    def net_if_addrs(self):
+        link = getattr(psutil, "AF_LINK", None) or getattr(socket, "AF_PACKET", 17)
+        return {n: [snicaddr(socket.AF_INET, "10.0.%d.10" % i, "255.255.255.0", None, None),
+                    snicaddr(link, "02:00:00:00:00:%02x" % i, None, None, None)]
+                for i, n in enumerate(self.nics)}
+
+    def disk_io_counters(self, perdisk=False):
+        out = {d: sdiskio(0, 0, self._counter(d), self._counter(d, 0.6), 0, 0) for d in self.disks}
+        if perdisk:
+            return out
+        return sdiskio(*[sum(x) for x in zip(*out.values())])
+
+    def disk_partitions(self, all=False):
+        return [sdiskpart("/dev/" + d, "/" if i == 0 else "/data%d" % i, "xfs", "rw", 255, 4096)
+                for i, d in enumerate(self.disks)]
+
+    def disk_usage(self, path):
+        total = 8 * 1024 ** 4
+        used = int(total * 0.42)
+        return sdiskusage(total, used, total - used, 42.0)
+
+    def install(self):
+        for name in ("cpu_percent", "cpu_count", "virtual_memory", "net_io_counters", "net_if_stats",
+                     "net_if_addrs", "disk_io_counters", "disk_partitions", "disk_usage"):
+            setattr(psutil, name, getattr(self, name))
+
+
+class _Handle:
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+# Stand-in for the pynvml module with `count` GPUs; `latency` (seconds) is added
+# to every device query to emulate a slow driver.
+class FakeNvml:
+    NVML_TEMPERATURE_GPU = 0
+
+    def __init__(self, count: int = 8, latency: float = 0.0, name: str = "NVIDIA H100 80GB HBM3"):
+        self.count = count
+        self.latency = latency
+        self.name = name
+        self.t0 = time.time()
+        self.calls = 0
+
+    def _q(self, h: _Handle) -> float:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return 0.5 + 0.5 * math.sin((time.time() - self.t0) / 20 + h.index)
+
+    def nvmlInit(self):
+        pass
+
+    def nvmlShutdown(self):
+        pass
+
+    def nvmlDeviceGetCount(self):
+        return self.count
+
+    def nvmlDeviceGetHandleByIndex(self, i):
+        return _Handle(i)
+
+    def nvmlDeviceGetName(self, h):
+        return self.name
+
+    def nvmlDeviceGetUtilizationRates(self, h):
+        v = int(self._q(h) * 100)
+        return SimpleNamespace(gpu=v, memory=v // 2)
+
+    def nvmlDeviceGetMemoryInfo(self, h):
+        total = 80 * 1024 ** 3
+        used = int(total * self._q(h))
+        return SimpleNamespace(total=total, used=used, free=total - used)
+
+    def nvmlDeviceGetTemperature(self, h, kind):
+        return int(40 + 40 * self._q(h))
+
+    def nvmlDeviceGetPowerUsage(self, h):
+        return int((100 + 600 * self._q(h)) * 1000)
+
+    def nvmlDeviceGetComputeRunningProcesses(self, h):
+        # the benchmarked process itself holds memory on the even GPUs, so the process view has rows to join
+        self._q(h)
+        if h.index % 2:
+            return []
+        return [SimpleNamespace(pid=os.getpid(), usedGpuMemory=(h.index + 1) * 1024 ** 3)]
+
+    def nvmlDeviceGetGraphicsRunningProcesses(self, h):
+        return []
+
+    # static facts for the hardware inventory: GPUs are NVLinked in pairs, the rest meet at the CPU
+    def nvmlSystemGetDriverVersion(self):
+        return "550.54.15"
+
+    def nvmlDeviceGetUUID(self, h):
+        return "GPU-00000000-0000-0000-0000-%012d" % h.index
+
+    def nvmlDeviceGetPciInfo(self, h):
+        return SimpleNamespace(busId="00000000:%02X:00.0" % (0x18 + h.index * 0x10))
+
+    def nvmlDeviceGetNvLinkState(self, h, link):
+        if link >= 4:
+            raise RuntimeError("NVML_ERROR_INVALID_ARGUMENT")
+        return 1
+
+    def nvmlDeviceGetNvLinkRemotePciInfo(self, h, link):
+        return self.nvmlDeviceGetPciInfo(_Handle(h.index ^ 1))
+
+    def nvmlDeviceGetTopologyCommonAncestor(self, h1, h2):
+        return 30 if h1.index // 4 == h2.index // 4 else 50
+
+
+def install(gpus: int = 8, gpu_backend: str = "nvml", nvml_latency: float = 0.0, **host) -> Dict[str, object]:
+    # must run before backend.app is imported: collectors bind NVIDIA_SMI at construction
+    fake = FakeHost(**host)
+    fake.install()
+    nvml = None
+    if gpu_backend == "nvml":
+        nvml = FakeNvml(gpus, nvml_latency)
+        sys.modules["pynvml"] = nvml
+    else:
+        # import pynvml -> ImportError, so the app falls back to the streaming nvidia-smi
+        sys.modules["pynvml"] = None
+        os.environ["NVIDIA_SMI"] = FAKE_SMI
+        os.environ["FAKE_GPUS"] = str(gpus)
+    return {"host": fake, "nvml": nvml}
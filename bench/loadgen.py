@@ -0,0 +1,154 @@
+import json
+import gzip
+import time
+import random
+import asyncio
+from typing import Any, Dict, List
+
+import httpx
+
+POLL_URLS = ("/api/metrics/system", "/api/gpu", "/api/network/interfaces", "/api/storage/disks", "/api/alerts")
+HISTORY_QUERIES = (
+    ("cpu,mem", 3600, None),
+    ("gpu.*.util", 3600, None),
+    ("gpu.*.temp,gpu.*.power", 6 * 3600, None),
+    ("net.*.rx,net.*.tx", 24 * 3600, None),
+    ("cpu", 300, 0),
+)
+AGENT_SERIES = ["cpu", "mem"] + ["gpu.%d.%s" % (g, k) for g in range(8) for k in ("util", "temp", "power", "mem")] \
+    + ["net.eth%d.%s" % (n, d) for n in range(2) for d in ("rx", "tx")] + ["disk.sda.read", "disk.sda.write"]
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+    pick = lambda q: round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 3)
+    return {"count": len(s), "p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99),
+            "max_ms": round(s[-1] * 1000, 3), "mean_ms": round(sum(s) / len(s) * 1000, 3)}
+
+
+# Client side of a benchmark run; lives in its own process so the server's CPU
+# and memory figures only cover the app. Samples before `record_from` are dropped.
+class Load:
+    def __init__(self, base: str, cfg: Dict[str, Any]):
+        self.base = base
+        self.cfg = cfg
+        self.lat: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.requests = 0
+        self.record_from = 0.0
+        self.stop_at = 0.0
+
+    def _rec(self, kind: str, dt: float, ok: bool = True):
+        if time.time() < self.record_from:
+            return
+        if ok:
+            self.lat.setdefault(kind, []).append(dt)
+            if kind != "sse_delivery":
+                self.requests += 1
+        else:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    async def _get(self, c: httpx.AsyncClient, kind: str, url: str):
+        t0 = time.perf_counter()
+        try:
+            r = await c.get(url)
+            self._rec(kind, time.perf_counter() - t0, r.status_code < 400)
+        except httpx.HTTPError:
+            self._rec(kind, 0, False)
+
+    async def login(self, c: httpx.AsyncClient) -> bool:
+        t0 = time.perf_counter()
+        try:
+            r = await c.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+        except httpx.HTTPError:
+            self._rec("login", 0, False)
+            return False
+        self._rec("login", time.perf_counter() - t0, r.status_code == 200)
+        return r.status_code == 200
+
+    async def poller(self, c: httpx.AsyncClient):
+        # a dashboard tab refreshing its widgets every 3 s
+        await asyncio.sleep(random.uniform(0, self.cfg["poll_interval"]))
+        while time.time() < self.stop_at:
+            t0 = time.time()
+            await asyncio.gather(*(self._get(c, "poll " + u, u) for u in POLL_URLS))
+            await asyncio.sleep(max(0.0, self.cfg["poll_interval"] - (time.time() - t0)))
+
+    async def sse(self, c: httpx.AsyncClient):
+        # delivery delay: arrival time minus the frame's sample timestamp
+        try:
+            async with c.stream("GET", "/events/metrics", timeout=None) as r:
+                async for line in r.aiter_lines():
+                    if line.startswith("data: "):
+                        ts = json.loads(line[6:]).get("ts")
+                        if ts:
+                            self._rec("sse_delivery", time.time() - ts)
+                    if time.time() >= self.stop_at:
+                        break
+        except httpx.HTTPError:
+            self._rec("sse_delivery", 0, False)
+
+    async def login_bursts(self):
+        async with httpx.AsyncClient(base_url=self.base, limits=httpx.Limits(max_connections=None)) as c:
+            while time.time() < self.stop_at:
+                await asyncio.gather(*(self.login(c) for _ in range(self.cfg["login_burst"])))
+                await asyncio.sleep(self.cfg["login_every"])
+
+    async def history(self, c: httpx.AsyncClient):
+        while time.time() < self.stop_at:
+            series, span, step = random.choice(HISTORY_QUERIES)
+            url = "/api/metrics/history?series=%s&from=%d" % (series, time.time() - span)
+            if step is not None:
+                url += "&step=%s" % step
+            await self._get(c, "history", url)
+            await asyncio.sleep(1.0 / self.cfg["history_rps"])
+
+    async def agent(self, c: httpx.AsyncClient, i: int):
+        # one remote node pushing `agent_batch` samples per period, like backend.agent
+        interval, batch = self.cfg["agent_interval"], self.cfg["agent_batch"]
+        period = interval * batch
+        headers = {"Authorization": "Bearer " + self.cfg["ingest_token"], "Content-Encoding": "gzip",
+                   "Content-Type": "application/json"}
+        gpus = [{"index": g, "name": "Fake GPU", "util": 50, "temp": 60} for g in range(8)]
+        await asyncio.sleep(random.uniform(0, period))
+        while time.time() < self.stop_at:
+            t0 = time.time()
+            samples = [[t0 - (batch - 1 - k) * interval] + [random.uniform(0, 100) for _ in AGENT_SERIES]
+                       for k in range(batch)]
+            body = gzip.compress(json.dumps({"node": "bench-%03d" % i, "period": period, "names": AGENT_SERIES,
+                                             "samples": samples, "gpus": gpus}).encode(), 6)
+            p0 = time.perf_counter()
+            try:
+                r = await c.post("/api/ingest", content=body, headers=headers)
+                self._rec("ingest", time.perf_counter() - p0, r.status_code == 200)
+            except httpx.HTTPError:
+                self._rec("ingest", 0, False)
+            await asyncio.sleep(max(0.0, period - (time.time() - t0)))
+
+    async def run(self, t_start: float) -> Dict[str, Any]:
+        cfg = self.cfg
+        self.record_from = t_start + cfg["warmup"]
+        self.stop_at = self.record_from + cfg["duration"]
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=self.base, limits=limits, timeout=30) as c:
+            if not await self.login(c):
+                raise RuntimeError("bench login failed")
+            tasks = [self.poller(c) for _ in range(cfg["pollers"])]
+            tasks += [self.sse(c) for _ in range(cfg["sse"])]
+            tasks += [self.history(c) for _ in range(cfg["history_clients"])]
+            tasks += [self.agent(c, i) for i in range(cfg.get("agents", 0))]
+            if cfg["login_burst"]:
+                tasks.append(self.login_bursts())
+            await asyncio.gather(*tasks)
+        return {"latency": {k: summarize(v) for k, v in sorted(self.lat.items())},
+                "errors": self.errors, "requests": self.requests}
+
+
+def main(base: str, cfg: Dict[str, Any], t_start: float, out):
+    # multiprocessing entry point; `out` is a Queue receiving the result dict
+    try:
+        out.put(asyncio.run(Load(base, cfg).run(t_start)))
+    except Exception as e:
+        out.put({"error": repr(e)})
@@ -0,0 +1,211 @@
+# Benchmark harness: runs the app in-process on fake psutil/NVML/nvidia-smi
+# backends, drives a scenario from a separate load process and writes a JSON
+# report (client latency, event-loop lag, server CPU per request, memory growth).
+#
+#   python -m bench.run --scenario mixed --duration 60
+#   python -m bench.run --scenario dashboard --gpu-backend smi --gpus 4
+#   python -m bench.compare bench/results/a.json bench/results/b.json
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing as mp
+
+import psutil
+
+from . import fakes, loadgen
+
+SCENARIOS = {
+    # many browser tabs: live charts over SSE plus widgets polled every 3 s
+    "dashboard": {"sse": 200, "pollers": 50, "history_clients": 0, "login_burst": 0},
+    # users signing in at once (PBKDF2 on the verifier pool)
+    "login": {"sse": 20, "pollers": 10, "history_clients": 0, "login_burst": 40},
+    # chart zooms over the in-memory ring and the rollup tiers
+    "history": {"sse": 20, "pollers": 10, "history_clients": 8, "login_burst": 0},
+    "mixed": {"sse": 100, "pollers": 30, "history_clients": 4, "login_burst": 10},
+    # a central instance with remote agents pushing to /api/ingest
+    "fleet": {"sse": 20, "pollers": 10, "history_clients": 2, "login_burst": 0, "agents": 500},
+}
+DEFAULTS = {"poll_interval": 3.0, "login_every": 5.0, "history_rps": 2.0, "warmup": 5.0, "duration": 30.0,
+            "agents": 0, "agent_interval": 5.0, "agent_batch": 6, "ingest_token": "bench"}
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(RESULTS_DIR)).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def _log_writer(path: str, rate: float, stop: threading.Event):
+    # synthetic syslog traffic for the log ingestor
+    i = 0
+    with open(path, "a") as f:
+        while not stop.is_set():
+            for _ in range(max(1, int(rate / 10))):
+                i += 1
+                msg = "NVRM: Xid 79 GPU has fallen off the bus" if i % 997 == 0 else "mlx5_core: port %d ok" % (i % 8)
+                f.write("%s bench kernel: %s\n" % (time.strftime("%b %d %H:%M:%S"), msg))
+            f.flush()
+            stop.wait(0.1)
+
+
+def _prefill(appm, hours: float):
+    # history for the range queries: `hours` of samples at the sampler interval
+    if hours <= 0:
+        return
+    now = time.time()
+    step = appm.SAMPLER.interval
+    names = ["cpu", "mem"] + ["gpu.%d.%s" % (g, k) for g in range(8) for k in ("util", "temp", "power", "mem")]
+    names += ["net.ib%d.%s" % (n, d) for n in range(2) for d in ("rx", "tx")]
+    t = now - hours * 3600
+    i = 0
+    while t < now:
+        vals = {n: float((i * 7 + j) % 100) for j, n in enumerate(names)}
+        appm.STORE.append(t, vals)
+        appm.ROLLUP.add(t, vals)
+        t += step
+        i += 1
+    appm.ROLLUP.flush()
+
+
+def run(args) -> dict:
+    cfg = dict(DEFAULTS, **SCENARIOS[args.scenario])
+    for k in ("sse", "pollers", "history_clients", "login_burst", "agents", "agent_batch", "duration", "warmup"):
+        v = getattr(args, k, None)
+        if v is not None:
+            cfg[k] = v
+    fake = fakes.install(gpus=args.gpus, gpu_backend=args.gpu_backend, nvml_latency=args.nvml_latency_ms / 1000,
+                         nics=args.nics, disks=args.disks)
+
+    tmp = tempfile.mkdtemp(prefix="onebox-bench-")
+    log_path = os.path.join(tmp, "syslog")
+    open(log_path, "w").close()
+    os.environ["LOG_FILES"] = log_path
+    os.environ["INGEST_TOKEN"] = cfg["ingest_token"]
+    from backend import db as dbm
+    dbm.DATA_DIR, dbm.DB_PATH = tmp, os.path.join(tmp, "app.db")
+    import uvicorn
+    from backend import app as appm
+    from backend.instrument import Histogram
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(appm.app, host="127.0.0.1", port=port, log_level="warning",
+                                           loop="asyncio", http="h11"))
+    srv_thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    srv_thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    _prefill(appm, args.prefill_hours)
+    stop_logs = threading.Event()
+    if args.log_rate:
+        threading.Thread(target=_log_writer, args=(log_path, args.log_rate, stop_logs), daemon=True).start()
+
+    proc = psutil.Process()
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    t_start = time.time()
+    client = ctx.Process(target=loadgen.main, args=("http://127.0.0.1:%d" % port, cfg, t_start, out), daemon=True)
+    client.start()
+
+    # measurement window starts after warmup: reset server-side histograms there
+    time.sleep(max(0.0, t_start + cfg["warmup"] - time.time()))
+    appm.LOOP_LAG.hist = Histogram()
+    appm.ROUTE_TIMINGS.hists.clear()
+    appm.TIMINGS.hists.clear()
+    cpu0 = proc.cpu_times()
+    rss0 = proc.memory_info().rss
+    w0 = time.time()
+    result = out.get(timeout=cfg["warmup"] + cfg["duration"] + 120)
+    wall = time.time() - w0
+    cpu1 = proc.cpu_times()
+    rss1 = proc.memory_info().rss
+    client.join(10)
+    stop_logs.set()
+    # let the app's shutdown run (stops the sampler, drains writers, kills nvidia-smi)
+    server.should_exit = True
+    srv_thread.join(15)
+    if "error" in result:
+        raise SystemExit("load generator failed: " + result["error"])
+
+    cpu_s = (cpu1.user - cpu0.user) + (cpu1.system - cpu0.system)
+    reqs = max(1, result["requests"])
+    return {
+        "scenario": args.scenario,
+        "commit": _git_rev(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": dict(cfg, gpus=args.gpus, gpu_backend=args.gpu_backend, nvml_latency_ms=args.nvml_latency_ms,
+                       log_rate=args.log_rate, prefill_hours=args.prefill_hours),
+        "client": result,
+        "server": {
+            "cpu_percent": round(cpu_s / wall * 100, 1),
+            "cpu_ms_per_request": round(cpu_s * 1000 / reqs, 3),
+            "rss_start_mb": round(rss0 / 2 ** 20, 1),
+            "rss_end_mb": round(rss1 / 2 ** 20, 1),
+            "rss_growth_mb": round((rss1 - rss0) / 2 ** 20, 1),
+            "loop_lag": appm.LOOP_LAG.summary(),
+            "routes": [{"method": k[0], "route": k[1], **h.summary()} for k, h in appm.ROUTE_TIMINGS.items()],
+            "collectors": appm.TIMINGS.summary(),
+            "sampler_ticks": appm.SAMPLER.ticks,
+            "log_lines": appm.LOGS.lines,
+            "nvml_calls": fake["nvml"].calls if fake["nvml"] else None,
+            "fleet": appm.FLEET.stats(),
+        },
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench.run")
+    ap.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    ap.add_argument("--duration", type=float)
+    ap.add_argument("--warmup", type=float)
+    ap.add_argument("--sse", type=int)
+    ap.add_argument("--pollers", type=int)
+    ap.add_argument("--history-clients", dest="history_clients", type=int)
+    ap.add_argument("--login-burst", dest="login_burst", type=int)
+    ap.add_argument("--agents", type=int, help="simulated remote nodes pushing to /api/ingest")
+    ap.add_argument("--agent-batch", dest="agent_batch", type=int, help="samples per push")
+    ap.add_argument("--gpus", type=int, default=8)
+    ap.add_argument("--gpu-backend", choices=("nvml", "smi"), default="nvml")
+    ap.add_argument("--nvml-latency-ms", type=float, default=0.0)
+    ap.add_argument("--nics", type=int, default=4)
+    ap.add_argument("--disks", type=int, default=8)
+    ap.add_argument("--log-rate", type=float, default=200.0, help="synthetic syslog lines per second")
+    ap.add_argument("--prefill-hours", type=float, default=24.0)
+    ap.add_argument("--out", help="report path (default bench/results/<scenario>-<commit>-<time>.json)")
+    args = ap.parse_args(argv)
+
+    report = run(args)
+    path = args.out or os.path.join(RESULTS_DIR, "%s-%s-%s.json" % (
+        args.scenario, report["commit"], time.strftime("%Y%m%d-%H%M%S")))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    c, s = report["client"], report["server"]
+    for kind, v in c["latency"].items():
+        if v.get("count"):
+            print("%-36s n=%-6d p50=%8.2fms p99=%8.2fms" % (kind, v["count"], v["p50_ms"], v["p99_ms"]))
+    print("errors:", c["errors"] or "none")
+    print("loop lag p99=%sms max=%sms | server cpu %s%% (%s ms/req) | rss %s -> %s MB" % (
+        s["loop_lag"]["p99_ms"], s["loop_lag"]["max_ms"], s["cpu_percent"], s["cpu_ms_per_request"],
+        s["rss_start_mb"], s["rss_end_mb"]))
+    print("report:", path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,32 @@
 #!/usr/bin/env bash
+# ./run.sh          development: one process with --reload
+# ./run.sh prod     one collector process + $WORKERS uvicorn workers sharing its samples
 set -euo pipefail
 cd "$(dirname "$0")"
 
 export APP_SECRET="${APP_SECRET:-dev_secret_change_me}"
 
+if [ "${1:-dev}" = "prod" ]; then
+  export SHARED_STATE="${SHARED_STATE:-/dev/shm/onebox-state-${PORT:-8000}}"
+  python -m backend.collector &
+  COLLECTOR=$!
+  # workers wait for the collector's segment before they accept requests
+  ONEBOX_ROLE=worker python -m uvicorn backend.app:app \
+    --workers "${WORKERS:-$(nproc)}" \
+    --host "${HOST:-0.0.0.0}" \
+    --port "${PORT:-8000}" \
+    --no-access-log &
+  SERVER=$!
+  trap 'kill "$SERVER" 2>/dev/null || true' INT TERM
+  # a trapped signal interrupts the first wait; the second lets uvicorn finish its shutdown
+  wait "$SERVER" || true
+  wait "$SERVER" 2>/dev/null || true
+  kill "$COLLECTOR" 2>/dev/null || true
+  wait "$COLLECTOR" || true
+  exit 0
+fi
+
 exec python -m uvicorn backend.app:app \
   --reload \
   --host 0.0.0.0 \
   --port 8000
-
@@ -1,3 +1,7 @@
+// --- HTML ---
+// for anything from the server that is put into innerHTML
+function esc(s){ return String(s ?? '').replace(/[&<>"]/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;' }[c])); }
+
 // --- HTTP helpers ---
 async function apiFetch(url, opt = {}) {
   const r = await fetch(url, Object.assign({ credentials: 'same-origin' }, opt));
@@ -11,10 +15,34 @@ const apiPost = (u, bodyObj) => apiFetch(u, {
   headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
   body: new URLSearchParams(bodyObj || {})
 });
-function mountSSE(url, onmsg) {
-  const es = new EventSource(url, { withCredentials: true });
-  es.onmessage = (e) => onmsg(JSON.parse(e.data));
-  es.onerror = () => es.close();
+// opts: { fields: ['cpu', ...], interval: seconds, delta: true }; on network errors
+// the browser reconnects by itself and resumes from Last-Event-ID.
+// With delta (e.g. /events/live) the schema/key/delta frames are decoded and
+// onmsg receives { ts, seq, values: {name: value}, changed: [name, ...] }.
+function mountSSE(url, onmsg, opts = {}) {
+  const q = new URLSearchParams();
+  if (opts.fields) q.set('fields', [].concat(opts.fields).join(','));
+  if (opts.interval) q.set('interval', opts.interval);
+  const qs = q.toString();
+  const es = new EventSource(qs ? url + (url.includes('?') ? '&' : '?') + qs : url, { withCredentials: true });
+  if (opts.delta) {
+    let names = [], values = {};
+    es.addEventListener('schema', (e) => { names = JSON.parse(e.data).names; values = {}; });
+    es.addEventListener('key', (e) => {
+      const [seq, ts, vals] = JSON.parse(e.data);
+      values = {};
+      names.forEach((n, i) => { values[n] = vals[i]; });
+      onmsg({ seq, ts, values, changed: names.slice() });
+    });
+    es.onmessage = (e) => {
+      const d = JSON.parse(e.data), changed = [];
+      for (let i = 2; i < d.length; i += 2) { const n = names[d[i]]; values[n] = d[i + 1]; changed.push(n); }
+      onmsg({ seq: d[0], ts: d[1], values, changed });
+    };
+  } else {
+    es.onmessage = (e) => onmsg(JSON.parse(e.data));
+  }
+  es.onerror = () => { if (es.readyState === EventSource.CLOSED) es.close(); };
   return es;
 }
 
@@ -0,0 +1,42 @@
+import asyncio
+import gzip
+import json
+
+from backend.agent import Agent
+
+
+def frame(ts):
+    return {"ts": float(ts), "series": {"cpu.util": ts}, "gpus": []}
+
+
+def test_push_keeps_samples_that_arrived_during_a_full_buffer():
+    agent = Agent("http://central:8000", "n1", batch=3, buffer=4)
+    agent._info = {}
+    sent = []
+
+    async def main():
+        done = asyncio.get_running_loop().create_future()
+
+        def post(body):
+            sent.append([r[0] for r in json.loads(gzip.decompress(body))["samples"]])
+            if len(sent) == 1:
+                # two more ticks while the first push is in flight: the full buffer evicts 1 and 2
+                agent.on_frame(0, frame(5))
+                agent.on_frame(0, frame(6))
+            else:
+                done.get_loop().call_soon_threadsafe(done.set_result, None)
+
+        agent.post = post
+        for ts in (1, 2, 3, 4):
+            agent.on_frame(0, frame(ts))
+        task = asyncio.ensure_future(agent.push_loop())
+        await asyncio.wait_for(done, 5)
+        while agent._buf:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(main())
+    agent.gpu.close()
+    assert sent == [[1.0, 2.0, 3.0, 4.0], [5.0, 6.0]]
+    assert agent.pushed == 6
+    assert not agent._buf
@@ -0,0 +1,64 @@
+import time
+import sqlite3
+
+import pytest
+
+from backend import alerting as alertm
+from backend.alerting import AlertEngine
+
+
+def engine():
+    e = AlertEngine()
+    e.rules = [{"id": 1, "name": "CPU", "selector": "cpu", "op": ">=", "threshold": 90, "duration": 0,
+                "hysteresis": 5, "level": "警告"}]
+    return e
+
+
+@pytest.fixture
+def db(monkeypatch):
+    calls = {"fail": 0, "written": []}
+
+    def apply(fired, resolved):
+        if calls["fail"]:
+            calls["fail"] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        calls["written"].append((list(fired), list(resolved)))
+
+    monkeypatch.setattr(alertm.dbm, "alerts_apply", apply)
+    return calls
+
+
+def test_failed_flush_is_retried(db):
+    e = engine()
+    e.evaluate(0.0, {"cpu": 95})
+    db["fail"] = 1
+    assert e.flush() == ([], [])
+    assert e.write_errors == 1 and "locked" in e.last_error
+    # nothing counted until the write succeeds, and the rule is still firing
+    assert (e.unacked, e.fired) == (0, 0)
+    assert len(e.firing()) == 1
+    # the value recovers meanwhile: both transitions are written, in order
+    e.evaluate(1.0, {"cpu": 50})
+    fired, resolved = e.flush()
+    assert len(fired) == 1 and len(resolved) == 1
+    assert db["written"] == [(fired, resolved)]
+    assert (e.unacked, e.fired, e.resolved) == (1, 1, 1)
+    assert e.stats()["queued"] == 0
+
+
+def test_queue_is_bounded_while_writes_fail(db, monkeypatch):
+    monkeypatch.setattr(alertm, "MAX_QUEUED", 3)
+    e = engine()
+    db["fail"] = 100
+    for i in range(5):
+        e.evaluate(float(2 * i), {"cpu": 95})
+        e.evaluate(float(2 * i + 1), {"cpu": 50})
+        e.flush()
+    assert e.stats()["queued"] == 6
+    assert e.dropped == 4
+    db["fail"] = 0
+    fired, resolved = e.flush()
+    # the newest transitions survive
+    stamp = lambda t: time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+    assert [f[0] for f in fired] == [stamp(4.0), stamp(6.0), stamp(8.0)]
+    assert [r[0] for r in resolved] == [stamp(5.0), stamp(7.0), stamp(9.0)]
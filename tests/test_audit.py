@@ -0,0 +1,88 @@
+import time
+import sqlite3
+import threading
+
+import pytest
+
+from backend import audit as auditm
+from backend.audit import AuditWriter
+
+
+class FakeDb:
+    def __init__(self):
+        self.rows = []
+        self.fail = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def insert(self, rows):
+        self.gate.wait()
+        if self.fail:
+            self.fail -= 1
+            raise sqlite3.OperationalError("database is locked")
+        self.rows.extend(rows)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDb()
+    monkeypatch.setattr(auditm.dbm, "audit_insert_many", fake.insert)
+    monkeypatch.setattr(auditm.dbm, "close", lambda: None)
+    return fake
+
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_batches_and_drains_on_stop(db):
+    w = AuditWriter(interval=0.05)
+    w.start()
+    for i in range(20):
+        w.append("admin", "act", str(i))
+    w.stop()
+    assert [r[3] for r in db.rows] == [str(i) for i in range(20)]
+    assert w.stats()["dropped"] == 0
+
+
+def test_full_queue_never_blocks_and_loses_nothing(db):
+    db.gate.clear()  # writer stuck in a slow transaction
+    w = AuditWriter(maxsize=5, interval=0.01)
+    w.start()
+    t0 = time.perf_counter()
+    for i in range(50):
+        w.append("admin", "act", str(i))
+    assert time.perf_counter() - t0 < 0.1
+    assert w.overflow > 0
+    db.gate.set()
+    w.stop()
+    assert sorted(int(r[3]) for r in db.rows) == list(range(50))
+
+
+def test_failed_batch_is_retried(db):
+    db.fail = 2
+    w = AuditWriter(interval=0.01)
+    w.start()
+    w.append("admin", "login", "web")
+    assert wait_for(lambda: len(db.rows) == 1)
+    assert w.failed_writes == 2
+    assert "locked" in w.last_error
+    w.stop()
+    assert w.dropped == 0
+
+
+def test_events_are_dropped_and_counted_only_past_the_spill_limit(db, monkeypatch, capsys):
+    monkeypatch.setattr(auditm, "MAX_SPILL", 3)
+    db.fail = 10 ** 6
+    w = AuditWriter(interval=0.01, max_backoff=0.02)
+    w.start()
+    for i in range(5):
+        w.append("admin", "act", str(i))
+    assert wait_for(lambda: w.dropped == 2)
+    w.stop()
+    # the final write at stop fails as well
+    assert w.dropped == 5
+    assert "dropped" in capsys.readouterr().err
@@ -0,0 +1,45 @@
+import json
+import threading
+
+from backend.httpcache import BodyCache, etag_of
+
+
+def test_reuses_body_while_version_is_unchanged():
+    cache = BodyCache()
+    calls = []
+
+    def produce():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    etag, body = cache.get("net", 1, produce)
+    assert cache.get("net", 1, produce) == (etag, body)
+    assert etag == etag_of(body) and json.loads(body) == {"n": 1}
+    assert json.loads(cache.get("net", 2, produce)[1]) == {"n": 2}
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_concurrent_callers_keep_the_cache_bounded():
+    cache = BodyCache(maxsize=8)
+    errors = []
+    start = threading.Barrier(8)
+
+    def worker(t):
+        start.wait()
+        try:
+            for i in range(2000):
+                key = (t * 7 + i) % 20
+                etag, body = cache.get(key, i // 50, lambda: {"key": key})
+                assert json.loads(body) == {"key": key}
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert errors == []
+    stats = cache.stats()
+    assert stats["entries"] <= 8
+    assert stats["hits"] + stats["misses"] == 8 * 2000
@@ -0,0 +1,28 @@
+import threading
+import time
+
+from backend.fleet import Fleet
+
+
+def test_overlapping_retries_store_each_sample_once():
+    fleet = Fleet(capacity=64)
+    node = fleet._node("n1")
+    append = node.store.append
+
+    def slow_append(ts, values):
+        # widen the window between the last_ts check and the append
+        time.sleep(0.01)
+        append(ts, values)
+
+    node.store.append = slow_append
+    payload = {"node": "n1", "names": ["cpu"], "samples": [[100.0 + i, float(i)] for i in range(5)]}
+    counts = []
+    threads = [threading.Thread(target=lambda: counts.append(fleet.ingest(payload))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(counts) == [0, 5]
+    assert fleet.samples == 5 and node.samples == 5
+    out = node.store.query(["cpu"], 99, 106, 1)
+    assert [v for v in out["series"]["cpu"] if v is not None] == [0.0, 1.0, 2.0, 3.0, 4.0]
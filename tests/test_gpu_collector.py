@@ -0,0 +1,168 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend import gpu as gpum
+from backend.gpu import GpuCollector
+
+
+class FakeNvml:
+    # minimal pynvml stand-in that counts calls and can be told to fail
+    NVML_TEMPERATURE_GPU = 0
+
+    def __init__(self, count=2, fail_init=False, latency=0.0):
+        self.count = count
+        self.fail_init = fail_init
+        self.latency = latency
+        self.inits = 0
+        self.shutdowns = 0
+        self.util_calls = 0
+        self.broken = set()
+
+    def _check(self, name):
+        if name in self.broken:
+            raise RuntimeError("NVML_ERROR_NOT_SUPPORTED")
+
+    def nvmlInit(self):
+        self.inits += 1
+        if self.fail_init:
+            raise RuntimeError("NVML_ERROR_LIBRARY_NOT_FOUND")
+
+    def nvmlShutdown(self):
+        self.shutdowns += 1
+
+    def nvmlDeviceGetCount(self):
+        return self.count
+
+    def nvmlDeviceGetHandleByIndex(self, i):
+        return i
+
+    def nvmlDeviceGetName(self, h):
+        return b"Fake GPU %d" % h
+
+    def nvmlDeviceGetUtilizationRates(self, h):
+        self._check("util")
+        self.util_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(gpu=50 + h, memory=10)
+
+    def nvmlDeviceGetMemoryInfo(self, h):
+        self._check("mem")
+        return SimpleNamespace(total=8 * 1024 ** 3, used=2 * 1024 ** 3)
+
+    def nvmlDeviceGetTemperature(self, h, kind):
+        self._check("temp")
+        return 60
+
+    def nvmlDeviceGetPowerUsage(self, h):
+        self._check("power")
+        return 250000
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(gpum.time, "time", c)
+    return c
+
+
+def test_snapshot_reads_all_fields():
+    nv = FakeNvml(count=2)
+    ts, gpus = GpuCollector(nvml=nv).snapshot()
+    assert ts > 0
+    assert [g["name"] for g in gpus] == ["Fake GPU 0", "Fake GPU 1"]
+    assert gpus[1] == {"id": 1, "name": "Fake GPU 1", "util": 51, "mem_used_mb": 2048, "mem_total_mb": 8192,
+                       "temp_c": 60, "power_w": 250}
+
+
+def test_init_failure_backs_off_until_retry_interval(clock):
+    nv = FakeNvml(fail_init=True)
+    g = GpuCollector(nvml=nv, retry_interval=30.0)
+    assert g.snapshot(max_age=0) == (0.0, [])
+    assert not g.nvml_available()
+    assert nv.inits == 1
+    # within the backoff nvmlInit is not retried
+    clock.now += 29
+    g.snapshot(max_age=0)
+    assert nv.inits == 1
+    # after it, and a recovered driver is picked up
+    clock.now += 2
+    nv.fail_init = False
+    _, gpus = g.snapshot(max_age=0)
+    assert nv.inits == 2
+    assert len(gpus) == 2
+    assert g.source == "nvml"
+
+
+def test_snapshot_is_reused_within_max_age(clock):
+    nv = FakeNvml(count=2)
+    g = GpuCollector(nvml=nv, max_age=1.0)
+    first = g.snapshot()
+    clock.now += 0.5
+    assert g.snapshot() == first
+    assert nv.util_calls == 2
+    clock.now += 1.0
+    g.snapshot()
+    assert nv.util_calls == 4
+    # an explicit max_age overrides the collector default
+    g.snapshot(max_age=0)
+    assert nv.util_calls == 4
+    clock.now += 0.01
+    g.snapshot(max_age=0)
+    assert nv.util_calls == 6
+
+
+def test_concurrent_snapshots_coalesce_into_one_refresh():
+    nv = FakeNvml(count=4, latency=0.02)
+    g = GpuCollector(nvml=nv, max_age=5.0)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(g.snapshot())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert nv.util_calls == 4
+    assert len({ts for ts, _ in results}) == 1
+
+
+def test_close_shuts_down_and_reopens_on_demand():
+    nv = FakeNvml()
+    g = GpuCollector(nvml=nv)
+    g.snapshot()
+    g.close()
+    assert nv.shutdowns == 1
+    g.close()
+    assert nv.shutdowns == 1
+    g.snapshot(max_age=0)
+    assert nv.inits == 2
+
+
+@pytest.mark.parametrize("field,key", [("util", "util"), ("temp", "temp_c"), ("power", "power_w"),
+                                       ("mem", "mem_used_mb")])
+def test_failing_field_falls_back_to_zero(field, key):
+    nv = FakeNvml(count=1)
+    nv.broken.add(field)
+    _, gpus = GpuCollector(nvml=nv).snapshot()
+    assert gpus[0][key] == 0
+    # the other fields are still read
+    others = {"util": 50, "temp_c": 60, "power_w": 250, "mem_used_mb": 2048}
+    others.pop(key)
+    for k, v in others.items():
+        assert gpus[0][k] == v
@@ -0,0 +1,70 @@
+import json
+import threading
+
+from backend.inventory import Inventory, SharedInventory
+
+
+class FakeInventory(Inventory):
+    def __init__(self):
+        super().__init__(gpu=None)
+        self.builds = 0
+
+    def _collect(self):
+        self.builds += 1
+        return {"host": {"hostname": "box"}, "build": self.builds}
+
+
+def test_workers_serve_what_the_collector_published(tmp_path):
+    path = str(tmp_path / "state.inventory")
+    collector, worker = FakeInventory(), SharedInventory(path)
+    published = collector.publish(path)
+    assert published == (1, collector.get()[0])
+    # a tick carries (collections, etag) through the segment as JSON
+    worker.sync(json.loads(json.dumps(published)))
+    assert worker.get() == collector.get()
+    assert worker.get()[1]["build"] == 1 and worker.loads == 1
+    worker.sync(list(published))
+    worker.get()
+    assert worker.loads == 1
+
+
+def test_refresh_waits_for_the_next_build(tmp_path):
+    path = str(tmp_path / "state.inventory")
+    collector, worker = FakeInventory(), SharedInventory(path)
+    worker.sync(collector.publish(path))
+    before = worker.published[0]
+    assert not worker.wait(before, 0.05)
+
+    def collector_tick():
+        worker.sync(collector.publish(path))
+
+    t = threading.Timer(0.05, collector_tick)
+    t.start()
+    assert worker.wait(before, 5)
+    t.join()
+    assert worker.get()[1]["build"] == 2
+    assert worker.stats() == {"cached": True, "collections": 2, "loads": 1}
+
+
+def test_publish_requests_coalesce(tmp_path):
+    path = str(tmp_path / "state.inventory")
+    collector = FakeInventory()
+    gate = threading.Event()
+    collect = collector._collect
+
+    def slow():
+        gate.wait(5)
+        return collect()
+
+    collector._collect = slow
+    for _ in range(5):
+        collector.request_publish(path)
+    gate.set()
+    while collector._publishing:
+        threading.Event().wait(0.01)
+    # one build for the first request, one for everything asked meanwhile
+    assert collector.builds == 2
+    assert collector.published == (2, collector.get()[0])
+    with open(path, "rb") as f:
+        assert json.loads(f.read())["build"] == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["state.inventory"]
@@ -0,0 +1,37 @@
+import pytest
+
+from backend import db as dbm
+from backend.logs import LogFilter, LogTail
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(dbm, "DB_PATH", str(tmp_path / "app.db"))
+    dbm.init_db()
+    yield
+    dbm.close()
+
+
+def ingest(n):
+    rows = [("2024-01-01 00:00:00", "h", "app", "info", "line %d" % i, "/var/log/app.log") for i in range(n)]
+    return dbm.log_ingest(rows, [])
+
+
+def test_log_after_is_bounded_above(db):
+    ingest(10)
+    assert [r["id"] for r in dbm.log_after(2, 3, upto=6)] == [4, 5, 6]
+    assert [r["id"] for r in dbm.log_after(8, 5)] == [9, 10]
+
+
+def test_catch_up_keeps_lines_up_to_newest_under_load(db):
+    tail = LogTail(max_lines=50)
+    got = []
+    tail.on_read = lambda path, first_id, rows: got.extend(range(first_id, first_id + len(rows)))
+    tail.subscribe(LogFilter())
+    ingest(20)
+    tail.cursor = 0
+    # the collector announced 20, then wrote far more than max_lines before the worker queried
+    ingest(500)
+    tail.catch_up(20)
+    assert got == list(range(1, 21))
+    assert tail.cursor == 20
@@ -0,0 +1,48 @@
+import re
+import time
+
+import pytest
+
+from backend.logs import LogFilter
+
+
+def row(message, severity="info", source="kernel"):
+    return ("2024-01-01 00:00:00", "host", source, severity, message, "/var/log/syslog")
+
+
+def test_literal_by_default():
+    f = LogFilter("link down (eth0)")
+    assert f.match(row("NIC: Link Down (eth0) detected"))
+    assert not f.match(row("link down eth0"))
+    # regex metacharacters are plain text
+    assert LogFilter("a.b").match(row("x a.b y"))
+    assert not LogFilter("a.b").match(row("axb"))
+    assert LogFilter("(a+)+$").match(row("literal (a+)+$ in a message"))
+
+
+def test_regex_opt_in():
+    f = LogFilter(r"Xid \d+", regex=True)
+    assert f.match(row("NVRM: Xid 79, GPU has fallen off the bus"))
+    assert not f.match(row("Xid pending"))
+    assert LogFilter(r"(\d{1,3}\.){3}\d{1,3}", regex=True).match(row("peer 10.0.0.12 down"))
+
+
+@pytest.mark.parametrize("pattern", [r"(a+)+$", r"(a*b?)*c", r"(\w+\s?)*x", r"(?:x+)*", r"(a{1,2})+",
+                                     r"(a+){10}", r"(a|aa)+$", r"(a)\1", r"(?=(a+))+",
+                                     r"a.*a.*!x", r"\d+\.\d+", r"(a+)b.{0,100}"])
+def test_catastrophic_patterns_are_rejected(pattern):
+    with pytest.raises(re.error):
+        LogFilter(pattern, regex=True)
+
+
+def test_accepted_patterns_stay_linear():
+    text = "a" * 5000 + "!"
+    for p in [r"a+$", r"(ab)+$", r"(a|b)+$", r"(\d{1,3}\.){3}", r"a.*!x"]:
+        f = LogFilter(p, regex=True)
+        t0 = time.perf_counter()
+        f.match(row(text))
+        assert time.perf_counter() - t0 < 0.1, p
+
+
+def test_filters_with_same_text_differ_by_mode():
+    assert LogFilter("a.b").key != LogFilter("a.b", regex=True).key
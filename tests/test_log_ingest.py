@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from backend import db as dbm
+from backend.logs import LogIngestor
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(dbm, "DB_PATH", str(tmp_path / "app.db"))
+    dbm.init_db()
+    yield
+    dbm.close()
+
+
+def messages():
+    return [r["message"] for r in reversed(dbm.log_search(None, 100))]
+
+
+def write(path, *lines):
+    with open(path, "a") as f:
+        f.write("".join("Oct 17 21:00:00 h app: %s\n" % x for x in lines))
+
+
+def failing_once(monkeypatch):
+    real = dbm.log_ingest
+    calls = []
+
+    def ingest(rows, cps):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise dbm.sqlite3.OperationalError("database is locked")
+        return real(rows, cps)
+
+    monkeypatch.setattr(dbm, "log_ingest", ingest)
+
+
+def test_failed_write_is_retried_from_the_same_offset(db, tmp_path, monkeypatch):
+    path = str(tmp_path / "app.log")
+    write(path, "one", "two")
+    ing = LogIngestor([path])
+    failing_once(monkeypatch)
+    assert ing.poll() == 0
+    assert ing.write_errors == 1 and "locked" in ing.last_error
+    assert ing.sources()[0]["offset"] == 0
+    write(path, "three")
+    assert ing.poll() == 3
+    assert messages() == ["one", "two", "three"]
+    assert dbm.log_checkpoints()[0]["offset"] == os.path.getsize(path)
+
+
+def test_failed_write_after_rotation_keeps_the_old_file(db, tmp_path, monkeypatch):
+    path = str(tmp_path / "app.log")
+    write(path, "one")
+    ing = LogIngestor([path])
+    assert ing.poll() == 1
+    write(path, "two")
+    os.rename(path, path + ".1")
+    write(path, "three")
+    failing_once(monkeypatch)
+    assert ing.poll() == 0
+    # drained once the write goes through, then the new file
+    while ing.poll():
+        pass
+    assert messages() == ["one", "two", "three"]
+    assert ing.sources()[0]["offset"] == os.path.getsize(path)
@@ -0,0 +1,22 @@
+import asyncio
+import threading
+
+from backend.auth import PasswordVerifier
+from backend.crypto import hash_password
+
+
+def test_login_bookkeeping_runs_in_the_pool_job():
+    row = {"enabled": 1, "password_hash": hash_password("pw"), "role": "admin"}
+    seen = []
+
+    async def main():
+        pv = PasswordVerifier(workers=1)
+        ok = await pv.login(lambda: row, "pw", lambda r: seen.append((r, threading.current_thread().name)))
+        bad = await pv.login(lambda: row, "nope", lambda r: seen.append((r, "bad")))
+        pv.shutdown()
+        return ok, bad
+
+    ok, bad = asyncio.run(main())
+    assert ok is row and bad is None
+    assert len(seen) == 1 and seen[0][0] is row
+    assert seen[0][1].startswith("pbkdf2")
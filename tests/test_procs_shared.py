@@ -0,0 +1,25 @@
+import json
+import os
+
+from backend.procs import ProcessTable, SharedProcessTable
+
+
+def test_worker_serves_the_collectors_rows():
+    collector = ProcessTable(gpu_procs=lambda: {os.getpid(): (512, [0])}, max_age=0)
+    collector.refresh()
+    collector.refresh()
+    collector.max_age = 3600
+    worker = SharedProcessTable(max_age=0)
+    assert worker.top()["items"] == []
+    # what goes through the shared segment
+    worker.load(json.loads(json.dumps(collector.export())))
+    for sort in ("cpu", "rss", "name", "gpu_mem"):
+        mine, theirs = collector.top(sort, 20), worker.top(sort, 20)
+        assert theirs["total"] == mine["total"]
+        assert [r["pid"] for r in theirs["items"]] == [r["pid"] for r in mine["items"]]
+    assert worker.top("cpu", 5, q="python")["matched"] >= 1
+    row = next(r for r in worker.top("gpu_mem", 1)["items"])
+    assert (row["pid"], row["gpu_mem_mb"], row["gpus"]) == (os.getpid(), 512, [0])
+    assert isinstance(row["status"], str)
+    # workers never scan
+    assert worker.scans == 1
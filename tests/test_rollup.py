@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from backend import db as dbm
+from backend import rollup as rollupm
+from backend.rollup import Rollup
+from backend.tsdb import MetricStore
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(dbm, "DB_PATH", str(tmp_path / "app.db"))
+    dbm.init_db()
+    yield
+    dbm.close()
+
+
+def test_failed_flush_keeps_closed_buckets(db, monkeypatch):
+    t0 = int(time.time()) // 60 * 60 - 600
+    r = Rollup(tiers=[(60, 86400)])
+    r.add(t0, {"cpu": 10})
+    r.add(t0 + 60, {"cpu": 20})
+    real = dbm.rollup_insert_many
+
+    def locked(rows):
+        raise dbm.sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(dbm, "rollup_insert_many", locked)
+    with pytest.raises(dbm.sqlite3.OperationalError):
+        r.flush()
+    assert r.write_errors == 1 and r.written == 0
+    monkeypatch.setattr(dbm, "rollup_insert_many", real)
+    r.add(t0 + 120, {"cpu": 30})
+    r.flush()
+    assert r.written == 2
+    assert [(x["ts"], x["avg"]) for x in dbm.rollup_query(60, ["cpu"], t0, t0 + 600)] == [(t0, 10), (t0 + 60, 20)]
+
+
+def test_pending_rows_are_bounded(db, monkeypatch):
+    monkeypatch.setattr(rollupm, "MAX_PENDING", 2)
+    monkeypatch.setattr(dbm, "rollup_insert_many", lambda rows: 1 / 0)
+    r = Rollup(tiers=[(60, 86400)])
+    for ts in (0, 60, 120, 180):
+        r.add(ts, {"cpu": ts})
+    with pytest.raises(ZeroDivisionError):
+        r.flush()
+    assert r.dropped == 1 and [row[2] for row in r._pending] == [60, 120]
+
+
+def test_bucket_count_matches_the_ring(db):
+    r, store = Rollup(tiers=[(60, 86400)]), MetricStore(16)
+    start, end, step = 1000.0, 1000.0 + 3 * 60 + 30, 60.0
+    assert len(r.query(60, ["cpu"], start, end, step)["ts"]) == len(store.query([], start, end, step)["ts"]) == 4
+
+
+def test_open_bucket_comes_from_the_ring(db):
+    now = time.time()
+    bucket = int(now) - int(now) % 60
+    r, store = Rollup(tiers=[(60, 86400)]), MetricStore(16)
+    for i, v in enumerate((10.0, 30.0)):
+        ts = bucket + i * 0.001
+        store.append(ts, {"cpu": v})
+        r.add(ts, {"cpu": v})
+    r.flush()
+    out = r.query(60, ["cpu"], bucket - 120, now + 1, 60, store=store)
+    assert out["series"]["cpu"][-1] == 20.0
+    assert r.query(60, ["cpu"], bucket - 120, now + 1, 60, agg="max", store=store)["series"]["cpu"][-1] == 30.0
+    # without a ring the open bucket is missing
+    assert r.query(60, ["cpu"], bucket - 120, now + 1, 60)["series"]["cpu"][-1] is None
+    # remote nodes: rollup names carry a prefix the ring does not
+    assert r.query(60, ["n1:cpu"], bucket - 120, now + 1, 60, store=store, prefix="n1:")["series"]["n1:cpu"][-1] == 20.0
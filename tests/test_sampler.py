@@ -0,0 +1,31 @@
+import asyncio
+import threading
+import time
+
+from backend.sampler import Sampler
+
+
+def test_ticks_run_on_one_thread_of_their_own():
+    # psutil.cpu_percent(interval=None) keeps its baseline per thread
+    threads = []
+
+    def collect():
+        threads.append(threading.get_ident())
+        return {"ts": time.time()}
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        sampler = Sampler(collect, interval=0.01)
+        sampler.start()
+        # keep the default pool busy with other work meanwhile
+        busy = [loop.run_in_executor(None, time.sleep, 0.02) for _ in range(20)]
+        while len(threads) < 10:
+            await asyncio.sleep(0.01)
+        await sampler.stop()
+        await asyncio.gather(*busy)
+        return sampler
+
+    sampler = asyncio.run(main())
+    assert len(set(threads)) == 1
+    assert threads[0] != threading.get_ident()
+    assert sampler._executor is None
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from backend.shared import Follower, SharedState, SIGNALS, SIG_INVENTORY, SIG_SESSIONS
+
+
+def test_signal_is_seen_once_by_other_processes(tmp_path):
+    path = str(tmp_path / "onebox.shm")
+    collector = SharedState(path, capacity=16, max_series=8, snapshot_bytes=4096)
+    collector.create(1.0)
+    a, b = SharedState(path), SharedState(path)
+    a.open(timeout=1)
+    b.open(timeout=1)
+    try:
+        assert not any(b.signalled(s) for s in SIGNALS)
+        a.signal(SIG_SESSIONS)
+        # the sender acted already; everyone else sees it exactly once
+        assert not a.signalled(SIG_SESSIONS)
+        assert b.signalled(SIG_SESSIONS)
+        assert not b.signalled(SIG_SESSIONS)
+        assert collector.signalled(SIG_SESSIONS)
+        assert not b.signalled(SIG_INVENTORY)
+    finally:
+        for s in (a, b, collector):
+            s.close()
+
+
+def test_follower_reopens_a_replaced_segment(tmp_path):
+    path = str(tmp_path / "onebox.shm")
+    old = SharedState(path, capacity=16, max_series=8, snapshot_bytes=4096)
+    old.create(1.0)
+    worker = SharedState(path)
+    worker.open(timeout=1)
+    frames = []
+
+    async def main():
+        follower = Follower(worker, lambda seq, frame: frames.append(seq), poll=0.01)
+        follower.start()
+        old.publish(1, {"ts": time.time()})
+        while not frames:
+            await asyncio.sleep(0.01)
+        # a restarted collector renames a fresh segment into place and goes on publishing
+        new = SharedState(path, capacity=16, max_series=8, snapshot_bytes=4096)
+        new.create(1.0)
+        follower.last_frame = time.time() - 60
+        while 2 not in frames:
+            new.publish(2, {"ts": time.time()})
+            await asyncio.sleep(0.01)
+        await follower.stop()
+        new.close()
+
+    try:
+        asyncio.run(asyncio.wait_for(main(), 5))
+        assert frames == [1, 2]
+    finally:
+        worker.close()
+        old.close()
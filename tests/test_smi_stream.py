@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import asyncio
+
+from backend import gpu as gpum
+from backend.gpu import GpuCollector, SmiStream, parse_smi_line
+
+
+class Recorder:
+    # stands in for GpuCollector: keeps every pushed batch
+    def __init__(self):
+        self.batches = []
+        self.stale_after = 0.0
+
+    def push(self, gpus, source="nvidia-smi"):
+        self.batches.append(gpus)
+
+
+def fake_smi(tmp_path, body: str) -> str:
+    path = tmp_path / "nvidia-smi"
+    path.write_text("#!%s\nimport sys, time\n%s" % (sys.executable, body))
+    os.chmod(path, 0o755)
+    return str(path)
+
+
+def line(i, util=10):
+    return "%d, Fake GPU, %d, 50, 100.00, 1024, 8192" % (i, util)
+
+
+async def read_all(stream: SmiStream):
+    proc = await asyncio.create_subprocess_exec(*stream.argv(), stdout=asyncio.subprocess.PIPE)
+    await stream._read(proc.stdout)
+    await proc.wait()
+
+
+def test_parse_line():
+    assert parse_smi_line(line(3, 42)) == {"id": 3, "name": "Fake GPU", "util": 42.0, "temp_c": 50.0,
+                                           "power_w": 100.0, "mem_used_mb": 1024.0, "mem_total_mb": 8192.0}
+    assert parse_smi_line("3, Fake GPU, [N/A], 50, [Not Supported], 1024, 8192")["power_w"] == 0.0
+    assert parse_smi_line("") is None
+    assert parse_smi_line("No devices were found") is None
+    assert parse_smi_line("1, Fake GPU, 10, 50") is None
+
+
+def test_cycles_are_batched_on_index_wrap(tmp_path):
+    lines = [line(i, util=c * 10 + i) for c in range(3) for i in range(3)]
+    cmd = fake_smi(tmp_path, "print(%r)\n" % "\n".join(lines))
+    rec = Recorder()
+    stream = SmiStream(rec, cmd=cmd)
+    asyncio.run(read_all(stream))
+    # the first cycle is emitted when the index wraps, later ones as soon as they are complete
+    assert stream.frames == 3
+    assert [[g["util"] for g in b] for b in rec.batches] == [[0, 1, 2], [10, 11, 12], [20, 21, 22]]
+
+
+def test_garbled_and_partial_lines_are_skipped(tmp_path):
+    out = "\n".join([
+        line(0), "garbage", line(1), "1, Fake GPU, 10",  # truncated
+        line(0, 20), "\x00\xff", "", line(1, 21),
+        "0, Fake GPU, 30, 5",  # cut off mid-line as the process dies
+    ])
+    cmd = fake_smi(tmp_path, "sys.stdout.write(%r)\n" % out)
+    rec = Recorder()
+    stream = SmiStream(rec, cmd=cmd)
+    asyncio.run(read_all(stream))
+    assert [[(g["id"], g["util"]) for g in b] for b in rec.batches] == [[(0, 10), (1, 10)], [(0, 20), (1, 21)]]
+
+
+def test_stream_restarts_after_child_exits(tmp_path):
+    runs = tmp_path / "runs"
+    cmd = fake_smi(tmp_path, "open(%r, 'a').write('x')\nprint(%r)\n" % (str(runs), "\n".join([line(0), line(1)] * 2)))
+    rec = Recorder()
+    stream = SmiStream(rec, cmd=cmd, restart_delay=0.05)
+
+    async def main():
+        stream.start()
+        deadline = time.monotonic() + 10
+        while stream.spawns < 3 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await stream.stop()
+
+    asyncio.run(main())
+    # the last spawn may be stopped before it ran; the earlier ones completed
+    assert stream.spawns >= 3
+    assert len(runs.read_text()) >= 2
+    assert stream.frames >= 4
+    assert stream._proc is None
+
+
+def test_missing_binary_waits_missing_delay(tmp_path):
+    rec = Recorder()
+    stream = SmiStream(rec, cmd=str(tmp_path / "no-such-nvidia-smi"), restart_delay=0.01, missing_delay=60)
+
+    async def main():
+        stream.start()
+        await asyncio.sleep(0.3)
+        await stream.stop()
+
+    asyncio.run(main())
+    # one attempt, then the long delay instead of a tight restart loop
+    assert stream.spawns == 1
+    assert rec.batches == []
+
+
+def test_pushed_snapshot_goes_stale(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(gpum.time, "time", lambda: now[0])
+    g = GpuCollector(nvml=None)
+    # no NVML: opening fails, data only comes from the stream
+    monkeypatch.setattr(g, "_open", lambda: False)
+    SmiStream(g, interval_ms=1000)
+    assert g.stale_after == 5.0
+    g.push([{"id": 0, "util": 40}])
+    assert g.snapshot()[1] == [{"id": 0, "util": 40}]
+    assert g.avg_util() == 40
+    now[0] += 4.9
+    assert len(g.snapshot()[1]) == 1
+    now[0] += 0.2
+    ts, gpus = g.snapshot()
+    assert gpus == [] and ts == 1000.0
+    assert g.avg_util() == 0.0
+    # a new push makes it current again
+    g.push([{"id": 0, "util": 10}])
+    assert g.snapshot()[1] == [{"id": 0, "util": 10}]
@@ -0,0 +1,47 @@
+from collections import namedtuple
+
+from backend import storage as storagem
+from backend.storage import StorageMonitor, whole_disk
+
+IO = namedtuple("IO", "read_bytes write_bytes")
+MB = 1024 * 1024
+
+
+def sysfs(tmp_path, partitions):
+    for name in partitions:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "partition").write_text("1\n")
+    return str(tmp_path)
+
+
+def test_whole_disk(tmp_path):
+    root = sysfs(tmp_path, ["sda1", "nvme0n1p1"])
+    assert whole_disk("sda", root)
+    assert whole_disk("nvme0n1", root)
+    assert not whole_disk("sda1", root)
+    assert not whole_disk("nvme0n1p1", root)
+    for name in ("loop0", "dm-0", "md127", "zram0"):
+        assert not whole_disk(name, root)
+
+
+def test_totals_skip_partitions_and_stacked_devices(tmp_path, monkeypatch):
+    root = sysfs(tmp_path, ["sda1", "sda2", "nvme0n1p1"])
+    monkeypatch.setattr(storagem, "whole_disk", lambda name: whole_disk(name, root))
+    # the same 10 MB/s of writes shows up on the disk, its partition and the LVM volume on top
+    counters = [{
+        "sda": IO(0, 0), "sda1": IO(0, 0), "sda2": IO(0, 0), "dm-0": IO(0, 0),
+        "nvme0n1": IO(0, 0), "nvme0n1p1": IO(0, 0), "loop0": IO(0, 0),
+    }, {
+        "sda": IO(4 * MB, 10 * MB), "sda1": IO(4 * MB, 10 * MB), "sda2": IO(0, 0), "dm-0": IO(4 * MB, 10 * MB),
+        "nvme0n1": IO(2 * MB, 0), "nvme0n1p1": IO(2 * MB, 0), "loop0": IO(8 * MB, 0),
+    }]
+    monkeypatch.setattr(storagem.psutil, "disk_io_counters", lambda perdisk=False: counters.pop(0))
+    mon = StorageMonitor()
+    mon.sample_io(100.0)
+    series = mon.sample_io(101.0)
+    assert series["disk.read"] == 6.0
+    assert series["disk.write"] == 10.0
+    # per-device series are still reported for every device
+    assert series["disk.sda1.write"] == 10.0
+    assert series["disk.dm-0.write"] == 10.0
+    assert mon.io_rates()["loop0"]["read"] == 8.0